@@ -6,16 +6,16 @@ from .models import MediaFile
 class MediaFileAdmin(admin.ModelAdmin):
     list_display = ( 'title', 'content_type', 'formatted_file_size', 
                    'uploaded_by', 'uploaded_at', 'is_public', 'view_file_link', 'thumbnail_preview')
-    list_filter = ('content_type', 'is_public', 'uploaded_at')
+    list_filter = ('content_type', 'processing_status', 'is_public', 'uploaded_at')
     search_fields = ('title', 'description', 'tags')
     readonly_fields = ('file_size', 'width', 'height', 
-                      'uploaded_at', 'file_extension')
+                      'uploaded_at', 'file_extension', 'processing_status', 'processing_error')
     fieldsets = (
         (None, {
             'fields': ('title', 'description', 'file', 'content_type', 'tags')
         }),
         ('File Information', {
-            'fields': ('file_size', 'file_extension', 'width', 'height')
+            'fields': ('file_size', 'file_extension', 'width', 'height', 'processing_status', 'processing_error')
         }),
         ('Settings', {
             'fields': ('is_public', 'uploaded_by')
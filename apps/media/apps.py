@@ -13,3 +13,6 @@ class MediaConfig(AppConfig):
         # Create necessary directories
         os.makedirs(settings.MEDIA_ROOT / 'uploads', exist_ok=True)
         os.makedirs(settings.MEDIA_ROOT / 'thumbnails', exist_ok=True)
+
+        # Register the image processing job handlers and image index hooks
+        from . import signals, sprites, tasks  # noqa: F401
@@ -1,14 +1,15 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.contrib.auth import get_user_model
 from django.utils.text import slugify
 import os
 from PIL import Image
 from io import BytesIO
-from django.core.files.base import ContentFile
 from django.conf import settings
 from datetime import datetime
 import logging
-from pathlib import Path
+from apps.pages.jobs import enqueue
+from .uploads import file_checksum
 
 logger = logging.getLogger(__name__)
 
@@ -91,6 +92,11 @@ class MediaFile(models.Model):
         ('video', 'Video'),
         ('audio', 'Audio'),
     ]
+    PROCESSING_STATUSES = [
+        ('processing', 'Processing'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
 
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True)
@@ -99,6 +105,8 @@ class MediaFile(models.Model):
     content_type = models.CharField(max_length=20, choices=CONTENT_TYPES)
     file_size = models.BigIntegerField(editable=False)
     file_extension = models.CharField(max_length=10, editable=False)
+    # sha256 of the uploaded content, used to avoid storing the same file twice
+    checksum = models.CharField(max_length=64, blank=True, db_index=True, editable=False)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     is_public = models.BooleanField(default=True)
@@ -107,93 +115,84 @@ class MediaFile(models.Model):
     # Metadata for images
     width = models.IntegerField(null=True, blank=True)
     height = models.IntegerField(null=True, blank=True)
+
+    # Set by the background worker once images are optimized
+    processing_status = models.CharField(max_length=20, choices=PROCESSING_STATUSES, default='ready')
+    processing_error = models.TextField(blank=True)
     
     class Meta:
         ordering = ['-uploaded_at']
         verbose_name = 'Media File'
         verbose_name_plural = 'Media Files'
+        indexes = [
+            # Library listing, filtered by type or not, newest first (keyset pagination)
+            models.Index(fields=['content_type', '-uploaded_at', '-id'], name='media_type_uploaded_idx'),
+            models.Index(fields=['-uploaded_at', '-id'], name='media_uploaded_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
     def save(self, *args, **kwargs):
         """
-        Enhanced save method with:
-        1. WebP conversion
-        2. Proper error handling
-        3. Image optimization
-        4. Thumbnail generation
+        Records size and type on creation. Images are only validated here
+        (a header read); resizing, WebP conversion, thumbnails and responsive
+        derivatives are done by the background worker (apps.media.tasks), so
+        a new image is saved with processing_status 'processing'.
         """
-        if self.file and not self.pk:  # Only on creation
+        created = not self.pk
+        if self.file and created:
             try:
                 self.file_size = self.file.size if hasattr(self.file, 'size') else 0
                 self.file_extension = os.path.splitext(self.file.name)[1][1:].lower()
+                if not self.checksum:
+                    # Set by ChecksumUploadHandler for library uploads; hashed here otherwise
+                    self.checksum = getattr(self.file.file, 'checksum', None) or file_checksum(self.file)
 
-                # Process images
                 if self.content_type == 'image':
                     try:
+                        # Image.open only parses the header; pixel data is never decoded here
                         with Image.open(self.file) as img:
-                            # Store original dimensions
-                            self.width = img.width
-                            self.height = img.height
-
-                            # Validate image format
                             if img.format not in ALLOWED_IMAGE_FORMATS:
                                 raise ValueError(f"Unsupported image format: {img.format}")
-
-                            # Create WebP thumbnail
-                            thumb_data = create_thumbnail(img)
-                            if thumb_data:
-                                thumbnail_name = f"{Path(self.file.name).stem}_thumb.webp"
-                                self.thumbnail.save(
-                                    thumbnail_name,
-                                    ContentFile(thumb_data),
-                                    save=False
-                                )
-
-                            # Optimize original image
-                            optimized = optimize_image(img)
-                            if optimized:
-                                # Convert to WebP and save
-                                optimized_io = BytesIO()
-                                optimized.save(
-                                    optimized_io, 
-                                    format='WEBP', 
-                                    quality=WEBP_QUALITY,
-                                    method=6  # Highest compression method
-                                )
-                                
-                                # Update filename to .webp
-                                new_name = f"{Path(self.file.name).stem}.webp"
-                                self.file.save(
-                                    new_name,
-                                    ContentFile(optimized_io.getvalue()),
-                                    save=False
-                                )
-                                # Update file size after optimization
-                                self.file_size = self.file.size
-                                self.file_extension = 'webp'
-
+                        self.file.seek(0)
+                        self.processing_status = 'processing'
                     except (IOError, OSError) as e:
                         logger.error(f"IO Error processing image {self.file.name}: {str(e)}")
                         raise
                     except ValueError as e:
                         logger.error(f"Validation error for image {self.file.name}: {str(e)}")
                         raise
-                    except Exception as e:
-                        logger.error(f"Unexpected error processing image {self.file.name}: {str(e)}")
-                        raise
 
             except Exception as e:
                 logger.error(f"Error in save method for file {self.file.name}: {str(e)}")
                 raise
 
+        update_fields = kwargs.get('update_fields')
+        previous_type = None
+        if not created and (update_fields is None or 'content_type' in update_fields):
+            previous_type = MediaFile.objects.filter(pk=self.pk).values_list('content_type', flat=True).first()
+
         try:
-            super().save(*args, **kwargs)
+            # The row, its type counter and its processing job are committed together
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                if created:
+                    adjust_media_count(self.content_type, 1)
+                elif previous_type and previous_type != self.content_type:
+                    adjust_media_count(previous_type, -1)
+                    adjust_media_count(self.content_type, 1)
+
+                if created and self.processing_status == 'processing':
+                    enqueue('media.process_image', {'media_id': self.pk})
         except Exception as e:
             logger.error(f"Database error saving file {self.file.name}: {str(e)}")
             raise
 
+    @property
+    def is_processing(self):
+        return self.processing_status == 'processing'
+
     @property
     def file_type_icon(self):
         """Returns the appropriate icon class based on file type"""
@@ -220,3 +219,49 @@ class MediaFile(models.Model):
                 return f"{self.file_size:.1f} {unit}"
             self.file_size /= 1024
         return f"{self.file_size:.1f} TB"
+
+
+class MediaTypeCount(models.Model):
+    """
+    Number of MediaFile rows per content_type, kept in step by MediaFile.save
+    and the post_delete signal so the library never has to count the table.
+    """
+    content_type = models.CharField(max_length=20, unique=True)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Media Type Count'
+        verbose_name_plural = 'Media Type Counts'
+
+    def __str__(self):
+        return f"{self.content_type}: {self.count}"
+
+
+def adjust_media_count(content_type, delta):
+    """Add delta to a type's counter; call inside the transaction that changes the rows"""
+    if not MediaTypeCount.objects.exists():
+        # First change since the counters were introduced: count what is there
+        recount_media_types()
+        return
+    MediaTypeCount.objects.get_or_create(content_type=content_type)
+    MediaTypeCount.objects.filter(content_type=content_type).update(count=F('count') + delta)
+
+
+def recount_media_types():
+    """Rebuild the counters from the MediaFile table (one GROUP BY query)"""
+    counts = dict(
+        MediaFile.objects.order_by().values_list('content_type').annotate(total=models.Count('id'))
+    )
+    with transaction.atomic():
+        MediaTypeCount.objects.exclude(content_type__in=list(counts)).delete()
+        for content_type, total in counts.items():
+            MediaTypeCount.objects.update_or_create(content_type=content_type, defaults={'count': total})
+    return counts
+
+
+def get_media_type_counts():
+    """{content_type: count}; rebuilt once if the counter table is still empty"""
+    counts = dict(MediaTypeCount.objects.values_list('content_type', 'count'))
+    if not counts and MediaFile.objects.exists():
+        counts = recount_media_types()
+    return counts
@@ -0,0 +1,94 @@
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import Q
+
+# Keyset (cursor) pagination for the media library
+# ------------------------------------------------
+# Pages are ordered by (-uploaded_at, -id) and addressed by the position of
+# an edge item instead of an OFFSET, so every page is one index range scan
+# of page_size + 1 rows however deep the user browses. ``after`` continues
+# past the last item of a page, ``before`` goes back from the first one.
+
+
+def encode_cursor(media):
+    raw = f"{media.uploaded_at.isoformat()}|{media.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(uploaded_at, id) from a cursor, or None if it is not valid"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        uploaded_at, pk = raw.split('|')
+        return datetime.fromisoformat(uploaded_at), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+class KeysetPage:
+    """One page of results with cursors for its neighbours (None at either end)"""
+
+    def __init__(self, items, next_cursor, previous_cursor):
+        self.object_list = items
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+def keyset_page(queryset, page_size, after=None, before=None):
+    """
+    A newest-first page of ``queryset`` (MediaFile) starting after the
+    ``after`` cursor or ending before the ``before`` cursor.
+    """
+    after_key = decode_cursor(after)
+    before_key = decode_cursor(before)
+
+    if before_key:
+        uploaded_at, pk = before_key
+        rows = list(
+            queryset.filter(Q(uploaded_at__gt=uploaded_at) | Q(uploaded_at=uploaded_at, id__gt=pk))
+            .order_by('uploaded_at', 'id')[:page_size + 1]
+        )
+        has_more_before = len(rows) > page_size
+        items = list(reversed(rows[:page_size]))
+        has_more_after = True
+    else:
+        if after_key:
+            uploaded_at, pk = after_key
+            queryset = queryset.filter(Q(uploaded_at__lt=uploaded_at) | Q(uploaded_at=uploaded_at, id__lt=pk))
+        rows = list(queryset.order_by('-uploaded_at', '-id')[:page_size + 1])
+        has_more_after = len(rows) > page_size
+        items = rows[:page_size]
+        has_more_before = after_key is not None
+
+    if not items:
+        return KeysetPage([], None, None)
+    return KeysetPage(
+        items,
+        encode_cursor(items[-1]) if has_more_after else None,
+        encode_cursor(items[0]) if has_more_before else None,
+    )
@@ -0,0 +1,27 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.pages.image_derivatives import forget_source, get_derivatives
+from apps.pages.image_index import forget_file, record_file
+from .models import MediaFile, adjust_media_count
+
+
+@receiver(post_save, sender=MediaFile)
+def refresh_image_index_on_save(sender, instance, created, update_fields=None, **kwargs):
+    # New uploads, and the worker swapping in the optimized file
+    if instance.file and (created or update_fields is None or 'file' in update_fields):
+        record_file(instance.file.path, instance.file.url)
+
+
+@receiver(post_delete, sender=MediaFile)
+def update_media_count_on_delete(sender, instance, **kwargs):
+    # Runs inside the deletion's transaction
+    adjust_media_count(instance.content_type, -1)
+
+
+@receiver(post_delete, sender=MediaFile)
+def refresh_image_index_on_delete(sender, instance, **kwargs):
+    if instance.file and get_derivatives(instance.file.url):
+        forget_source(instance.file.url)
+    if instance.file:
+        forget_file(instance.file.path)
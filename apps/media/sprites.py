@@ -0,0 +1,186 @@
+import hashlib
+import json
+import logging
+import os
+import time
+
+from django.core import signing
+from django.core.cache import cache
+from PIL import Image, ImageOps
+
+from apps.pages.image_derivatives import DERIVATIVES_ROOT, DERIVATIVES_URL
+from apps.pages.jobs import enqueue, job_handler
+from .models import MediaFile
+
+logger = logging.getLogger(__name__)
+
+# Thumbnail sprites for the media picker
+# --------------------------------------
+# The thumbnails of one library page are packed into a single WebP sheet
+# (SPRITE_COLUMNS wide, each tile a SPRITE_TILE square cropped like the
+# grid's object-cover previews) plus a JSON map of tile positions.
+#
+# Sheets are named after a hash of the page's membership (ids and thumbnail
+# files), so a page reuses its sheet until an item is added, removed or
+# re-processed; then the new membership simply gets a new sheet. Positions
+# are given as background-size/position percentages so tiles scale with the
+# responsive grid.
+#
+# Only memberships the library page produced are built: the page hands out
+# a signed token of its ids (sprite_token), and the sprite endpoint only
+# accepts that token. Missing sheets are built by the job worker.
+
+SPRITE_TILE = 200
+SPRITE_COLUMNS = 6
+SPRITE_QUALITY = 80
+SPRITE_MAX_ITEMS = 48
+# Kept with the image derivatives, which image scans already skip
+SPRITES_ROOT = os.path.join(DERIVATIVES_ROOT, 'sprites')
+SPRITES_URL = f"{DERIVATIVES_URL}sprites/"
+# Sheets not rebuilt or used for this long are deleted
+SPRITE_MAX_AGE = 30 * 24 * 60 * 60
+
+CACHE_PREFIX = 'media_sprite'
+TOKEN_SALT = 'media.sprite'
+# A library page's token stays valid this long (seconds)
+TOKEN_MAX_AGE = 24 * 60 * 60
+
+
+def sprite_items(media_files):
+    """The files of a page that go into its sheet: images with a thumbnail"""
+    return [media for media in media_files if media.content_type == 'image' and media.thumbnail][:SPRITE_MAX_ITEMS]
+
+
+def sprite_key(items):
+    membership = '\n'.join(f"{media.pk}:{media.thumbnail.name}" for media in items)
+    return hashlib.sha1(membership.encode()).hexdigest()
+
+
+def _paths(key):
+    base = os.path.join(SPRITES_ROOT, key)
+    return f"{base}.webp", f"{base}.json"
+
+
+def get_sprite(items):
+    """The sprite map for these items, or None when the sheet has not been built"""
+    if not items:
+        return None
+    key = sprite_key(items)
+    sprite = cache.get(f"{CACHE_PREFIX}:{key}")
+    if sprite is None:
+        map_path = _paths(key)[1]
+        try:
+            with open(map_path, 'r') as f:
+                sprite = json.load(f)
+            # Sheets still in use are kept by prune_sprites
+            os.utime(map_path)
+            os.utime(_paths(key)[0])
+        except (OSError, ValueError):
+            return None
+        cache.set(f"{CACHE_PREFIX}:{key}", sprite, 24 * 60 * 60)
+    return sprite
+
+
+def request_sprite(items):
+    """Return the sprite map, or queue a background build (once) and return None"""
+    sprite = get_sprite(items)
+    if sprite is None and items:
+        key = sprite_key(items)
+        if cache.add(f"{CACHE_PREFIX}_pending:{key}", True, 300):
+            enqueue('media.build_sprite', {'ids': [media.pk for media in items]})
+    return sprite
+
+
+def build_sprite(items):
+    """Compose the sheet and map for these items. Returns the map."""
+    key = sprite_key(items)
+    webp_path, map_path = _paths(key)
+    columns = min(SPRITE_COLUMNS, len(items))
+    rows = (len(items) + columns - 1) // columns
+    sheet = Image.new('RGB', (columns * SPRITE_TILE, rows * SPRITE_TILE), (249, 250, 251))
+
+    tiles = {}
+    for index, media in enumerate(items):
+        column, row = index % columns, index // columns
+        try:
+            with media.thumbnail.open('rb') as f, Image.open(f) as thumb:
+                thumb = thumb.convert('RGBA')
+                tile = ImageOps.fit(thumb, (SPRITE_TILE, SPRITE_TILE), Image.Resampling.LANCZOS)
+                sheet.paste(tile, (column * SPRITE_TILE, row * SPRITE_TILE), tile)
+        except Exception as e:
+            logger.error(f"Could not add {media.thumbnail.name} to sprite: {str(e)}")
+            continue
+        tiles[str(media.pk)] = {
+            'x': column * SPRITE_TILE,
+            'y': row * SPRITE_TILE,
+            # background-position for a tile scaled to its container
+            'position': f"{column * 100 / max(columns - 1, 1):.4f}% {row * 100 / max(rows - 1, 1):.4f}%",
+        }
+
+    sprite = {
+        'key': key,
+        'url': f"{SPRITES_URL}{key}.webp",
+        'tile': SPRITE_TILE,
+        'columns': columns,
+        'rows': rows,
+        'size': f"{columns * 100}% {rows * 100}%",
+        'tiles': tiles,
+    }
+
+    os.makedirs(SPRITES_ROOT, exist_ok=True)
+    tmp_suffix = f".{os.getpid()}.tmp"
+    sheet.save(webp_path + tmp_suffix, 'WEBP', quality=SPRITE_QUALITY, method=4)
+    os.replace(webp_path + tmp_suffix, webp_path)
+    with open(map_path + tmp_suffix, 'w') as f:
+        json.dump(sprite, f)
+    # The map is written last: its presence means the sheet is complete
+    os.replace(map_path + tmp_suffix, map_path)
+
+    cache.set(f"{CACHE_PREFIX}:{key}", sprite, 24 * 60 * 60)
+    return sprite
+
+
+def load_items(ids):
+    """MediaFiles for ids, in the given order, filtered like sprite_items"""
+    by_id = {media.pk: media for media in MediaFile.objects.filter(pk__in=ids[:SPRITE_MAX_ITEMS])}
+    return sprite_items([by_id[pk] for pk in ids if pk in by_id])
+
+
+def sprite_token(items):
+    """Signed membership of a library page, for the sprite endpoint"""
+    return signing.dumps([media.pk for media in items], salt=TOKEN_SALT, compress=True)
+
+
+def items_for_token(token):
+    """The items of a token from sprite_token; raises signing.BadSignature"""
+    ids = signing.loads(token, salt=TOKEN_SALT, max_age=TOKEN_MAX_AGE)
+    if not isinstance(ids, list) or not all(isinstance(pk, int) for pk in ids):
+        raise signing.BadSignature('Malformed sprite token')
+    return load_items(ids)
+
+
+def prune_sprites(max_age=SPRITE_MAX_AGE):
+    """Delete sheets (and maps) older than max_age seconds"""
+    if not os.path.isdir(SPRITES_ROOT):
+        return 0
+    cutoff = time.time() - max_age
+    removed = 0
+    with os.scandir(SPRITES_ROOT) as entries:
+        for entry in entries:
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+@job_handler('media.build_sprite')
+def build_sprite_job(payload):
+    items = load_items(payload.get('ids', []))
+    if not items:
+        return {'skipped': True}
+    sprite = build_sprite(items)
+    prune_sprites()
+    return {'key': sprite['key'], 'tiles': len(sprite['tiles'])}
@@ -0,0 +1,84 @@
+import logging
+from io import BytesIO
+from pathlib import Path
+
+from django.core.files.base import ContentFile
+from PIL import Image
+
+from apps.pages.image_derivatives import process_source
+from apps.pages.image_index import forget_file
+from apps.pages.jobs import PermanentJobError, job_handler
+from .models import ALLOWED_IMAGE_FORMATS, WEBP_QUALITY, MediaFile, create_thumbnail, optimize_image
+
+logger = logging.getLogger(__name__)
+
+
+def _mark_failed(payload, error):
+    MediaFile.objects.filter(pk=payload.get('media_id')).update(
+        processing_status='failed', processing_error=error[:1000]
+    )
+
+
+@job_handler('media.process_image', on_failure=_mark_failed)
+def process_image(payload):
+    """
+    Optimize an uploaded image: WebP thumbnail, original resized to MAX_WIDTH
+    and re-encoded as WebP, dimensions and final size, responsive derivatives.
+    """
+    try:
+        media = MediaFile.objects.get(pk=payload['media_id'])
+    except MediaFile.DoesNotExist:
+        raise PermanentJobError(f"MediaFile {payload.get('media_id')} no longer exists")
+    if media.processing_status != 'processing':
+        return {'skipped': media.processing_status}
+
+    original_name = media.file.name
+    try:
+        with media.file.open('rb') as f, Image.open(f) as img:
+            if img.format not in ALLOWED_IMAGE_FORMATS:
+                raise PermanentJobError(f"Unsupported image format: {img.format}")
+            img.load()
+            width, height = img.size
+
+            thumb_data = create_thumbnail(img)
+            optimized = optimize_image(img)
+            optimized_data = None
+            if optimized:
+                optimized_io = BytesIO()
+                optimized.save(
+                    optimized_io,
+                    format='WEBP',
+                    quality=WEBP_QUALITY,
+                    method=6  # Highest compression method; fine off the request path
+                )
+                optimized_data = optimized_io.getvalue()
+    except (Image.UnidentifiedImageError, Image.DecompressionBombError) as e:
+        raise PermanentJobError(f"Cannot read image {original_name}: {str(e)}")
+
+    stem = Path(original_name).stem
+    if thumb_data:
+        media.thumbnail.save(f"{stem}_thumb.webp", ContentFile(thumb_data), save=False)
+    if optimized_data:
+        media.file.save(f"{stem}.webp", ContentFile(optimized_data), save=False)
+        if media.file.name != original_name:
+            forget_file(media.file.storage.path(original_name))
+            media.file.storage.delete(original_name)
+        media.file_extension = 'webp'
+
+    media.width = width
+    media.height = height
+    media.file_size = media.file.size
+    media.processing_status = 'ready'
+    media.processing_error = ''
+    media.save(update_fields=[
+        'file', 'thumbnail', 'file_extension', 'width', 'height', 'file_size',
+        'processing_status', 'processing_error',
+    ])
+
+    try:
+        process_source(media.file.url, media.file.path, media.file.url)
+    except Exception as e:
+        # The derivatives are rebuilt on demand; the upload itself is done
+        logger.error(f"Could not build derivatives for {media.file.name}: {str(e)}")
+
+    return {'file': media.file.name, 'width': width, 'height': height, 'file_size': media.file_size}
@@ -0,0 +1,186 @@
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+
+from django.conf import settings
+from django.core.files.uploadhandler import StopUpload, TemporaryFileUploadHandler
+
+logger = logging.getLogger(__name__)
+
+# Limits for the media library. Multipart uploads (the regular form) stop as
+# soon as a file passes MAX_UPLOAD_SIZE; larger videos and documents go
+# through the resumable chunked upload instead.
+MAX_UPLOAD_SIZE = getattr(settings, 'MEDIA_MAX_UPLOAD_SIZE', 10 * 1024 * 1024)
+MAX_CHUNKED_UPLOAD_SIZE = getattr(settings, 'MEDIA_MAX_CHUNKED_UPLOAD_SIZE', 1024 * 1024 * 1024)
+MAX_CHUNK_SIZE = 8 * 1024 * 1024
+# Unfinished chunked uploads are deleted after this many seconds
+CHUNKED_UPLOAD_EXPIRY = 24 * 60 * 60
+CHUNKED_UPLOAD_ROOT = os.path.join(settings.UPLOAD_ROOT, 'chunked')
+
+_UPLOAD_ID_CHARS = set('0123456789abcdef')
+
+
+def file_checksum(file, chunk_size=1024 * 1024):
+    """sha256 of a file object, read in chunks; the position is restored"""
+    digest = hashlib.sha256()
+    position = file.tell() if hasattr(file, 'tell') else None
+    file.seek(0)
+    for chunk in iter(lambda: file.read(chunk_size), b''):
+        digest.update(chunk)
+    if position is not None:
+        file.seek(position)
+    return digest.hexdigest()
+
+
+class ChecksumUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streams every uploaded file to a temporary file (never into memory),
+    hashing it chunk by chunk, and stops the upload as soon as a file grows
+    past ``max_size``.
+
+    The finished UploadedFile gets a ``checksum`` attribute (sha256 hex);
+    ``rejected`` lists the names of files that were too large.
+    """
+
+    def __init__(self, request=None, max_size=MAX_UPLOAD_SIZE):
+        super().__init__(request)
+        self.max_size = max_size
+        self.rejected = []
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        if content_length is not None and content_length > self.max_size:
+            self.rejected.append(file_name)
+            raise StopUpload()
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        self.digest = hashlib.sha256()
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_size:
+            self.rejected.append(self.file_name)
+            self.file.close()
+            raise StopUpload()
+        self.digest.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        uploaded.checksum = self.digest.hexdigest()
+        return uploaded
+
+
+# Resumable chunked uploads
+# -------------------------
+# The client starts an upload (file name and total size), then PUTs/POSTs
+# the file in order as raw request bodies with an offset. Data is appended
+# to <CHUNKED_UPLOAD_ROOT>/<id>.part and the metadata kept in <id>.json, so
+# an interrupted upload resumes from the current .part size on any worker.
+
+def _paths(upload_id):
+    base = os.path.join(CHUNKED_UPLOAD_ROOT, upload_id)
+    return f"{base}.json", f"{base}.part"
+
+
+def _valid_id(upload_id):
+    return len(upload_id) == 32 and set(upload_id) <= _UPLOAD_ID_CHARS
+
+
+def cleanup_chunked_uploads(max_age=CHUNKED_UPLOAD_EXPIRY):
+    """Delete unfinished uploads older than max_age seconds. Returns the number removed."""
+    if not os.path.isdir(CHUNKED_UPLOAD_ROOT):
+        return 0
+    cutoff = time.time() - max_age
+    removed = 0
+    with os.scandir(CHUNKED_UPLOAD_ROOT) as entries:
+        for entry in entries:
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+def start_chunked_upload(filename, size, user_id):
+    """Create an upload and return its metadata (including ``id``)"""
+    os.makedirs(CHUNKED_UPLOAD_ROOT, exist_ok=True)
+    cleanup_chunked_uploads()
+
+    upload_id = uuid.uuid4().hex
+    meta = {
+        'id': upload_id,
+        'filename': os.path.basename(filename),
+        'size': size,
+        'user_id': user_id,
+        'created': time.time(),
+    }
+    meta_path, part_path = _paths(upload_id)
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+    open(part_path, 'wb').close()
+    return meta
+
+
+def get_chunked_upload(upload_id, user_id):
+    """Metadata of an upload owned by user_id, with ``received`` bytes, or None"""
+    if not _valid_id(upload_id):
+        return None
+    meta_path, part_path = _paths(upload_id)
+    try:
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+        meta['received'] = os.path.getsize(part_path)
+    except (OSError, ValueError):
+        return None
+    if meta.get('user_id') != user_id:
+        return None
+    return meta
+
+
+def append_chunk(meta, offset, stream, length):
+    """
+    Append ``length`` bytes from ``stream`` at ``offset``. An offset behind
+    the current size (a retried chunk) is rewritten from there; one past it
+    is rejected. Returns the new number of bytes received.
+    """
+    _, part_path = _paths(meta['id'])
+    if offset > meta['received']:
+        raise ValueError(f"Chunk offset {offset} is past the {meta['received']} bytes received")
+    if offset + length > meta['size']:
+        raise ValueError('Chunk goes past the declared file size')
+
+    with open(part_path, 'r+b') as f:
+        f.seek(offset)
+        remaining = length
+        while remaining > 0:
+            block = stream.read(min(remaining, 64 * 1024))
+            if not block:
+                break
+            f.write(block)
+            remaining -= len(block)
+        f.truncate()
+        received = f.tell()
+    if remaining:
+        raise ValueError('Chunk body ended early')
+    return received
+
+
+def finish_chunked_upload(meta):
+    """Path and sha256 of a complete upload's data file"""
+    _, part_path = _paths(meta['id'])
+    with open(part_path, 'rb') as f:
+        checksum = file_checksum(f)
+    return part_path, checksum
+
+
+def discard_chunked_upload(upload_id):
+    for path in _paths(upload_id):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
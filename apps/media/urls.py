@@ -6,5 +6,9 @@ app_name = 'media'
 urlpatterns = [
     path('library/', views.media_library, name='library'),
     path('upload/', views.upload_media, name='upload_media'),
+    path('upload/chunked/', views.chunked_upload_start, name='chunked_upload_start'),
+    path('upload/chunked/<str:upload_id>/', views.chunked_upload, name='chunked_upload'),
     path('delete/<int:id>/', views.delete_media, name='delete_media'),
+    path('status/', views.media_status, name='media_status'),
+    path('sprite/', views.media_sprite, name='media_sprite'),
 ] 
\ No newline at end of file
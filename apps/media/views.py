@@ -2,17 +2,27 @@ from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST, require_http_methods
-from .models import MediaFile
-from django.core.paginator import Paginator
+from .models import MediaFile, get_media_type_counts
+from .pagination import keyset_page
+from .sprites import items_for_token, request_sprite, sprite_items, sprite_token
 import os
 from django.conf import settings
-from PIL import Image
-from io import BytesIO
-from django.core.files.base import ContentFile
 from django.db.models import Q
 from apps.pages.models import ProdiAdmin
 from django.contrib import messages
 from django.shortcuts import redirect
+from django.core import signing
+from django.core.files import File
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from .uploads import (
+    MAX_CHUNK_SIZE, MAX_CHUNKED_UPLOAD_SIZE, MAX_UPLOAD_SIZE, ChecksumUploadHandler, append_chunk,
+    discard_chunked_upload, finish_chunked_upload, get_chunked_upload, start_chunked_upload,
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+MEDIA_PAGE_SIZE = 24
 
 # Create your views here.
 
@@ -32,15 +42,15 @@ def media_library(request):
             return redirect('content_dashboard')
 
     select_mode = request.GET.get('mode') == 'select'
-    print(f"Select mode: {select_mode}")  # Debug log
-    media_files = MediaFile.objects.all().order_by('-uploaded_at')
+    media_files = MediaFile.objects.all()
     
-    # Get counts for different file types
+    # Counts per file type come from the MediaTypeCount table, not COUNT(*)
+    counts = get_media_type_counts()
     context = {
-        'image_count': MediaFile.objects.filter(content_type='image').count(),
-        'document_count': MediaFile.objects.filter(content_type='document').count(),
-        'video_count': MediaFile.objects.filter(content_type='video').count(),
-        'audio_count': MediaFile.objects.filter(content_type='audio').count(),
+        'image_count': counts.get('image', 0),
+        'document_count': counts.get('document', 0),
+        'video_count': counts.get('video', 0),
+        'audio_count': counts.get('audio', 0),
     }
     
     # Handle search
@@ -56,80 +66,102 @@ def media_library(request):
     if media_type and media_type != 'all':
         media_files = media_files.filter(content_type=media_type)
     
-    # Pagination with preserved query parameters
-    paginator = Paginator(media_files, 24)
-    page = request.GET.get('page')
-    media_files = paginator.get_page(page)
+    # Keyset pagination: each page is an index range scan, however deep
+    page = keyset_page(
+        media_files,
+        MEDIA_PAGE_SIZE,
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    
+    # In the picker, thumbnails come from one sprite sheet per page once it is built
+    sprite = None
+    sprite_request = None
+    if select_mode:
+        items = sprite_items(page)
+        sprite = request_sprite(items)
+        if sprite is None and items:
+            # Lets the page ask for the sheet once the worker has built it
+            sprite_request = sprite_token(items)
+        if sprite:
+            for media in page:
+                tile = sprite['tiles'].get(str(media.pk))
+                media.sprite_position = tile['position'] if tile else None
     
     context.update({
-        'media_files': media_files,
+        'media_files': page,
+        'sprite': sprite,
+        'sprite_token': sprite_request,
+        'next_page_query': _page_query(request, 'after', page.next_cursor),
+        'previous_page_query': _page_query(request, 'before', page.previous_cursor),
         'select_mode': select_mode,
         'search_query': search_query,
         'current_type': media_type,
+        'max_upload_size': MAX_UPLOAD_SIZE,
+        'max_chunked_upload_size': MAX_CHUNKED_UPLOAD_SIZE,
     })
     
     return render(request, 'media/library.html', context)
 
+def _page_query(request, direction, cursor):
+    """Query string for a neighbouring page, keeping mode, type and search"""
+    if cursor is None:
+        return None
+    params = request.GET.copy()
+    params.pop('after', None)
+    params.pop('before', None)
+    params[direction] = cursor
+    return params.urlencode()
+
+@csrf_exempt
 @login_required
 @require_POST
 def upload_media(request):
+    # The handler has to be installed before anything reads request.POST or
+    # request.FILES, including the CSRF check, hence csrf_exempt/csrf_protect
+    handler = ChecksumUploadHandler(request)
+    request.upload_handlers = [handler]
+    return _upload_media(request, handler)
+
+@csrf_protect
+def _upload_media(request, handler):
     try:
         files = request.FILES.getlist('files[]')
+
+        # The handler stops reading the request as soon as a file is too large
+        if handler.rejected:
+            return JsonResponse({
+                'status': 'error',
+                'message': f'File {handler.rejected[0]} is too large. Maximum size is {_megabytes(MAX_UPLOAD_SIZE)}.'
+            }, status=400)
+
         if not files:
             return JsonResponse({
                 'status': 'error',
                 'message': 'No files were uploaded'
             }, status=400)
 
-        # Validate file sizes
-        MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
-        for file in files:
-            if file.size > MAX_FILE_SIZE:
-                return JsonResponse({
-                    'status': 'error',
-                    'message': f'File {file.name} is too large. Maximum size is 10MB.'
-                }, status=400)
-
         uploaded_files = []
         
         for file in files:
             try:
-                content_type = determine_content_type(file.name)
-                
+                duplicate = _find_duplicate(getattr(file, 'checksum', None))
+                if duplicate:
+                    uploaded_files.append(_media_status(duplicate, duplicate=True))
+                    continue
+
                 media = MediaFile(
                     title=file.name,
                     file=file,
                     uploaded_by=request.user,
-                    content_type=content_type
+                    content_type=determine_content_type(file.name)
                 )
-                
-                # Generate thumbnail for images
-                if content_type == 'image':
-                    try:
-                        img = Image.open(file)
-                        img.thumbnail((300, 300))
-                        thumb_io = BytesIO()
-                        img.save(thumb_io, format='JPEG')
-                        
-                        thumbnail_name = f'thumb_{file.name}'
-                        media.thumbnail.save(
-                            thumbnail_name,
-                            ContentFile(thumb_io.getvalue()),
-                            save=False
-                        )
-                    except Exception as e:
-                        print(f"Thumbnail generation error: {str(e)}")
-                
+                # Images are optimized and thumbnailed by the background worker
                 media.save()
                 
-                uploaded_files.append({
-                    'id': media.id,
-                    'title': media.title,
-                    'url': media.file.url,
-                    'thumbnail': media.thumbnail.url if media.thumbnail else None,
-                })
+                uploaded_files.append(_media_status(media))
             except Exception as e:
-                print(f"Error uploading file {file.name}: {str(e)}")
+                logger.error(f"Error uploading file {file.name}: {str(e)}")
                 continue
 
         return JsonResponse({
@@ -143,6 +175,194 @@ def upload_media(request):
             'message': str(e)
         }, status=500)
 
+def _megabytes(size):
+    return f"{size // (1024 * 1024)}MB"
+
+def _find_duplicate(checksum):
+    """An existing library file with the same content, if any"""
+    if not checksum:
+        return None
+    return MediaFile.objects.filter(checksum=checksum).order_by('uploaded_at').first()
+
+@login_required
+@require_POST
+def chunked_upload_start(request):
+    """
+    Start a resumable upload. POST filename and size (and optionally the
+    sha256 checksum, to skip uploading a file the library already has).
+    """
+    filename = request.POST.get('filename', '').strip()
+    try:
+        size = int(request.POST.get('size', ''))
+    except ValueError:
+        size = -1
+    if not filename or size <= 0:
+        return JsonResponse({
+            'status': 'error',
+            'message': 'filename and size are required'
+        }, status=400)
+    if size > MAX_CHUNKED_UPLOAD_SIZE:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'File {filename} is too large. Maximum size is {_megabytes(MAX_CHUNKED_UPLOAD_SIZE)}.'
+        }, status=400)
+
+    duplicate = _find_duplicate(request.POST.get('checksum', '').lower())
+    if duplicate:
+        return JsonResponse({
+            'status': 'success',
+            'complete': True,
+            'file': _media_status(duplicate, duplicate=True),
+        })
+
+    meta = start_chunked_upload(filename, size, request.user.pk)
+    return JsonResponse({
+        'status': 'success',
+        'upload_id': meta['id'],
+        'received': 0,
+        'chunk_size': MAX_CHUNK_SIZE,
+    })
+
+@login_required
+@require_http_methods(['GET', 'POST'])
+def chunked_upload(request, upload_id):
+    """
+    GET: bytes received so far (to resume). POST: the raw bytes of the next
+    chunk, with ?offset=<byte offset>. The last chunk creates the MediaFile.
+    """
+    meta = get_chunked_upload(upload_id, request.user.pk)
+    if meta is None:
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Upload not found'
+        }, status=404)
+
+    if request.method == 'GET':
+        return JsonResponse({
+            'status': 'success',
+            'upload_id': upload_id,
+            'received': meta['received'],
+            'size': meta['size'],
+        })
+
+    try:
+        offset = int(request.GET.get('offset', meta['received']))
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Invalid offset'
+        }, status=400)
+    if length <= 0 or length > MAX_CHUNK_SIZE:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Chunks must be between 1 byte and {_megabytes(MAX_CHUNK_SIZE)}'
+        }, status=400)
+
+    try:
+        # Read straight from the request stream; the chunk is never held in memory
+        received = append_chunk(meta, offset, request, length)
+    except ValueError as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': str(e),
+            'received': get_chunked_upload(upload_id, request.user.pk)['received'],
+        }, status=409)
+
+    if received < meta['size']:
+        return JsonResponse({
+            'status': 'success',
+            'complete': False,
+            'received': received,
+        })
+
+    try:
+        part_path, checksum = finish_chunked_upload(meta)
+        media = _find_duplicate(checksum)
+        duplicate = media is not None
+        if not duplicate:
+            with open(part_path, 'rb') as f:
+                media = MediaFile(
+                    title=meta['filename'],
+                    file=File(f, name=meta['filename']),
+                    uploaded_by=request.user,
+                    content_type=determine_content_type(meta['filename']),
+                    checksum=checksum,
+                )
+                media.save()
+    except Exception as e:
+        logger.error(f"Error completing chunked upload {meta['filename']}: {str(e)}")
+        return JsonResponse({
+            'status': 'error',
+            'message': str(e)
+        }, status=500)
+    finally:
+        discard_chunked_upload(upload_id)
+
+    return JsonResponse({
+        'status': 'success',
+        'complete': True,
+        'file': _media_status(media, duplicate=duplicate),
+    })
+
+def _media_status(media, duplicate=False):
+    return {
+        'id': media.id,
+        'title': media.title,
+        'status': media.processing_status,
+        'error': media.processing_error,
+        'url': media.file.url,
+        'thumbnail': media.thumbnail.url if media.thumbnail else None,
+        'width': media.width,
+        'height': media.height,
+        'file_size': media.file_size,
+        # True when the upload matched a file already in the library
+        'duplicate': duplicate,
+    }
+
+@login_required
+def media_status(request):
+    """Processing state of uploaded files, polled by the library after an upload"""
+    try:
+        ids = [int(pk) for pk in request.GET.get('ids', '').split(',') if pk.strip()][:100]
+    except ValueError:
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Invalid ids'
+        }, status=400)
+
+    files = [_media_status(media) for media in MediaFile.objects.filter(id__in=ids)]
+    return JsonResponse({
+        'status': 'success',
+        'files': files,
+        'processing': sum(1 for item in files if item['status'] == 'processing'),
+    })
+
+@login_required
+def media_sprite(request):
+    """
+    Sprite sheet map for a page of the picker: GET token=<sprite_token from
+    the library page>. A sheet that is not built yet is queued for the job
+    worker and ``sprite`` is null until it is ready.
+    """
+    try:
+        items = items_for_token(request.GET.get('token', ''))
+    except signing.BadSignature:
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Invalid sprite token'
+        }, status=400)
+
+    try:
+        sprite = request_sprite(items)
+    except Exception as e:
+        logger.error(f"Error requesting media sprite: {str(e)}")
+        return JsonResponse({
+            'status': 'error',
+            'message': str(e)
+        }, status=500)
+    return JsonResponse({'status': 'success', 'sprite': sprite, 'pending': sprite is None and bool(items)})
+
 @require_POST
 @login_required
 def delete_media(request, id):
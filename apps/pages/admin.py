@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import User, Group
 from django.utils.html import format_html
-from .models import Page, ContentBlock, Article, ArticleCategory, MaintenanceMode, ProgramStudi, ProdiAdmin
+from .models import Page, ContentBlock, Article, ArticleCategory, MaintenanceMode, ProgramStudi, ProdiAdmin, BackgroundJob
 from unfold.admin import ModelAdmin, StackedInline
 from django.db import transaction
 # from django.contrib.admin import ModelAdmin, StackedInline
@@ -38,6 +38,10 @@ class PageAdmin(ModelAdmin):
 
     def save_formset(self, request, form, formset, change):
         instances = formset.save(commit=False)
+        # commit=False leaves removals to us; deleting here also fires the
+        # post_delete hooks that invalidate the page snapshot
+        for obj in formset.deleted_objects:
+            obj.delete()
         for instance in instances:
             if not instance.pk:  # New instance
                 instance.created_by = request.user
@@ -106,6 +110,21 @@ class ArticleCategoryAdmin(ModelAdmin):
     prepopulated_fields = {'slug': ('name',)}
     search_fields = ('name',)
 
+@admin.register(BackgroundJob)
+class BackgroundJobAdmin(ModelAdmin):
+    list_display = ('job_type', 'status', 'progress_percent', 'attempts', 'created_at', 'finished_at', 'locked_by')
+    list_filter = ('status', 'job_type')
+    readonly_fields = ('job_type', 'payload', 'attempts', 'locked_by', 'locked_at', 'result', 'error',
+                       'created_at', 'finished_at', 'singleton_key', 'progress_files', 'progress_files_total',
+                       'progress_bytes', 'progress_bytes_total')
+    fields = ('job_type', 'status', 'payload', 'attempts', 'max_attempts', 'run_after',
+              'locked_by', 'locked_at', 'singleton_key', 'progress_files', 'progress_files_total',
+              'progress_bytes', 'progress_bytes_total', 'result', 'error', 'created_at', 'finished_at')
+
+    def has_add_permission(self, request):
+        # Jobs are created by the application
+        return False
+
 @admin.register(Article)
 class ArticleAdmin(ModelAdmin):
     list_display = ('title', 'category', 'status', 'is_featured', 'published_at', 'created_by')
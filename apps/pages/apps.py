@@ -6,3 +6,11 @@ class PagesConfig(AppConfig):
     name = 'apps.pages'
     verbose_name = 'Page Management'
     label = 'pages'
+
+    def ready(self):
+        # Register cache invalidation hooks
+        from . import signals  # noqa: F401
+        # Register background job handlers
+        from . import backup_jobs  # noqa: F401
+        from . import file_listing  # noqa: F401
+        from . import static_jobs  # noqa: F401
@@ -0,0 +1,444 @@
+import contextlib
+import fcntl
+import gzip
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Incremental project backups
+# ---------------------------
+# A content-addressed repository below BACKUP_REPOSITORY_ROOT:
+#
+#   chunks/<aa>/<sha256>      file data, split into CHUNK_SIZE pieces and
+#                             named after the sha256 of the raw piece
+#   snapshots/<id>.json.gz    one manifest per backup: every file's path,
+#                             size, mtime, mode and list of chunk hashes
+#
+# A chunk is stored once however many files and snapshots use it. Files whose
+# size and mtime match the previous snapshot reuse its chunk list without
+# being read, so a nightly run only reads, hashes and compresses what changed.
+# New data is hashed and compressed in a process pool; formats that are
+# already compressed (images, video, archives) are stored as they are.
+#
+# Chunk files start with one byte: b'Z' for zlib data, b'R' for raw data.
+# Restoring writes a snapshot into a separate directory; nothing is restored
+# over the live project. Pool workers only touch files, never Django.
+
+CHUNK_SIZE = 4 * 1024 * 1024
+COMPRESS_LEVEL = 6
+# Changed data below this size is processed in this process, not a pool
+POOL_THRESHOLD = 8 * 1024 * 1024
+BATCH_BYTES = 32 * 1024 * 1024
+BATCH_FILES = 256
+
+STORED_EXTENSIONS = frozenset((
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.avif', '.heic', '.ico',
+    '.mp4', '.mov', '.webm', '.mkv', '.avi', '.mp3', '.ogg', '.m4a',
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.7z', '.rar', '.br', '.zst',
+    '.woff', '.woff2', '.pdf', '.docx', '.xlsx', '.pptx',
+))
+
+_SNAPSHOT_ID_RE = re.compile(r'^[\w.-]+$')
+_CHUNK_ZLIB = b'Z'
+_CHUNK_RAW = b'R'
+
+
+class BackupError(Exception):
+    pass
+
+
+def repository_root():
+    return getattr(settings, 'BACKUP_REPOSITORY_ROOT', None) or os.path.join(
+        settings.SECURE_DOWNLOAD_ROOT, 'backup_repository'
+    )
+
+
+def _chunk_path(repo, digest):
+    return os.path.join(repo, 'chunks', digest[:2], digest)
+
+
+def _snapshot_path(repo, snapshot_id):
+    if not _SNAPSHOT_ID_RE.match(snapshot_id or ''):
+        raise BackupError(f"Invalid snapshot id: {snapshot_id!r}")
+    return os.path.join(repo, 'snapshots', f"{snapshot_id}.json.gz")
+
+
+@contextlib.contextmanager
+def _repository_lock(repo):
+    """Exclusive lock: snapshots and garbage collection never overlap"""
+    os.makedirs(repo, exist_ok=True)
+    with open(os.path.join(repo, 'lock'), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _store_chunk(repo, digest, data, compress):
+    """Write a chunk unless it exists. Returns the bytes written (0 if it existed)."""
+    path = _chunk_path(repo, digest)
+    if os.path.exists(path):
+        return 0
+    payload = None
+    if compress:
+        compressed = zlib.compress(data, COMPRESS_LEVEL)
+        if len(compressed) < len(data):
+            payload = _CHUNK_ZLIB + compressed
+    if payload is None:
+        payload = _CHUNK_RAW + data
+    _write_atomic(path, payload)
+    return len(payload)
+
+
+def read_chunk(repo, digest, verify=True):
+    with open(_chunk_path(repo, digest), 'rb') as f:
+        payload = f.read()
+    kind, body = payload[:1], payload[1:]
+    if kind == _CHUNK_ZLIB:
+        data = zlib.decompress(body)
+    elif kind == _CHUNK_RAW:
+        data = body
+    else:
+        raise BackupError(f"Chunk {digest} has an unknown format")
+    if verify and hashlib.sha256(data).hexdigest() != digest:
+        raise BackupError(f"Chunk {digest} is corrupt")
+    return data
+
+
+def _store_files(repo, files):
+    """
+    Pool task: chunk, hash and store a batch of (path, abs_path) files.
+    Returns one result dict per file.
+    """
+    results = []
+    for rel, abs_path in files:
+        compress = os.path.splitext(rel)[1].lower() not in STORED_EXTENSIONS
+        chunks = []
+        size = new_chunks = stored_bytes = 0
+        try:
+            with open(abs_path, 'rb') as f:
+                for data in iter(lambda: f.read(CHUNK_SIZE), b''):
+                    digest = hashlib.sha256(data).hexdigest()
+                    written = _store_chunk(repo, digest, data, compress)
+                    if written:
+                        new_chunks += 1
+                        stored_bytes += written
+                    chunks.append(digest)
+                    size += len(data)
+        except OSError as e:
+            results.append({'path': rel, 'error': str(e)})
+            continue
+        results.append({
+            'path': rel,
+            'size': size,
+            'chunks': chunks,
+            'new_chunks': new_chunks,
+            'stored_bytes': stored_bytes,
+        })
+    return results
+
+
+def walk_tree(root, exclude_patterns=(), exclude_dirs=()):
+    """Yield (relative path, absolute path, stat) for every regular file below root"""
+    from .backup_utils import compile_excludes
+
+    matcher = compile_excludes(exclude_patterns, exclude_dirs)
+    if matcher(root):
+        return
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = list(it)
+        except OSError as e:
+            logger.warning(f"Cannot read {directory}: {str(e)}")
+            continue
+        for entry in entries:
+            # Excluded directories are never entered, so the entry itself is enough
+            if matcher.excludes_entry(entry.path, entry.name):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    rel = os.path.relpath(entry.path, root).replace(os.sep, '/')
+                    yield rel, entry.path, entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+
+
+def _known_chunks(repo):
+    known = set()
+    chunks_root = os.path.join(repo, 'chunks')
+    if not os.path.isdir(chunks_root):
+        return known
+    with os.scandir(chunks_root) as prefixes:
+        for prefix in prefixes:
+            if prefix.is_dir():
+                with os.scandir(prefix.path) as it:
+                    known.update(entry.name for entry in it if not entry.name.endswith('.tmp'))
+    return known
+
+
+def _batches(files):
+    batch, batch_bytes = [], 0
+    for rel, abs_path, size in files:
+        batch.append((rel, abs_path))
+        batch_bytes += size
+        if len(batch) >= BATCH_FILES or batch_bytes >= BATCH_BYTES:
+            yield batch
+            batch, batch_bytes = [], 0
+    if batch:
+        yield batch
+
+
+def list_snapshots(repo=None):
+    """Summaries (id, name, created, stats) of every snapshot, newest first"""
+    repo = repo or repository_root()
+    directory = os.path.join(repo, 'snapshots')
+    if not os.path.isdir(directory):
+        return []
+    snapshots = []
+    for filename in os.listdir(directory):
+        if not filename.endswith('.json.gz'):
+            continue
+        try:
+            manifest = load_snapshot(filename[:-len('.json.gz')], repo)
+        except (OSError, ValueError, BackupError) as e:
+            logger.error(f"Unreadable snapshot manifest {filename}: {str(e)}")
+            continue
+        snapshots.append({key: manifest.get(key) for key in ('id', 'name', 'created', 'root', 'stats')})
+    snapshots.sort(key=lambda snapshot: snapshot['created'] or 0, reverse=True)
+    return snapshots
+
+
+def load_snapshot(snapshot_id, repo=None):
+    repo = repo or repository_root()
+    with gzip.open(_snapshot_path(repo, snapshot_id), 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _latest_files(repo):
+    snapshots = list_snapshots(repo)
+    if not snapshots:
+        return {}
+    manifest = load_snapshot(snapshots[0]['id'], repo)
+    return {entry['path']: entry for entry in manifest['files']}
+
+
+def create_snapshot(root=None, name='', exclude_patterns=(), exclude_dirs=(), extra_files=None,
+                    workers=None, progress=None):
+    """
+    Back up ``root`` (BASE_DIR by default) into the repository and return the
+    snapshot summary. ``extra_files`` maps snapshot paths to files stored in
+    addition to the tree (e.g. a consistent database copy). ``progress`` is
+    called as progress(files_done, files_total, bytes_done, bytes_total).
+    """
+    started = time.monotonic()
+    repo = repository_root()
+    root = os.path.abspath(root or settings.BASE_DIR)
+    # The repository never backs up itself
+    exclude_dirs = list(exclude_dirs) + [repo]
+
+    with _repository_lock(repo):
+        previous = _latest_files(repo)
+        known = _known_chunks(repo)
+
+        entries = {}
+        for rel, abs_path, stat in walk_tree(root, exclude_patterns, exclude_dirs):
+            entries[rel] = (abs_path, stat)
+        for rel, abs_path in (extra_files or {}).items():
+            try:
+                entries[rel] = (abs_path, os.stat(abs_path))
+            except OSError as e:
+                logger.error(f"Extra backup file {abs_path} not found: {str(e)}")
+
+        files = {}
+        todo = []
+        for rel, (abs_path, stat) in entries.items():
+            record = {'path': rel, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'mode': stat.st_mode & 0o7777}
+            old = previous.get(rel)
+            if (old and old['size'] == stat.st_size and old['mtime_ns'] == stat.st_mtime_ns
+                    and all(digest in known for digest in old['chunks'])):
+                record['chunks'] = old['chunks']
+                files[rel] = record
+            else:
+                files[rel] = record
+                todo.append((rel, abs_path, stat.st_size))
+
+        files_total = len(entries)
+        bytes_total = sum(stat.st_size for _, stat in entries.values())
+        todo_bytes = sum(size for _, _, size in todo)
+        done_files = files_total - len(todo)
+        done_bytes = bytes_total - todo_bytes
+        stats = {'files': files_total, 'bytes': bytes_total, 'changed_files': len(todo),
+                 'new_chunks': 0, 'stored_bytes': 0, 'errors': 0}
+        if progress:
+            progress(done_files, files_total, done_bytes, bytes_total)
+
+        def collect(results):
+            nonlocal done_files, done_bytes
+            for result in results:
+                rel = result['path']
+                done_files += 1
+                done_bytes += files[rel]['size']
+                if 'error' in result:
+                    logger.error(f"Could not back up {rel}: {result['error']}")
+                    stats['errors'] += 1
+                    del files[rel]
+                    continue
+                files[rel]['size'] = result['size']
+                files[rel]['chunks'] = result['chunks']
+                stats['new_chunks'] += result['new_chunks']
+                stats['stored_bytes'] += result['stored_bytes']
+            if progress:
+                progress(done_files, files_total, done_bytes, bytes_total)
+
+        batches = list(_batches(todo))
+        workers = workers or os.cpu_count() or 2
+        if todo_bytes < POOL_THRESHOLD or workers == 1 or len(batches) == 1:
+            for batch in batches:
+                collect(_store_files(repo, batch))
+        else:
+            # spawn: safe from a web process with threads, and workers need no Django
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+                futures = [executor.submit(_store_files, repo, batch) for batch in batches]
+                for future in as_completed(futures):
+                    collect(future.result())
+
+        created = time.time()
+        snapshot_id = time.strftime('%Y%m%d_%H%M%S', time.localtime(created))
+        slug = re.sub(r'[^\w.-]+', '-', name).strip('-.')
+        if slug:
+            snapshot_id = f"{snapshot_id}_{slug}"
+        while os.path.exists(_snapshot_path(repo, snapshot_id)):
+            snapshot_id += '_'
+
+        stats['duration'] = round(time.monotonic() - started, 2)
+        manifest = {
+            'id': snapshot_id,
+            'name': name,
+            'created': created,
+            'root': root,
+            'chunk_size': CHUNK_SIZE,
+            'stats': stats,
+            'files': sorted(files.values(), key=lambda record: record['path']),
+        }
+        _write_atomic(
+            _snapshot_path(repo, snapshot_id),
+            gzip.compress(json.dumps(manifest, separators=(',', ':')).encode('utf-8'), 6),
+        )
+
+    logger.info(
+        f"Snapshot {snapshot_id}: {stats['files']} files, {stats['changed_files']} changed, "
+        f"{stats['new_chunks']} new chunks ({stats['stored_bytes']} bytes) in {stats['duration']}s"
+    )
+    return {key: manifest[key] for key in ('id', 'name', 'created', 'root', 'stats')}
+
+
+def _restore_target(target, rel):
+    path = os.path.normpath(os.path.join(target, rel))
+    if os.path.isabs(rel) or not path.startswith(os.path.abspath(target) + os.sep):
+        raise BackupError(f"Unsafe path in snapshot: {rel!r}")
+    return path
+
+
+def restore_snapshot(snapshot_id, target, paths=None, progress=None):
+    """
+    Write the files of a snapshot (or only those under ``paths``) below
+    ``target``. Returns the number of files restored.
+    """
+    repo = repository_root()
+    manifest = load_snapshot(snapshot_id, repo)
+    target = os.path.abspath(target)
+    prefixes = [p.strip('/') for p in paths] if paths else None
+
+    selected = [
+        entry for entry in manifest['files']
+        if prefixes is None or any(entry['path'] == p or entry['path'].startswith(p + '/') for p in prefixes)
+    ]
+    bytes_total = sum(entry['size'] for entry in selected)
+    bytes_done = 0
+    for index, entry in enumerate(selected, 1):
+        path = _restore_target(target, entry['path'])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.restore.tmp"
+        with open(tmp_path, 'wb') as f:
+            for digest in entry['chunks']:
+                f.write(read_chunk(repo, digest))
+        os.replace(tmp_path, path)
+        os.chmod(path, entry['mode'])
+        os.utime(path, ns=(entry['mtime_ns'], entry['mtime_ns']))
+        bytes_done += entry['size']
+        if progress:
+            progress(index, len(selected), bytes_done, bytes_total)
+    return len(selected)
+
+
+def verify_snapshot(snapshot_id, full=False):
+    """
+    Check that every chunk of a snapshot exists (``full``: also decompress and
+    re-hash each one). Returns {'files', 'chunks', 'missing', 'corrupt'}.
+    """
+    repo = repository_root()
+    manifest = load_snapshot(snapshot_id, repo)
+    digests = {digest for entry in manifest['files'] for digest in entry['chunks']}
+    missing, corrupt = [], []
+    for digest in sorted(digests):
+        if not os.path.exists(_chunk_path(repo, digest)):
+            missing.append(digest)
+        elif full:
+            try:
+                read_chunk(repo, digest)
+            except (OSError, zlib.error, BackupError):
+                corrupt.append(digest)
+    return {'files': len(manifest['files']), 'chunks': len(digests), 'missing': missing, 'corrupt': corrupt}
+
+
+def forget_snapshots(keep):
+    """Delete all but the newest ``keep`` snapshot manifests and unreferenced chunks"""
+    repo = repository_root()
+    removed = 0
+    with _repository_lock(repo):
+        for snapshot in list_snapshots(repo)[keep:]:
+            os.remove(_snapshot_path(repo, snapshot['id']))
+            removed += 1
+        collected = _collect_garbage(repo)
+    return removed, collected
+
+
+def _collect_garbage(repo):
+    """Delete chunks no snapshot refers to (the repository lock must be held)"""
+    referenced = set()
+    for snapshot in list_snapshots(repo):
+        for entry in load_snapshot(snapshot['id'], repo)['files']:
+            referenced.update(entry['chunks'])
+    freed = 0
+    for digest in _known_chunks(repo) - referenced:
+        path = _chunk_path(repo, digest)
+        try:
+            freed += os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            pass
+    return freed
@@ -0,0 +1,69 @@
+import logging
+
+from .backup_utils import DEFAULT_EXCLUDES, create_project_backup
+from .jobs import enqueue_once, job_handler, report_progress
+
+logger = logging.getLogger(__name__)
+
+# Project backups as background jobs
+# ----------------------------------
+# backup_api_view queues 'pages.project_backup' with enqueue_once, so a
+# second click while a backup is queued or running returns the same job.
+# The worker (manage.py run_jobs) reports files/bytes processed as the
+# snapshot is taken; on success the job result carries the URL downloading
+# the snapshot as a ZIP (superuser only, so no download token is stored in
+# the job).
+
+BACKUP_JOB_TYPE = 'pages.project_backup'
+
+
+def queue_project_backup(backup_name='', exclude_dirs=None):
+    """Returns (job, created); see enqueue_once"""
+    return enqueue_once(BACKUP_JOB_TYPE, {
+        'backup_name': backup_name,
+        'exclude_dirs': [str(path) for path in exclude_dirs or []],
+    })
+
+
+def job_status(job):
+    """JSON-ready state of a background job for the polling endpoints"""
+    return {
+        'id': job.pk,
+        'status': job.status,
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'progress': {
+            'files': job.progress_files,
+            'files_total': job.progress_files_total,
+            'bytes': job.progress_bytes,
+            'bytes_total': job.progress_bytes_total,
+            'percent': job.progress_percent,
+        },
+        'result': job.result,
+        # Only the exception line; the traceback stays in the admin
+        'error': job.error.strip().splitlines()[-1] if job.status == 'failed' and job.error else '',
+    }
+
+
+@job_handler(BACKUP_JOB_TYPE)
+def project_backup_job(payload):
+    def progress(files_done, files_total, bytes_done, bytes_total):
+        report_progress(files_done, files_total, bytes_done, bytes_total)
+
+    result = create_project_backup(
+        backup_name=payload.get('backup_name', ''),
+        exclude_patterns=DEFAULT_EXCLUDES,
+        exclude_dirs=payload.get('exclude_dirs', []),
+        progress=progress,
+    )
+    if not result['success']:
+        raise RuntimeError(result.get('error', 'Unknown error occurred'))
+
+    stats = result['snapshot']
+    report_progress(stats['files'], stats['files'], stats['bytes'], stats['bytes'], force=True)
+    return {
+        'filename': result['filename'],
+        'size': result['size'],
+        'snapshot': stats,
+        'download_url': result['path'],
+    }
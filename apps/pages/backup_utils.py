@@ -1,11 +1,18 @@
+import fnmatch
+import functools
+import hashlib
+import json
 import os
-import sys
-import subprocess
+import re
 import shutil
 import logging
-import datetime
+import time
 from pathlib import Path
 from django.conf import settings
+from django.urls import reverse
+
+from .backup_engine import create_snapshot, repository_root
+from .db_snapshot import apply_retention, snapshot_database
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +36,58 @@ DEFAULT_EXCLUDES = [
     '*.tmp',
 ]
 
+# Exclude matching
+# ----------------
+# ExcludeMatcher compiles a set of exclude patterns and directories once:
+# plain names go into a set, glob patterns into one combined regex and the
+# excluded directories are resolved to absolute paths up front. Walkers
+# prune an excluded directory as soon as they meet it, so below that point
+# only the entry's own name (and path) has to be checked.
+
+class ExcludeMatcher:
+    """should_exclude() for a fixed set of patterns and directories"""
+    
+    def __init__(self, exclude_patterns=(), exclude_dirs=()):
+        names, paths, globs = set(), set(), []
+        for pattern in exclude_patterns:
+            if any(c in pattern for c in '*?['):
+                globs.append(fnmatch.translate(pattern))
+            elif os.sep in pattern or '/' in pattern:
+                paths.add(pattern)
+            else:
+                names.add(pattern)
+        self.names = frozenset(names)
+        self.paths = frozenset(paths)
+        self.regex = re.compile('|'.join(globs)) if globs else None
+        self.dirs = frozenset(os.path.abspath(d) for d in exclude_dirs if d)
+        self.dir_prefixes = tuple(d.rstrip(os.sep) + os.sep for d in self.dirs)
+        self.fingerprint = hashlib.sha1(
+            repr((sorted(exclude_patterns), sorted(self.dirs))).encode()
+        ).hexdigest()
+    
+    def excludes_entry(self, path, name):
+        """Check one entry of a directory that is itself not excluded"""
+        if name in self.names or path in self.paths or path in self.dirs:
+            return True
+        return self.regex is not None and self.regex.match(name) is not None
+    
+    def __call__(self, path):
+        path = os.path.abspath(path)
+        if path in self.dirs or path.startswith(self.dir_prefixes):
+            return True
+        return self.excludes_entry(path, os.path.basename(path))
+
+
+@functools.lru_cache(maxsize=32)
+def _cached_matcher(exclude_patterns, exclude_dirs):
+    return ExcludeMatcher(exclude_patterns, exclude_dirs)
+
+
+def compile_excludes(exclude_patterns, exclude_dirs):
+    """The (cached) ExcludeMatcher for these patterns and directories"""
+    return _cached_matcher(tuple(exclude_patterns), tuple(str(d) for d in exclude_dirs if d))
+
+
 def should_exclude(path, exclude_patterns, exclude_dirs):
     """
     Determine if a file or directory should be excluded from the backup.
@@ -41,27 +100,92 @@ def should_exclude(path, exclude_patterns, exclude_dirs):
     Returns:
         bool: True if the path should be excluded, False otherwise
     """
-    path = Path(path)
-    
-    # Check if path is in excluded directories
-    for dir_path in exclude_dirs:
+    return compile_excludes(exclude_patterns, exclude_dirs)(path)
+
+
+# Size estimation
+# ---------------
+# The size of every directory's own files is kept in a small JSON file in
+# the backup repository (one per exclude set), together with the directory's
+# mtime and its included subdirectories. An unchanged directory costs one
+# stat on the next estimate; only directories whose mtime changed (an entry
+# was added, removed or renamed) are scanned again. Files growing in place
+# do not touch the directory's mtime, so entries are also rescanned after
+# SIZE_CACHE_MAX_AGE.
+
+SIZE_CACHE_MAX_AGE = 24 * 60 * 60
+
+
+def _size_cache_path(matcher):
+    return os.path.join(repository_root(), f"size-cache-{matcher.fingerprint[:16]}.json")
+
+
+def _load_size_cache(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_size_cache(path, entries):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(entries, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not save the size cache {path}: {str(e)}")
+
+
+def tree_size(root, matcher, cache=None, now=None):
+    """
+    Total size of the files below root that matcher does not exclude.
+    ``cache`` maps directory paths to [mtime_ns, checked_at, size, subdirs]
+    and is updated in place; directories not reached are dropped from it.
+    """
+    cache = {} if cache is None else cache
+    now = now or time.time()
+    total = 0
+    seen = set()
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        seen.add(directory)
         try:
-            if os.path.abspath(path).startswith(os.path.abspath(dir_path)):
-                return True
-        except Exception:
+            mtime_ns = os.stat(directory).st_mtime_ns
+        except OSError:
+            cache.pop(directory, None)
             continue
-    
-    # Check if path matches any exclude pattern
-    for pattern in exclude_patterns:
-        # Simple pattern matching - could be enhanced with regex for more complex patterns
-        if pattern.startswith('*') and path.name.endswith(pattern[1:]):
-            return True
-        elif pattern.endswith('*') and path.name.startswith(pattern[:-1]):
-            return True
-        elif pattern == path.name or pattern == str(path):
-            return True
-    
-    return False
+        cached = cache.get(directory)
+        if cached and cached[0] == mtime_ns and now - cached[1] < SIZE_CACHE_MAX_AGE:
+            size, subdirs = cached[2], cached[3]
+        else:
+            size, subdirs = 0, []
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if matcher.excludes_entry(entry.path, entry.name):
+                            continue
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                subdirs.append(entry.name)
+                            elif entry.is_file(follow_symlinks=False):
+                                size += entry.stat(follow_symlinks=False).st_size
+                        except OSError:
+                            # Skip files that can't be accessed
+                            continue
+            except OSError as e:
+                logger.warning(f"Cannot read {directory}: {str(e)}")
+            cache[directory] = [mtime_ns, now, size, subdirs]
+        total += size
+        stack.extend(os.path.join(directory, name) for name in subdirs)
+    # Forget directories that are gone or no longer included
+    for directory in set(cache) - seen:
+        del cache[directory]
+    return total
+
 
 def get_project_size_estimation(exclude_patterns=None, exclude_dirs=None):
     """
@@ -81,27 +205,17 @@ def get_project_size_estimation(exclude_patterns=None, exclude_dirs=None):
         exclude_dirs = []
     
     project_root = os.path.abspath(settings.BASE_DIR)
-    total_size = 0
+    # Same exclusions as create_project_backup()
+    exclude_dirs = list(exclude_dirs) + [settings.SECURE_DOWNLOAD_ROOT]
+    matcher = compile_excludes(exclude_patterns, exclude_dirs)
+    if matcher(project_root):
+        return format_size(0)
     
     try:
-        for root, dirs, files in os.walk(project_root):
-            # Check if current directory should be excluded
-            if should_exclude(root, exclude_patterns, exclude_dirs):
-                dirs[:] = []  # Don't explore subdirectories
-                continue
-            
-            # Filter dirs
-            dirs[:] = [d for d in dirs if not should_exclude(os.path.join(root, d), exclude_patterns, exclude_dirs)]
-            
-            # Add file sizes
-            for file in files:
-                file_path = os.path.join(root, file)
-                if not should_exclude(file_path, exclude_patterns, exclude_dirs):
-                    try:
-                        total_size += os.path.getsize(file_path)
-                    except (OSError, FileNotFoundError):
-                        # Skip files that can't be accessed
-                        continue
+        cache_path = _size_cache_path(matcher)
+        cache = _load_size_cache(cache_path)
+        total_size = tree_size(project_root, matcher, cache)
+        _save_size_cache(cache_path, cache)
     
     except Exception as e:
         logger.error(f"Error estimating project size: {str(e)}")
@@ -157,15 +271,28 @@ def format_size(size_bytes):
     
     return f"{size_bytes:.2f} {size_names[i]}"
 
-def backup_sqlite_database():
+def _sqlite_database_path():
+    """Path of the default database if it is SQLite, else None"""
+    db_settings = getattr(settings, 'DATABASES', {}).get('default', {})
+    if db_settings.get('ENGINE') == 'django.db.backends.sqlite3' and db_settings.get('NAME'):
+        return os.path.abspath(db_settings['NAME'])
+    return None
+
+def backup_sqlite_database(compress=None, retention=True):
     """
-    Create a backup of the SQLite database with the specified filename format.
+    Create a consistent online snapshot of the SQLite database (see
+    db_snapshot.py) with the specified filename format.
+    
+    Args:
+        compress (bool): gzip the snapshot (default: settings.DB_BACKUP_COMPRESS)
+        retention (bool): Apply the hourly/daily/weekly retention policy afterwards
     
     Returns:
         dict: Result dictionary with keys:
             - success (bool): Whether the backup was successful
             - filename (str): Name of the backup file (if successful)
             - path (str): Path to the backup file (if successful)
+            - sha256 (str): Checksum of the backup file (if successful)
             - error (str): Error message (if unsuccessful)
     """
     try:
@@ -175,28 +302,28 @@ def backup_sqlite_database():
             if db_settings.get('ENGINE') == 'django.db.backends.sqlite3':
                 db_path = db_settings.get('NAME')
                 if db_path and os.path.exists(db_path):
-                    # Create backup directory if it doesn't exist
                     backup_dir = os.path.join(settings.SECURE_DOWNLOAD_ROOT)
-                    os.makedirs(backup_dir, exist_ok=True)
-                    
-                    # Generate filename with the requested format: db.sqlite3-2025-04-08---00-29
-                    timestamp = datetime.datetime.now().strftime("%Y-%m-%d---%H-%M")
-                    backup_filename = f"db.sqlite3-{timestamp}"
-                    backup_path = os.path.join(backup_dir, backup_filename)
+                    if compress is None:
+                        compress = getattr(settings, 'DB_BACKUP_COMPRESS', False)
                     
-                    # Copy the database file
-                    shutil.copy2(db_path, backup_path)
+                    # Paged copy through the SQLite backup API, safe while the site writes
+                    backup_path, checksum = snapshot_database(db_path, backup_dir, compress=compress)
+                    backup_filename = os.path.basename(backup_path)
                     
                     backup_size = os.path.getsize(backup_path)
                     backup_size_formatted = format_size(backup_size)
                     
                     logger.info(f"Database backup completed: {backup_path} ({backup_size_formatted})")
                     
+                    if retention:
+                        apply_retention(backup_dir)
+                    
                     return {
                         'success': True,
                         'filename': backup_filename,
                         'path': backup_path,
-                        'size': backup_size_formatted
+                        'size': backup_size_formatted,
+                        'sha256': checksum
                     }
                 else:
                     error_msg = f"SQLite database file not found at {db_path}"
@@ -226,22 +353,29 @@ def backup_sqlite_database():
             'error': str(e)
         }
 
-def create_project_backup(backup_name=None, exclude_patterns=None, exclude_dirs=None, backup_db=True):
+def create_project_backup(backup_name=None, exclude_patterns=None, exclude_dirs=None, backup_db=True,
+                          progress=None):
     """
-    Create a backup of the project directory using the Linux zip command.
+    Create an incremental snapshot of the project directory in the backup
+    repository (see backup_engine.py). Only files changed since the last
+    snapshot are read; only data not stored yet takes space.
     
     Args:
-        backup_name (str): Optional name for the backup file
+        backup_name (str): Optional name added to the snapshot id
         exclude_patterns (list): List of patterns to exclude
         exclude_dirs (list): List of directories to exclude
-        backup_db (bool): Whether to create a separate backup of the SQLite database
+        backup_db (bool): Whether to take a consistent copy of the SQLite
+            database and store it in the snapshot in place of the live file
+        progress (callable): Called as progress(files_done, files_total, bytes_done, bytes_total)
     
     Returns:
         dict: Result dictionary with keys:
             - success (bool): Whether the backup was successful
-            - filename (str): Name of the backup file (if successful)
-            - path (str): Path to the backup file (if successful)
-            - size (str): Human-readable size of the backup file (if successful)
+            - filename (str): Snapshot id (if successful)
+            - path (str): URL path downloading the snapshot as a ZIP archive (if successful)
+            - manifest (str): Path to the snapshot manifest (if successful)
+            - size (str): Human-readable size of the new data stored (if successful)
+            - snapshot (dict): Snapshot statistics (if successful)
             - error (str): Error message (if unsuccessful)
             - db_backup (dict): Database backup result (if backup_db is True)
     """
@@ -251,132 +385,59 @@ def create_project_backup(backup_name=None, exclude_patterns=None, exclude_dirs=
     if exclude_dirs is None:
         exclude_dirs = []
     
-    # Get project root directory and set up backup directory
     project_root = os.path.abspath(settings.BASE_DIR)
-    backup_dir = os.path.join(settings.SECURE_DOWNLOAD_ROOT)
+    # Earlier backups and downloads are never part of a backup
+    exclude_dirs = list(exclude_dirs) + [settings.SECURE_DOWNLOAD_ROOT]
+    db_backup_result = None
     
     try:
-        # Create database backup if requested
-        db_backup_result = None
-        if backup_db:
-            db_backup_result = backup_sqlite_database()
-            if db_backup_result and db_backup_result.get('success'):
-                logger.info(f"SQLite database backup created: {db_backup_result.get('filename')}")
-            else:
-                logger.warning("SQLite database backup failed or not applicable")
-        
-        # Verify that zip command is available
-        try:
-            subprocess.run(['zip', '--version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
-        except (subprocess.SubprocessError, FileNotFoundError) as e:
-            logger.error(f"zip command not available: {str(e)}")
-            return {
-                'success': False,
-                'error': "zip command not available on the server. Please contact the administrator.",
-                'db_backup': db_backup_result
-            }
-        
-        # Make sure backup directory exists
-        os.makedirs(backup_dir, exist_ok=True)
-        
-        # Generate backup filename with timestamp if not provided
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        if not backup_name:
-            backup_name = f"project_backup_{timestamp}"
-        elif not backup_name.endswith(".zip"):
-            backup_name = f"{backup_name}_{timestamp}"
-        
-        if not backup_name.endswith(".zip"):
-            backup_name += ".zip"
-        
-        backup_path = os.path.join(backup_dir, backup_name)
-        
-        # Create a temporary file with exclusion patterns
-        exclude_file_path = os.path.join(backup_dir, f"temp_exclude_{timestamp}.txt")
-        
-        with open(exclude_file_path, 'w') as exclude_file:
-            for pattern in exclude_patterns:
-                exclude_file.write(f"{pattern}\n")
+        extra_files = {}
+        db_path = _sqlite_database_path()
+        if db_path:
+            db_excluded = should_exclude(db_path, [], exclude_dirs)
+            # The live database file (and its journal) could be copied torn
+            exclude_dirs += [db_path + suffix for suffix in ('', '-wal', '-shm', '-journal')]
             
-            # Add excluded directories
-            for dir_path in exclude_dirs:
-                if os.path.exists(dir_path):
-                    # Convert to relative path from project root if possible
-                    try:
-                        rel_path = os.path.relpath(dir_path, project_root)
-                        exclude_file.write(f"{rel_path}/*\n")
-                    except ValueError:
-                        # If not relative, add the full path
-                        exclude_file.write(f"{dir_path}/*\n")
-        
-        logger.info(f"Starting backup to {backup_path}")
+            # Create database backup if requested
+            if backup_db and not db_excluded:
+                # Uncompressed, so unchanged pages dedupe against earlier snapshots
+                db_backup_result = backup_sqlite_database(compress=False)
+                if db_backup_result and db_backup_result.get('success'):
+                    logger.info(f"SQLite database backup created: {db_backup_result.get('filename')}")
+                    if os.path.abspath(db_path).startswith(project_root + os.sep):
+                        extra_files[os.path.relpath(db_path, project_root)] = db_backup_result['path']
+                else:
+                    logger.warning("SQLite database backup failed or not applicable")
         
-        # Build zip command
-        # -r: recursive
-        # -q: quiet (less verbose output)
-        # -x@: exclude files listed in the file
-        zip_cmd = [
-            'zip', '-r', '-q',
-            backup_path,
-            '.',
-            '-x@' + exclude_file_path
-        ]
+        logger.info(f"Starting backup snapshot of {project_root}")
+        snapshot = create_snapshot(
+            root=project_root,
+            name=backup_name or '',
+            exclude_patterns=exclude_patterns,
+            exclude_dirs=exclude_dirs,
+            extra_files=extra_files,
+            workers=getattr(settings, 'BACKUP_WORKERS', None),
+            progress=progress,
+        )
+        stats = snapshot['stats']
+        manifest_path = os.path.join(repository_root(), 'snapshots', f"{snapshot['id']}.json.gz")
         
-        # Change to project root and run zip command
-        original_dir = os.getcwd()
-        os.chdir(project_root)
+        logger.info(f"Backup completed: {snapshot['id']} ({format_size(stats['stored_bytes'])} new)")
         
-        try:
-            # Execute zip command
-            process = subprocess.run(
-                zip_cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                check=False  # Don't raise exception, we'll handle errors ourselves
-            )
-            
-            # Check if command was successful
-            if process.returncode != 0:
-                error_msg = process.stderr or f"zip command failed with return code {process.returncode}"
-                logger.error(f"Backup failed: {error_msg}")
-                return {
-                    'success': False,
-                    'error': error_msg,
-                    'db_backup': db_backup_result
-                }
-            
-            # Get backup file size
-            backup_size = os.path.getsize(backup_path)
-            backup_size_formatted = format_size(backup_size)
-            
-            logger.info(f"Backup completed: {backup_path} ({backup_size_formatted})")
-            
-            result = {
-                'success': True,
-                'filename': backup_name,
-                'path': backup_path,
-                'size': backup_size_formatted,
-                'db_backup': db_backup_result
-            }
-        
-        finally:
-            # Clean up
-            os.chdir(original_dir)
-            
-            # Remove temporary exclusion file
-            try:
-                if os.path.exists(exclude_file_path):
-                    os.remove(exclude_file_path)
-            except Exception as e:
-                logger.warning(f"Failed to remove temporary exclusion file: {str(e)}")
-        
-        return result
+        return {
+            'success': True,
+            'filename': snapshot['id'],
+            'path': reverse('backup_snapshot_download', kwargs={'snapshot_id': snapshot['id']}),
+            'manifest': manifest_path,
+            'size': format_size(stats['stored_bytes']),
+            'snapshot': stats,
+            'db_backup': db_backup_result
+        }
     
     except Exception as e:
         logger.exception(f"Backup failed: {str(e)}")
         return {
             'success': False,
             'error': str(e),
-            'db_backup': db_backup_result if 'db_backup_result' in locals() else None
-        }
\ No newline at end of file
+            'db_backup': db_backup_result
+        }
@@ -0,0 +1,251 @@
+import logging
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+DEFAULT_L1_EXCLUDE_PREFIXES = (
+    'cache_tag:',               # apps/pages/utils.py tag generations
+    'page_snapshot_version:',   # apps/pages/snapshots.py
+    'cache_stats',              # apps/pages/cache_stats.py per-process totals
+    'image_index_',             # apps/pages/image_index.py change log
+)
+
+
+class TieredCache(BaseCache):
+    """
+    Two-tier cache backend: an in-process LRU (L1) in front of a shared
+    Django cache (L2), e.g. Redis or a FileBasedCache on the same host.
+
+    Reads are answered from L1 when possible. Writes, deletes and counters
+    always go to L2 first, so L2 stays the source of truth; L1 entries only
+    live for L1_TIMEOUT seconds, which bounds how stale another worker's
+    view of a key can be.
+
+    Keys starting with one of L1_EXCLUDE_PREFIXES are never held in L1.
+    The defaults are the invalidation keys (cache tag generations, page
+    snapshot versions) and the shared cache stats. Content entries read from
+    L1 are still checked against the current generation in L2, so an edit
+    in one worker shows up in every other one immediately.
+
+    Example:
+        CACHES = {
+            'default': {
+                'BACKEND': 'apps.pages.cache_backends.TieredCache',
+                'OPTIONS': {
+                    'L2_ALIAS': 'l2',
+                    'L1_MAX_BYTES': 64 * 1024 * 1024,
+                    'L1_TIMEOUT': 5,
+                    'L1_EXCLUDE_PREFIXES': ('cache_tag:', 'page_snapshot_version:'),
+                },
+            },
+            'l2': {
+                'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                'LOCATION': 'redis://127.0.0.1:6379/1',
+            },
+        }
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._l2_alias = options.get('L2_ALIAS', 'l2')
+        self._l1_max_bytes = int(options.get('L1_MAX_BYTES', 64 * 1024 * 1024))
+        self._l1_max_entry_bytes = int(options.get('L1_MAX_ENTRY_BYTES', self._l1_max_bytes // 8))
+        self._l1_timeout = float(options.get('L1_TIMEOUT', 5))
+        self._l1_exclude_prefixes = tuple(options.get('L1_EXCLUDE_PREFIXES', DEFAULT_L1_EXCLUDE_PREFIXES))
+
+        # key -> (expires_at, pickled value); ordered from least to most recently used
+        self._l1 = OrderedDict()
+        self._l1_bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            'l1_hits': 0,
+            'l2_hits': 0,
+            'misses': 0,
+            'sets': 0,
+            'deletes': 0,
+            'l1_evictions': 0,
+        }
+
+    @property
+    def l2(self):
+        return caches[self._l2_alias]
+
+    # L1 helpers -----------------------------------------------------------
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def _in_l1(self, key):
+        return not str(key).startswith(self._l1_exclude_prefixes)
+
+    def _l1_get(self, key):
+        with self._lock:
+            item = self._l1.get(key)
+            if item is None:
+                return _MISSING
+            expires_at, data = item
+            if expires_at <= time.monotonic():
+                self._l1_discard_locked(key)
+                return _MISSING
+            self._l1.move_to_end(key)
+        # Values are stored pickled so callers never share a mutable object
+        return pickle.loads(data)
+
+    def _l1_set(self, key, value, timeout):
+        ttl = self._l1_timeout
+        if timeout is not None and timeout != DEFAULT_TIMEOUT:
+            if timeout <= 0:
+                self._l1_discard(key)
+                return
+            ttl = min(ttl, timeout)
+
+        try:
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            self._l1_discard(key)
+            return
+
+        with self._lock:
+            self._l1_discard_locked(key)
+            if len(data) > self._l1_max_entry_bytes:
+                return
+            self._l1[key] = (time.monotonic() + ttl, data)
+            self._l1_bytes += len(data)
+            # Size-based LRU eviction
+            while self._l1_bytes > self._l1_max_bytes and self._l1:
+                _, (_, evicted) = self._l1.popitem(last=False)
+                self._l1_bytes -= len(evicted)
+                self._stats['l1_evictions'] += 1
+
+    def _l1_discard_locked(self, key):
+        item = self._l1.pop(key, None)
+        if item is not None:
+            self._l1_bytes -= len(item[1])
+
+    def _l1_discard(self, key):
+        with self._lock:
+            self._l1_discard_locked(key)
+
+    # Cache API ------------------------------------------------------------
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        l1_key = self.make_and_validate_key(key, version=version)
+        added = self.l2.add(key, value, timeout, version=version)
+        if added and self._in_l1(key):
+            self._l1_set(l1_key, value, timeout)
+        else:
+            self._l1_discard(l1_key)
+        return added
+
+    def get(self, key, default=None, version=None):
+        l1_key = self.make_and_validate_key(key, version=version)
+        in_l1 = self._in_l1(key)
+        value = self._l1_get(l1_key) if in_l1 else _MISSING
+        if value is not _MISSING:
+            self._count('l1_hits')
+            return value
+
+        value = self.l2.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            self._count('misses')
+            return default
+
+        self._count('l2_hits')
+        if in_l1:
+            self._l1_set(l1_key, value, None)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        l1_key = self.make_and_validate_key(key, version=version)
+        self.l2.set(key, value, timeout, version=version)
+        if self._in_l1(key):
+            self._l1_set(l1_key, value, timeout)
+        self._count('sets')
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self._l1_discard(self.make_and_validate_key(key, version=version))
+        return self.l2.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self._l1_discard(self.make_and_validate_key(key, version=version))
+        self._count('deletes')
+        return self.l2.delete(key, version=version)
+
+    def get_many(self, keys, version=None):
+        found = {}
+        remaining = []
+        for key in keys:
+            l1_key = self.make_and_validate_key(key, version=version)
+            value = self._l1_get(l1_key) if self._in_l1(key) else _MISSING
+            if value is _MISSING:
+                remaining.append(key)
+            else:
+                found[key] = value
+        self._count('l1_hits', len(found))
+
+        if remaining:
+            from_l2 = self.l2.get_many(remaining, version=version)
+            self._count('l2_hits', len(from_l2))
+            self._count('misses', len(remaining) - len(from_l2))
+            for key, value in from_l2.items():
+                if self._in_l1(key):
+                    self._l1_set(self.make_and_validate_key(key, version=version), value, None)
+            found.update(from_l2)
+        return found
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.l2.set_many(data, timeout, version=version)
+        for key, value in data.items():
+            if key not in failed and self._in_l1(key):
+                self._l1_set(self.make_and_validate_key(key, version=version), value, timeout)
+        self._count('sets', len(data))
+        return failed
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self._l1_discard(self.make_and_validate_key(key, version=version))
+        self._count('deletes', len(keys))
+        return self.l2.delete_many(keys, version=version)
+
+    def has_key(self, key, version=None):
+        if self._in_l1(key) and self._l1_get(self.make_and_validate_key(key, version=version)) is not _MISSING:
+            return True
+        return self.l2.has_key(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self._l1_discard(self.make_and_validate_key(key, version=version))
+        return self.l2.incr(key, delta, version=version)
+
+    def clear(self):
+        with self._lock:
+            self._l1.clear()
+            self._l1_bytes = 0
+        return self.l2.clear()
+
+    def close(self, **kwargs):
+        self.l2.close(**kwargs)
+
+    def info(self):
+        """Hit/miss/eviction counters for this process, shown in cache management"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                'l1_entries': len(self._l1),
+                'l1_bytes': self._l1_bytes,
+                'l1_max_bytes': self._l1_max_bytes,
+                'l1_timeout': self._l1_timeout,
+            })
+        stats['l2_backend'] = f"{type(self.l2).__module__}.{type(self.l2).__name__}"
+        lookups = stats['l1_hits'] + stats['l2_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['l1_hits'] + stats['l2_hits']) / lookups, 4) if lookups else None
+        return stats
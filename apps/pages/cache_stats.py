@@ -0,0 +1,234 @@
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Per-view counters kept by togglable_cache. Requests only touch counters
+# local to the process; at most every CACHE_STATS_FLUSH_INTERVAL seconds the
+# process writes its running totals as one dict under its own key (a single
+# set_many, no read-merge-write), so concurrent workers never lose updates.
+# The admin view sums the dicts of every process that has written one.
+# Processes register themselves in a shared list; reset_cache_stats starts a
+# new epoch, which every process notices on its next flush.
+METRICS = (
+    'hits',          # fresh entry served
+    'stale_hits',    # expired entry served while another worker regenerates
+    'misses',        # no entry, or the entry was expired
+    'invalidated',   # entry found but one of its tags had moved on
+    'evictions',     # entry this process filled gone before its timeout (culled by the backend)
+    'fills',         # responses rendered and stored
+    'fill_ms',       # total render time of those fills
+    'fill_bytes',    # total body size of those fills
+)
+
+STATS_FLUSH_INTERVAL = getattr(settings, 'CACHE_STATS_FLUSH_INTERVAL', 10)
+MAX_KEYS_PER_VIEW = getattr(settings, 'CACHE_STATS_MAX_KEYS', 200)
+
+PROCESSES_KEY = 'cache_stats_processes'
+EPOCH_KEY = 'cache_stats_epoch'
+
+_lock = threading.Lock()
+# Running totals of this process since it started (or since the last reset)
+_counters = defaultdict(lambda: defaultdict(int))
+# view -> cache_key -> {'hits', 'size', 'expires_at'}
+_keys = defaultdict(dict)
+_state = {'last_flush': time.monotonic(), 'dirty': False, 'epoch': None}
+
+
+def _process_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _process_key(process_id):
+    return f"cache_stats_process:{process_id}"
+
+
+def _stats_enabled():
+    return getattr(settings, 'CACHE_STATS_ENABLED', True)
+
+
+def _note_key(view_name, cache_key, hits=0, size=None, expires_at=None):
+    entry = _keys[view_name].setdefault(cache_key, {'hits': 0, 'size': 0, 'expires_at': 0})
+    entry['hits'] += hits
+    if size is not None:
+        entry['size'] = size
+    if expires_at is not None:
+        entry['expires_at'] = expires_at
+
+
+def record_hit(view_name, cache_key, stale=False):
+    if not _stats_enabled():
+        return
+    with _lock:
+        _counters[view_name]['stale_hits' if stale else 'hits'] += 1
+        _note_key(view_name, cache_key, hits=1)
+        _state['dirty'] = True
+    flush_cache_stats()
+
+
+def record_miss(view_name, cache_key, entry_found=False, invalidated=False):
+    """
+    Count a lookup that could not be served fresh.
+
+    A missing entry whose last fill by this process had not yet expired is
+    counted as an eviction as well: nothing in the app deletes view entries,
+    so the backend culled it.
+    """
+    if not _stats_enabled():
+        return
+    with _lock:
+        counters = _counters[view_name]
+        if invalidated:
+            counters['invalidated'] += 1
+        else:
+            counters['misses'] += 1
+            if not entry_found:
+                known = _keys.get(view_name, {}).get(cache_key)
+                if known and known.get('expires_at', 0) > time.time():
+                    counters['evictions'] += 1
+        _state['dirty'] = True
+    flush_cache_stats()
+
+
+def record_fill(view_name, cache_key, seconds, size, expires_at):
+    if not _stats_enabled():
+        return
+    with _lock:
+        counters = _counters[view_name]
+        counters['fills'] += 1
+        counters['fill_ms'] += int(seconds * 1000)
+        counters['fill_bytes'] += size
+        _note_key(view_name, cache_key, size=size, expires_at=expires_at)
+        _state['dirty'] = True
+    flush_cache_stats()
+
+
+def _trim_keys(keys):
+    if len(keys) <= MAX_KEYS_PER_VIEW:
+        return keys
+    ranked = sorted(keys.items(), key=lambda item: (item[1]['hits'], item[1]['size']), reverse=True)
+    return dict(ranked[:MAX_KEYS_PER_VIEW])
+
+
+def flush_cache_stats(force=False):
+    """Publish this process's running totals (one get_many and one set_many)"""
+    now = time.monotonic()
+    with _lock:
+        if not _state['dirty'] or (not force and now - _state['last_flush'] < STATS_FLUSH_INTERVAL):
+            return
+        _state['last_flush'] = now
+        _state['dirty'] = False
+
+    process_id = _process_id()
+    try:
+        shared = cache.get_many([EPOCH_KEY, PROCESSES_KEY])
+        epoch = shared.get(EPOCH_KEY)
+        with _lock:
+            if epoch != _state['epoch']:
+                if _state['epoch'] is not None:
+                    # Reset from another process: drop what was counted before it
+                    _counters.clear()
+                    _keys.clear()
+                _state['epoch'] = epoch
+            for view_name in list(_keys):
+                _keys[view_name] = _trim_keys(_keys[view_name])
+            snapshot = {
+                'counters': {view: dict(values) for view, values in _counters.items()},
+                'keys': {view: {key: dict(entry) for key, entry in keys.items()} for view, keys in _keys.items()},
+            }
+
+        values = {_process_key(process_id): snapshot}
+        processes = shared.get(PROCESSES_KEY) or []
+        if process_id not in processes:
+            # Lost registrations (two processes registering at once) heal on the next flush
+            values[PROCESSES_KEY] = processes + [process_id]
+        cache.set_many(values, None)
+    except Exception as e:
+        logger.error(f"Could not flush cache stats: {str(e)}")
+
+
+def _snapshots():
+    """The published totals of every process"""
+    processes = cache.get(PROCESSES_KEY) or []
+    values = cache.get_many([_process_key(process_id) for process_id in processes]) if processes else {}
+    return list(values.values())
+
+
+def get_view_stats(view_names):
+    """
+    Shared counters for the given views.
+
+    Returns a dict keyed by view name with every metric in METRICS plus the
+    derived hit_rate, avg_fill_ms and avg_size.
+    """
+    flush_cache_stats(force=True)
+    snapshots = _snapshots()
+
+    stats = {}
+    for view_name in view_names:
+        view_stats = {metric: 0 for metric in METRICS}
+        for snapshot in snapshots:
+            for metric, amount in snapshot['counters'].get(view_name, {}).items():
+                view_stats[metric] = view_stats.get(metric, 0) + amount
+        served = view_stats['hits'] + view_stats['stale_hits']
+        lookups = served + view_stats['misses'] + view_stats['invalidated']
+        view_stats['hit_rate'] = round(served / lookups, 4) if lookups else None
+        fills = view_stats['fills']
+        view_stats['avg_fill_ms'] = round(view_stats['fill_ms'] / fills, 1) if fills else None
+        view_stats['avg_size'] = int(view_stats['fill_bytes'] / fills) if fills else None
+        stats[view_name] = view_stats
+    return stats
+
+
+def get_top_keys(view_names, limit=10):
+    """
+    Tracked cache keys across the given views.
+
+    Returns a dict with 'by_size' and 'by_hits', each a list of
+    {'view', 'key', 'hits', 'size', 'expires_at'} dicts.
+    """
+    flush_cache_stats(force=True)
+
+    merged = {}
+    for snapshot in _snapshots():
+        for view_name in view_names:
+            for cache_key, entry in snapshot['keys'].get(view_name, {}).items():
+                row = merged.setdefault((view_name, cache_key), {
+                    'view': view_name, 'key': cache_key, 'hits': 0, 'size': 0, 'expires_at': 0,
+                })
+                row['hits'] += entry.get('hits', 0)
+                # The latest fill across processes
+                if entry.get('expires_at', 0) >= row['expires_at']:
+                    row['size'] = entry.get('size', 0)
+                    row['expires_at'] = entry.get('expires_at', 0)
+    rows = list(merged.values())
+
+    return {
+        'by_size': sorted(rows, key=lambda row: row['size'], reverse=True)[:limit],
+        'by_hits': sorted(rows, key=lambda row: row['hits'], reverse=True)[:limit],
+    }
+
+
+def reset_cache_stats(view_names):
+    """
+    Drop the collected stats. Every process clears its totals on its next
+    flush, when it sees the new epoch; the stats are not split by view, so
+    view_names is only kept for callers.
+    """
+    processes = cache.get(PROCESSES_KEY) or []
+    epoch = uuid.uuid4().hex
+    cache.set(EPOCH_KEY, epoch, None)
+    cache.delete_many([PROCESSES_KEY] + [_process_key(process_id) for process_id in processes])
+    with _lock:
+        _counters.clear()
+        _keys.clear()
+        _state['dirty'] = False
+        _state['epoch'] = epoch
@@ -0,0 +1,188 @@
+import logging
+import math
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+from django.test import Client
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+
+from .utils import CACHED_VIEWS_REGISTRY
+
+logger = logging.getLogger(__name__)
+
+NEWS_PAGE_SIZE = 9  # keep in step with the Paginator in news_view
+
+
+def _iter_patterns(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from _iter_patterns(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern):
+            yield pattern
+
+
+def get_cached_route_urls():
+    """URLs in the root URLconf that take no arguments and point at a togglable_cache view"""
+    urls = []
+    for pattern in _iter_patterns(get_resolver().url_patterns):
+        if pattern.pattern.regex.groups or not pattern.name:
+            continue
+        if getattr(pattern.callback, '__name__', None) not in CACHED_VIEWS_REGISTRY:
+            continue
+        try:
+            urls.append(reverse(pattern.name))
+        except Exception:
+            continue
+    return urls
+
+
+def get_static_sitemap_urls():
+    from config.sitemap import StaticViewSitemap
+
+    sitemap = StaticViewSitemap()
+    urls = []
+    for item in sitemap.items():
+        try:
+            urls.append(sitemap.location(item))
+        except Exception as e:
+            logger.warning(f"Skipping sitemap item '{item}': {str(e)}")
+    return urls
+
+
+def get_news_urls(max_pages=None):
+    """The news listing, one URL per page of the unfiltered list"""
+    from .models import Article
+
+    articles = Article.objects.visible()
+    total = articles.count()
+    if articles.filter(is_featured=True).exists():
+        total -= 1  # the featured article is shown above the list, not in it
+
+    pages = max(1, math.ceil(total / NEWS_PAGE_SIZE))
+    if max_pages:
+        pages = min(pages, max_pages)
+
+    news_url = reverse('news')
+    return [news_url] + [f"{news_url}?page={number}" for number in range(2, pages + 1)]
+
+
+def get_article_urls():
+    from .sitemaps import ArticleSitemap
+
+    return [article.get_absolute_url() for article in ArticleSitemap().items()]
+
+
+def get_course_urls():
+    from .views import get_all_courses
+
+    urls = [reverse('maven_courses')]
+    urls += [reverse('maven_course_detail', args=[course.slug]) for course in get_all_courses()]
+    return urls
+
+
+def collect_warm_urls(news_pages=None, include_articles=True, include_courses=True):
+    """
+    List the public URLs worth pre-rendering after a deploy.
+
+    Returns URLs in this order, without duplicates: argument-free routes of
+    cached views, the static sitemap, the news pages, published articles
+    and Maven course pages.
+    """
+    urls = get_cached_route_urls() + get_static_sitemap_urls() + get_news_urls(news_pages)
+    if include_articles:
+        urls += get_article_urls()
+    if include_courses:
+        urls += get_course_urls()
+    return list(dict.fromkeys(urls))
+
+
+def _warm_host():
+    host = getattr(settings, 'WARM_CACHE_HOST', None)
+    if host:
+        return host
+    for allowed in settings.ALLOWED_HOSTS:
+        if allowed and '*' not in allowed and not allowed.startswith('.'):
+            return allowed
+    return 'localhost'
+
+
+def _fetch(url, host, secure):
+    client = Client(HTTP_HOST=host, HTTP_ACCEPT_ENCODING='gzip')
+    started = time.monotonic()
+    try:
+        response = client.get(url, secure=secure)
+        return {
+            'url': url,
+            'status': response.status_code,
+            'seconds': time.monotonic() - started,
+            'bytes': len(response.content) if not response.streaming else 0,
+            'error': None,
+        }
+    except Exception as e:
+        return {
+            'url': url,
+            'status': None,
+            'seconds': time.monotonic() - started,
+            'bytes': 0,
+            'error': str(e),
+        }
+    finally:
+        # Each pool thread holds its own database connection
+        connections.close_all()
+
+
+def warm_urls(urls, workers=4, callback=None):
+    """
+    Request every URL through the test client so cached views fill their entries.
+
+    Args:
+        urls: paths to request
+        workers: size of the thread pool; keeps warming from competing with
+            live traffic for every CPU and database connection
+        callback: optional function called with each result, in URL order
+
+    Returns a list of result dicts (url, status, seconds, bytes, error) in
+    the order the URLs were given.
+    """
+    host = _warm_host()
+    secure = getattr(settings, 'SECURE_SSL_REDIRECT', False)
+
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [executor.submit(_fetch, url, host, secure) for url in urls]
+        for future in futures:
+            result = future.result()
+            if callback:
+                callback(result)
+            results.append(result)
+    return results
+
+
+def spawn_warm_cache(refresh=True):
+    """
+    Start ``manage.py warm_cache`` in a separate process; used as a post-deploy hook.
+
+    A fresh process loads the code and templates that were just deployed,
+    whereas a thread in the running worker would render with the old ones.
+    """
+    command = [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'warm_cache']
+    if refresh:
+        command.append('--refresh')
+    try:
+        process = subprocess.Popen(
+            command,
+            cwd=settings.BASE_DIR,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        logger.info(f"Cache warming started (pid {process.pid})")
+        return process.pid
+    except Exception as e:
+        logger.error(f"Could not start cache warming: {str(e)}")
+        return None
@@ -0,0 +1,192 @@
+import datetime
+import gzip
+import hashlib
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Online SQLite snapshots
+# -----------------------
+# The live database is copied with SQLite's backup API, PAGES_PER_STEP pages
+# at a time with a short sleep after every step, so writers get the database
+# in between and the copy is a consistent point-in-time image (a file copy
+# taken while the site writes can be torn).
+#
+# When another connection writes during the copy SQLite restarts it; after
+# MAX_RESTARTS restarts the rest is copied in a single step instead, which
+# only holds a read lock (and in WAL mode does not block writers at all).
+#
+# The copy is checked with PRAGMA quick_check, optionally gzip-compressed as
+# a stream, and a <file>.sha256 written next to it (sha256sum -c format).
+# apply_retention() keeps the newest snapshot of each of the last KEEP_HOURLY
+# hours, KEEP_DAILY days and KEEP_WEEKLY weeks and deletes the rest.
+
+PAGES_PER_STEP = getattr(settings, 'DB_BACKUP_PAGES_PER_STEP', 256)
+STEP_SLEEP = getattr(settings, 'DB_BACKUP_STEP_SLEEP', 0.01)
+MAX_RESTARTS = 3
+KEEP_HOURLY = getattr(settings, 'DB_BACKUP_KEEP_HOURLY', 24)
+KEEP_DAILY = getattr(settings, 'DB_BACKUP_KEEP_DAILY', 7)
+KEEP_WEEKLY = getattr(settings, 'DB_BACKUP_KEEP_WEEKLY', 4)
+
+# Name format used since the first database backups: db.sqlite3-2025-04-08---00-29
+FILENAME_PREFIX = 'db.sqlite3-'
+TIMESTAMP_FORMAT = '%Y-%m-%d---%H-%M'
+_SNAPSHOT_NAME_RE = re.compile(r'^db\.sqlite3-(\d{4}-\d{2}-\d{2}---\d{2}-\d{2})(\.gz)?$')
+
+
+class _Restarted(Exception):
+    pass
+
+
+class _HashingWriter:
+    """File wrapper that hashes everything written through it"""
+
+    def __init__(self, f):
+        self.f = f
+        self.digest = hashlib.sha256()
+
+    def write(self, data):
+        self.digest.update(data)
+        return self.f.write(data)
+
+    def flush(self):
+        self.f.flush()
+
+
+def copy_database(db_path, dest_path, pages=PAGES_PER_STEP, step_sleep=STEP_SLEEP):
+    """Consistent copy of a live SQLite database to dest_path using the backup API"""
+    source = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=30)
+    try:
+        state = {'remaining': None, 'restarts': 0}
+
+        def progress(status, remaining, total):
+            if state['remaining'] is not None and remaining > state['remaining']:
+                state['restarts'] += 1
+                if state['restarts'] > MAX_RESTARTS:
+                    raise _Restarted()
+            state['remaining'] = remaining
+            # Let writers in between steps
+            time.sleep(step_sleep)
+
+        try:
+            _backup_into(source, dest_path, pages=pages, progress=progress)
+        except _Restarted:
+            logger.warning(f"Database backup restarted {MAX_RESTARTS} times under writes, copying in one step")
+            _backup_into(source, dest_path, pages=-1)
+    finally:
+        source.close()
+
+
+def _backup_into(source, dest_path, **kwargs):
+    if os.path.exists(dest_path):
+        os.remove(dest_path)
+    dest = sqlite3.connect(dest_path)
+    try:
+        source.backup(dest, **kwargs)
+        result = dest.execute('PRAGMA quick_check').fetchone()[0]
+        if result != 'ok':
+            raise sqlite3.DatabaseError(f"Backup copy failed quick_check: {result}")
+    finally:
+        dest.close()
+
+
+def file_sha256(path, block_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def snapshot_database(db_path, backup_dir, compress=False, now=None):
+    """
+    Write a consistent (optionally gzip-compressed) snapshot of db_path into
+    backup_dir with a .sha256 file next to it. Returns (path, sha256).
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    now = now or datetime.datetime.now()
+    filename = f"{FILENAME_PREFIX}{now.strftime(TIMESTAMP_FORMAT)}"
+    if compress:
+        filename += '.gz'
+    path = os.path.join(backup_dir, filename)
+    copy_path = os.path.join(backup_dir, f".{FILENAME_PREFIX}{os.getpid()}.tmp")
+
+    try:
+        copy_database(db_path, copy_path)
+        if compress:
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(copy_path, 'rb') as source, open(tmp_path, 'wb') as out:
+                writer = _HashingWriter(out)
+                with gzip.GzipFile(filename=os.path.basename(db_path), mode='wb', fileobj=writer, compresslevel=6) as gz:
+                    shutil.copyfileobj(source, gz, 1024 * 1024)
+            checksum = writer.digest.hexdigest()
+            os.replace(tmp_path, path)
+        else:
+            checksum = file_sha256(copy_path)
+            os.replace(copy_path, path)
+    finally:
+        for leftover in (copy_path, f"{path}.{os.getpid()}.tmp"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+    with open(f"{path}.sha256", 'w') as f:
+        f.write(f"{checksum}  {filename}\n")
+    return path, checksum
+
+
+def list_database_snapshots(backup_dir):
+    """(timestamp, path) of every database snapshot in backup_dir, newest first"""
+    snapshots = []
+    if not os.path.isdir(backup_dir):
+        return snapshots
+    for name in os.listdir(backup_dir):
+        match = _SNAPSHOT_NAME_RE.match(name)
+        if match:
+            taken = datetime.datetime.strptime(match.group(1), TIMESTAMP_FORMAT)
+            snapshots.append((taken, os.path.join(backup_dir, name)))
+    snapshots.sort(reverse=True)
+    return snapshots
+
+
+def apply_retention(backup_dir, keep_hourly=KEEP_HOURLY, keep_daily=KEEP_DAILY, keep_weekly=KEEP_WEEKLY):
+    """Delete database snapshots outside the hourly/daily/weekly policy. Returns the paths removed."""
+    snapshots = list_database_snapshots(backup_dir)
+    keep = set()
+    for count, bucket in (
+        (keep_hourly, lambda taken: taken.strftime('%Y-%m-%d %H')),
+        (keep_daily, lambda taken: taken.date()),
+        (keep_weekly, lambda taken: taken.isocalendar()[:2]),
+    ):
+        seen = set()
+        for taken, path in snapshots:
+            key = bucket(taken)
+            if key in seen:
+                continue
+            if len(seen) >= count:
+                break
+            seen.add(key)
+            # Newest first, so this is the latest snapshot of its bucket
+            keep.add(path)
+
+    removed = []
+    for _, path in snapshots:
+        if path in keep:
+            continue
+        for victim in (path, f"{path}.sha256"):
+            try:
+                os.remove(victim)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f"Could not delete old database backup {victim}: {str(e)}")
+        removed.append(path)
+    if removed:
+        logger.info(f"Database backup retention removed {len(removed)} snapshots")
+    return removed
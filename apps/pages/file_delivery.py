@@ -0,0 +1,275 @@
+import logging
+import mimetypes
+import os
+import re
+from urllib.parse import quote, unquote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import content_disposition_header, http_date, parse_etags, parse_http_date_safe
+
+from .utils import safe_join_paths
+
+logger = logging.getLogger(__name__)
+
+# File delivery
+# -------------
+# One place that sends files to the client: /media/, /static/ and the secure
+# download browser all end in deliver_file(), after their own access checks.
+#
+# FILE_DELIVERY_MODE picks who moves the bytes:
+#   'python'     - Django streams the file (Range, ETag, If-None-Match and
+#                  If-Modified-Since are handled here; full files go through
+#                  FileResponse so the WSGI server can use sendfile)
+#   'x-accel'    - nginx: the response only carries X-Accel-Redirect with an
+#                  internal location, nginx reads and sends the file
+#   'x-sendfile' - Apache mod_xsendfile / lighttpd: X-Sendfile with the path
+#
+# For 'x-accel' every delivery root is exposed below FILE_DELIVERY_ACCEL_PREFIX
+# as an internal location, e.g. with the default prefix:
+#
+#   location /protected/media/   { internal; alias /srv/cms/media/; }
+#   location /protected/static/  { internal; alias /srv/cms/staticfiles/; }
+#   location /protected/secure/  { internal; alias /srv/cms/secure_downloads/; }
+#
+# Conditional requests are still answered here in every mode (the file has
+# been stat'ed anyway), so a 304 never reaches the proxy. Files outside the
+# known roots are always streamed by Django.
+#
+# FILE_DELIVERY_FAKE_PROXY enables apps.pages.middleware.file_delivery.
+# FakeProxyMiddleware, which resolves offload headers the way the proxy would,
+# so the offload modes can be run and tested with runserver.
+
+MODE_PYTHON = 'python'
+MODE_X_ACCEL = 'x-accel'
+MODE_X_SENDFILE = 'x-sendfile'
+MODES = (MODE_PYTHON, MODE_X_ACCEL, MODE_X_SENDFILE)
+
+STREAM_BLOCK_SIZE = 64 * 1024
+
+# Compressed files are sent as they are, never with a Content-Encoding
+ENCODED_CONTENT_TYPES = {
+    'bzip2': 'application/x-bzip',
+    'gzip': 'application/gzip',
+    'xz': 'application/x-xz',
+    'br': 'application/x-brotli',
+    'compress': 'application/x-compress',
+}
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def delivery_mode():
+    mode = getattr(settings, 'FILE_DELIVERY_MODE', MODE_PYTHON)
+    if mode not in MODES:
+        logger.error(f"Unknown FILE_DELIVERY_MODE {mode!r}, using {MODE_PYTHON!r}")
+        return MODE_PYTHON
+    return mode
+
+
+def delivery_roots():
+    """(name, real directory path) of every root files are delivered from"""
+    roots = []
+    for name, root in (
+        ('media', settings.MEDIA_ROOT),
+        ('static', settings.STATIC_ROOT),
+        ('secure', getattr(settings, 'SECURE_DOWNLOAD_ROOT', None)),
+    ):
+        if root:
+            roots.append((name, os.path.realpath(root)))
+    return roots
+
+
+def accel_location(path):
+    """Internal nginx URI for a file, or None when it is outside every root"""
+    prefix = getattr(settings, 'FILE_DELIVERY_ACCEL_PREFIX', '/protected/')
+    real_path = os.path.realpath(path)
+    for name, root in delivery_roots():
+        if real_path.startswith(root + os.sep):
+            rel = os.path.relpath(real_path, root).replace(os.sep, '/')
+            return f"{prefix.rstrip('/')}/{name}/{quote(rel)}"
+    return None
+
+
+def resolve_accel_location(uri):
+    """File path for an internal URI made by accel_location, or None"""
+    prefix = getattr(settings, 'FILE_DELIVERY_ACCEL_PREFIX', '/protected/').rstrip('/') + '/'
+    if not uri.startswith(prefix):
+        return None
+    name, _, rel = uri[len(prefix):].partition('/')
+    for root_name, root in delivery_roots():
+        if root_name == name:
+            path = safe_join_paths(root, unquote(rel))
+            return str(path) if path else None
+    return None
+
+
+def guess_content_type(path):
+    content_type, encoding = mimetypes.guess_type(str(path))
+    content_type = ENCODED_CONTENT_TYPES.get(encoding, content_type)
+    return content_type or 'application/octet-stream'
+
+
+def file_etag(stat):
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def _opaque_tag(etag):
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def _etag_matches(header, etag):
+    """Weak comparison, as If-None-Match requires"""
+    etags = parse_etags(header)
+    if '*' in etags:
+        return True
+    return _opaque_tag(etag) in [_opaque_tag(value) for value in etags]
+
+
+def is_not_modified(request, stat, etag):
+    """True when the client's cached copy (If-None-Match / If-Modified-Since) is current"""
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return if_modified_since is not None and int(stat.st_mtime) <= if_modified_since
+
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive for a single "bytes=" range, None to send the
+    whole file (no header, several ranges or another unit) or False when
+    the range cannot be satisfied.
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if first == '' and last == '':
+        return None
+    if first == '':
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+
+def _if_range_allows(request, stat, etag):
+    """A Range is only honoured when If-Range (if any) still matches the file"""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        # Weak validators never match If-Range
+        return if_range == etag
+    date = parse_http_date_safe(if_range)
+    return date is not None and int(stat.st_mtime) == date
+
+
+def _iter_range(f, start, length):
+    try:
+        f.seek(start)
+        while length > 0:
+            block = f.read(min(length, STREAM_BLOCK_SIZE))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+    finally:
+        f.close()
+
+
+def _set_common_headers(response, stat, etag, as_attachment, filename, cache_control):
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['ETag'] = etag
+    response['Accept-Ranges'] = 'bytes'
+    if cache_control:
+        response['Cache-Control'] = cache_control
+    disposition = content_disposition_header(as_attachment, filename) if (as_attachment or filename) else None
+    if disposition:
+        response['Content-Disposition'] = disposition
+    # Byte ranges and sendfile need the body exactly as stored on disk
+    response.file_delivery = True
+    return response
+
+
+def _offload_response(mode, path, content_type):
+    if mode == MODE_X_ACCEL:
+        location = accel_location(path)
+        if location is None:
+            return None
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = location
+    else:
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = os.path.realpath(path)
+    return response
+
+
+def stream_file(request, path, stat, content_type):
+    """The Python delivery: whole file, one byte range, or 416"""
+    size = stat.st_size
+    byte_range = parse_range(request.META.get('HTTP_RANGE'), size) if _if_range_allows(request, stat, file_etag(stat)) else None
+
+    if byte_range is False:
+        response = HttpResponse(status=416, content_type=content_type)
+        response['Content-Range'] = f"bytes */{size}"
+        return response
+
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type)
+        response['Content-Length'] = str(size)
+        return response
+
+    if byte_range is None:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+        response['Content-Length'] = str(size)
+        return response
+
+    start, end = byte_range
+    length = end - start + 1
+    response = StreamingHttpResponse(_iter_range(open(path, 'rb'), start, length), status=206, content_type=content_type)
+    response['Content-Range'] = f"bytes {start}-{end}/{size}"
+    response['Content-Length'] = str(length)
+    return response
+
+
+def deliver_file(request, path, as_attachment=False, filename=None, content_type=None, cache_control=None, mode=None):
+    """
+    Response sending the file at ``path``. Access checks are the caller's
+    job; this only decides how the bytes get to the client (see above).
+    Raises Http404 when there is no such file.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        raise Http404('File not found')
+    if not os.path.isfile(path):
+        raise Http404('File not found')
+
+    content_type = content_type or guess_content_type(path)
+    filename = filename or (os.path.basename(str(path)) if as_attachment else None)
+    etag = file_etag(stat)
+
+    if is_not_modified(request, stat, etag):
+        response = HttpResponseNotModified()
+        return _set_common_headers(response, stat, etag, False, None, cache_control)
+
+    mode = mode or delivery_mode()
+    response = None
+    if mode != MODE_PYTHON:
+        response = _offload_response(mode, path, content_type)
+        if response is None:
+            logger.warning(f"{path} is outside the delivery roots, streaming it from Django")
+    if response is None:
+        response = stream_file(request, path, stat, content_type)
+
+    return _set_common_headers(response, stat, etag, as_attachment, filename, cache_control)
@@ -0,0 +1,158 @@
+import hashlib
+import logging
+import mimetypes
+import os
+
+from django.core.cache import cache
+
+from .jobs import enqueue_once, job_handler
+from .models import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+# Directory listings for the secure file browser
+# ----------------------------------------------
+# One os.scandir pass per directory: type and stat come from the DirEntry,
+# and the resulting (name, is_dir, size, mtime) rows are cached for
+# LISTING_TTL seconds under the directory's mtime, so adding, removing or
+# renaming an entry gives a new key straight away. Sorting, filtering and
+# pagination run on the cached rows; MIME types are only guessed for the
+# rows actually shown.
+#
+# Recursive directory sizes are computed by a background job
+# ('pages.directory_size', one at a time per directory) that walks the tree
+# once and caches the size and file count of every directory below it.
+
+LISTING_TTL = 30
+SIZE_TTL = 15 * 60
+PAGE_SIZE = 100
+SORT_FIELDS = ('name', 'size', 'modified')
+
+DIRECTORY_SIZE_JOB = 'pages.directory_size'
+
+
+def _path_key(path):
+    return hashlib.sha1(os.path.realpath(path).encode()).hexdigest()
+
+
+def scan_directory(path):
+    """Rows (name, is_dir, size, mtime) of a directory, from a short-lived cache"""
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        return []
+    key = f"dir_listing:{_path_key(path)}:{mtime_ns}"
+    rows = cache.get(key)
+    if rows is not None:
+        return rows
+
+    rows = []
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                is_dir = entry.is_dir()
+                stat = entry.stat()
+            except OSError as e:
+                logger.error(f"Error getting file details for {entry.path}: {e}")
+                continue
+            rows.append((entry.name, is_dir, 0 if is_dir else stat.st_size, stat.st_mtime))
+    cache.set(key, rows, LISTING_TTL)
+    return rows
+
+
+def sort_and_filter(rows, query='', sort='name', descending=False):
+    """Rows matching ``query`` (case-insensitive), directories first, sorted by ``sort``"""
+    if query:
+        query = query.lower()
+        rows = [row for row in rows if query in row[0].lower()]
+    if sort == 'size':
+        sort_key = lambda row: row[2]
+    elif sort == 'modified':
+        sort_key = lambda row: row[3]
+    else:
+        sort_key = lambda row: row[0].lower()
+    rows = sorted(rows, key=sort_key, reverse=descending)
+    # Stable: directories stay first in either order
+    return sorted(rows, key=lambda row: not row[1])
+
+
+def describe(row):
+    """Template dict for one row"""
+    name, is_dir, size, mtime = row
+    return {
+        'name': name,
+        'is_dir': is_dir,
+        'size': size,
+        'modified': mtime,
+        'content_type': 'directory' if is_dir else mimetypes.guess_type(name)[0] or 'application/octet-stream',
+    }
+
+
+def directory_sizes(paths):
+    """{path: {'size', 'files'}} for the directories whose recursive size is known"""
+    keys = {f"dir_size:{_path_key(path)}": path for path in paths}
+    found = cache.get_many(list(keys))
+    return {keys[key]: value for key, value in found.items()}
+
+
+def _size_job_key(path):
+    return f"dir_size:{_path_key(path)}"[:100]
+
+
+def request_directory_sizes(path):
+    """Queue the size computation for a directory tree (once while one is pending)"""
+    enqueue_once(DIRECTORY_SIZE_JOB, {'path': os.path.realpath(path)}, key=_size_job_key(path))
+
+
+def directory_size_pending(path):
+    """True while the size computation for a directory tree is queued or running"""
+    return BackgroundJob.objects.filter(singleton_key=_size_job_key(path), status__in=['queued', 'running']).exists()
+
+
+def compute_directory_sizes(root):
+    """Walk root once and cache the recursive size and file count of every directory in it"""
+    totals = {}
+    # Post-order walk: a directory is summed after all its children
+    stack = [(root, False)]
+    children = {}
+    while stack:
+        path, visited = stack.pop()
+        if visited:
+            size, files = totals[path]
+            for child in children.pop(path, []):
+                child_size, child_files = totals[child]
+                size += child_size
+                files += child_files
+            totals[path] = (size, files)
+            continue
+        size = files = 0
+        subdirs = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            size += entry.stat(follow_symlinks=False).st_size
+                            files += 1
+                    except OSError:
+                        continue
+        except OSError as e:
+            logger.warning(f"Cannot read {path}: {str(e)}")
+        totals[path] = (size, files)
+        children[path] = subdirs
+        stack.append((path, True))
+        stack.extend((subdir, False) for subdir in subdirs)
+
+    cache.set_many(
+        {f"dir_size:{_path_key(path)}": {'size': size, 'files': files} for path, (size, files) in totals.items()},
+        SIZE_TTL,
+    )
+    return totals.get(root, (0, 0))
+
+
+@job_handler(DIRECTORY_SIZE_JOB)
+def directory_size_job(payload):
+    size, files = compute_directory_sizes(payload['path'])
+    return {'size': size, 'files': files}
@@ -0,0 +1,285 @@
+import contextlib
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Responsive image derivatives
+# ----------------------------
+# Every source image is resized once per content hash into DERIVATIVE_WIDTHS
+# (never upscaled) in WebP, and AVIF when Pillow can encode it. Files go to
+# <DERIVATIVES_ROOT>/<hash[:2]>/<hash>/<width>.<ext>, so the same picture
+# uploaded twice or served from both static and media shares one set.
+#
+# manifest.json maps a source URL to its hash, dimensions and variant URLs.
+# Templates only read the in-memory copy of that manifest; a source that is
+# not in it yet is queued for a background thread (or built ahead of time by
+# `manage.py generate_image_derivatives`) and served as the original file.
+
+DERIVATIVE_WIDTHS = (300, 800, 1200, 1920)
+DERIVATIVES_ROOT = getattr(settings, 'IMAGE_DERIVATIVES_ROOT', os.path.join(settings.MEDIA_ROOT, 'derivatives'))
+DERIVATIVES_URL = getattr(settings, 'IMAGE_DERIVATIVES_URL', f"{settings.MEDIA_URL}derivatives/")
+MANIFEST_PATH = os.path.join(DERIVATIVES_ROOT, 'manifest.json')
+MANIFEST_LOCK_PATH = os.path.join(DERIVATIVES_ROOT, 'manifest.lock')
+# How often a process looks for manifest changes written by other processes
+MANIFEST_RELOAD_INTERVAL = 10
+
+WEBP_QUALITY = 80
+AVIF_QUALITY = 60
+SOURCE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tiff')
+
+try:
+    import pillow_avif  # noqa: F401  Registers AVIF support on older Pillow
+except ImportError:
+    pass
+
+FORMATS = [('webp', 'WEBP', {'quality': WEBP_QUALITY, 'method': 4})]
+if 'AVIF' in Image.SAVE:
+    FORMATS.insert(0, ('avif', 'AVIF', {'quality': AVIF_QUALITY}))
+
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp'}
+
+_manifest = {'entries': {}, 'mtime': None, 'checked': 0.0}
+_manifest_lock = threading.Lock()
+
+
+def normalize_source(img_url):
+    """The manifest key for an image URL: no leading slash or static/ prefix"""
+    key = (img_url or '').split('?')[0].lstrip('/')
+    if key.startswith('static/'):
+        key = key[7:]
+    return key
+
+
+def _read_manifest_file():
+    try:
+        with open(MANIFEST_PATH, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logger.error(f"Could not read image manifest: {str(e)}")
+        return {}
+
+
+def load_manifest(force=False):
+    now = time.monotonic()
+    with _manifest_lock:
+        if not force and now - _manifest['checked'] < MANIFEST_RELOAD_INTERVAL:
+            return _manifest['entries']
+        _manifest['checked'] = now
+        try:
+            mtime = os.stat(MANIFEST_PATH).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == _manifest['mtime'] and not force:
+            return _manifest['entries']
+
+    entries = _read_manifest_file()
+    with _manifest_lock:
+        _manifest['entries'] = entries
+        _manifest['mtime'] = mtime
+    return entries
+
+
+def get_derivatives(img_url):
+    """Manifest entry for an image URL, or None when it has not been processed"""
+    return load_manifest().get(normalize_source(img_url))
+
+
+@contextlib.contextmanager
+def _manifest_file_lock():
+    """Exclusive lock across processes: every worker runs its own builder thread"""
+    os.makedirs(DERIVATIVES_ROOT, exist_ok=True)
+    with open(MANIFEST_LOCK_PATH, 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def update_manifest(changes, removals=()):
+    """Merge entries into manifest.json (read, merge, atomic replace, under the manifest lock)"""
+    with _manifest_file_lock():
+        entries = _read_manifest_file()
+        entries.update(changes)
+        for key in removals:
+            entries.pop(key, None)
+
+        tmp_path = f"{MANIFEST_PATH}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, MANIFEST_PATH)
+        mtime = os.stat(MANIFEST_PATH).st_mtime_ns
+
+    with _manifest_lock:
+        _manifest['entries'] = entries
+        _manifest['mtime'] = mtime
+        _manifest['checked'] = time.monotonic()
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _derivative_dir(content_hash):
+    return os.path.join(DERIVATIVES_ROOT, content_hash[:2], content_hash)
+
+
+def _derivative_url(content_hash, filename):
+    return f"{DERIVATIVES_URL}{content_hash[:2]}/{content_hash}/{filename}"
+
+
+def _target_widths(width):
+    widths = [w for w in DERIVATIVE_WIDTHS if w < width]
+    # Always include one variant at (or capped to) the source width
+    widths.append(min(width, DERIVATIVE_WIDTHS[-1]))
+    return sorted(set(widths))
+
+
+def build_derivatives(source_path):
+    """
+    Create the derivatives for one source file unless its hash already has them.
+
+    Returns the manifest entry (hash, width, height, variants) or None if the
+    file could not be processed.
+    """
+    content_hash = _file_hash(source_path)
+    target_dir = _derivative_dir(content_hash)
+    index_path = os.path.join(target_dir, 'index.json')
+
+    if os.path.exists(index_path):
+        with open(index_path, 'r') as f:
+            return json.load(f)
+
+    try:
+        with Image.open(source_path) as img:
+            if getattr(img, 'is_animated', False):
+                # Resizing would keep only the first frame
+                return None
+            img.load()
+            width, height = img.size
+            if img.mode not in ('RGB', 'RGBA'):
+                img = img.convert('RGBA' if 'transparency' in img.info or img.mode in ('LA', 'P') else 'RGB')
+
+            os.makedirs(target_dir, exist_ok=True)
+            variants = {fmt: {} for fmt, _, _ in FORMATS}
+            for target_width in _target_widths(width):
+                if target_width < width:
+                    resized = img.resize(
+                        (target_width, max(1, round(height * target_width / width))),
+                        Image.Resampling.LANCZOS,
+                    )
+                else:
+                    resized = img
+                for fmt, pil_format, options in FORMATS:
+                    filename = f"{target_width}.{fmt}"
+                    resized.save(os.path.join(target_dir, filename), pil_format, **options)
+                    variants[fmt][str(target_width)] = _derivative_url(content_hash, filename)
+    except Exception as e:
+        logger.error(f"Could not build image derivatives for {source_path}: {str(e)}")
+        return None
+
+    entry = {'hash': content_hash, 'width': width, 'height': height, 'variants': variants}
+    # Written last: its presence marks the set as complete
+    with open(index_path, 'w') as f:
+        json.dump(entry, f)
+    return entry
+
+
+def process_source(img_url, source_path, source_url=None):
+    """Build (or reuse) derivatives for a source and record them in the manifest"""
+    entry = build_derivatives(source_path)
+    if entry is None:
+        return None
+    stat = os.stat(source_path)
+    entry = dict(entry, path=str(source_path), url=source_url, mtime=stat.st_mtime, size=stat.st_size)
+    update_manifest({normalize_source(img_url): entry})
+    return entry
+
+
+def forget_source(img_url):
+    """Drop a source from the manifest, e.g. when the file was replaced or deleted"""
+    update_manifest({}, removals=[normalize_source(img_url)])
+
+
+def is_stale(entry):
+    """True when the source file changed since its derivatives were built"""
+    try:
+        stat = os.stat(entry['path'])
+    except (KeyError, OSError):
+        return True
+    return stat.st_mtime != entry.get('mtime') or stat.st_size != entry.get('size')
+
+
+# Background builder
+# ------------------
+# Templates never resize images; unknown sources are handed to this thread.
+
+_queue = queue.Queue(maxsize=500)
+_pending = set()
+_failed = set()  # sources that could not be processed; not retried by this process
+_pending_lock = threading.Lock()
+_worker = {'thread': None}
+
+
+def _work():
+    while True:
+        img_url, source_path, source_url = _queue.get()
+        try:
+            if process_source(img_url, source_path, source_url) is None:
+                with _pending_lock:
+                    _failed.add(normalize_source(img_url))
+        except Exception as e:
+            logger.error(f"Image derivative job failed for {img_url}: {str(e)}")
+        finally:
+            with _pending_lock:
+                _pending.discard(normalize_source(img_url))
+            _queue.task_done()
+
+
+def request_derivatives(img_url, source_path, source_url=None):
+    """Queue a source for background processing (at most once at a time)"""
+    key = normalize_source(img_url)
+    if not source_path or not key.lower().endswith(SOURCE_EXTENSIONS):
+        return
+    with _pending_lock:
+        if key in _pending or key in _failed:
+            return
+        if _worker['thread'] is None or not _worker['thread'].is_alive():
+            _worker['thread'] = threading.Thread(target=_work, name='image-derivatives', daemon=True)
+            _worker['thread'].start()
+        try:
+            _queue.put_nowait((img_url, source_path, source_url))
+            _pending.add(key)
+        except queue.Full:
+            pass
+
+
+def pick_variant(entry, fmt, max_width):
+    """URL of the widest variant in ``fmt`` not wider than max_width (or the smallest one)"""
+    variants = entry['variants'].get(fmt) or {}
+    if not variants:
+        return None
+    widths = sorted(int(w) for w in variants)
+    fitting = [w for w in widths if w <= max_width] if max_width else widths
+    return variants[str(fitting[-1] if fitting else widths[0])]
+
+
+def srcset(entry, fmt):
+    variants = entry['variants'].get(fmt) or {}
+    return ', '.join(f"{url} {width}w" for width, url in sorted(variants.items(), key=lambda item: int(item[0])))
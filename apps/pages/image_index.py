@@ -0,0 +1,317 @@
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from PIL import Image
+
+from .image_derivatives import DERIVATIVES_ROOT, normalize_source
+
+logger = logging.getLogger(__name__)
+
+# Image asset index
+# -----------------
+# An in-memory map from image URL to its file, public URL, WebP sibling and
+# dimensions, so template tags resolve images without touching the disk.
+#
+# Built once per web process at startup (config/wsgi.py) by scanning the
+# image roots (STATIC_ROOT, MEDIA_ROOT, BASE_DIR/static, apps/pages/static;
+# the first root holding a path wins).
+# Media files are also keyed as media/<path>, the form their URLs take.
+# Rendering never rescans: a URL that is not indexed is probed on disk once
+# per process and then remembered.
+#
+# Media uploads and deletes update the single entry with record_file() /
+# forget_file(), which also append the change to a short log in the shared
+# cache. Every process checks the log's generation at most every
+# INDEX_CHECK_INTERVAL seconds and applies the changes it missed, one entry
+# at a time.
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tiff', '.svg', '.avif')
+INDEX_CHECK_INTERVAL = getattr(settings, 'IMAGE_INDEX_CHECK_INTERVAL', 5)
+GENERATION_KEY = 'image_index_generation'
+CHANGE_KEY = 'image_index_change:{}'
+CHANGE_TIMEOUT = 60 * 60
+MAX_CHANGES_APPLIED = 500
+
+_index = {
+    'entries': {},      # key -> entry
+    'by_path': {},      # file path -> entry
+    'generation': None,
+    'checked': 0.0,
+}
+_misses = set()
+_lock = threading.RLock()
+
+
+def _roots():
+    """(directory, URL prefix) in lookup order"""
+    roots = []
+    if settings.STATIC_ROOT:
+        roots.append((str(settings.STATIC_ROOT), settings.STATIC_URL))
+    if settings.MEDIA_ROOT:
+        roots.append((str(settings.MEDIA_ROOT), settings.MEDIA_URL))
+    if settings.BASE_DIR:
+        roots.append((os.path.join(settings.BASE_DIR, 'static'), settings.STATIC_URL))
+        roots.append((os.path.join(settings.BASE_DIR, 'apps', 'pages', 'static'), settings.STATIC_URL))
+    return roots
+
+
+def _dimensions(path):
+    if path.lower().endswith('.svg'):
+        return None, None
+    try:
+        # Only parses the header
+        with Image.open(path) as img:
+            return img.size
+    except Exception:
+        return None, None
+
+
+def _make_entry(path, url, stat, previous=None):
+    if previous and previous['mtime'] == stat.st_mtime and previous['size'] == stat.st_size:
+        width, height = previous['width'], previous['height']
+    else:
+        width, height = _dimensions(path)
+    return {
+        'path': path,
+        'url': url,
+        'mtime': stat.st_mtime,
+        'size': stat.st_size,
+        'width': width,
+        'height': height,
+        'webp_path': None,
+        'webp_url': None,
+    }
+
+
+def _scan(root, url_prefix, previous):
+    """Yield (relative path, entry) for every image below root"""
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                items = list(it)
+        except OSError:
+            continue
+        for item in items:
+            if item.is_dir(follow_symlinks=False):
+                if item.path != DERIVATIVES_ROOT:
+                    stack.append(item.path)
+            elif item.name.lower().endswith(IMAGE_EXTENSIONS):
+                try:
+                    stat = item.stat()
+                except OSError:
+                    continue
+                rel = os.path.relpath(item.path, root).replace(os.sep, '/')
+                yield rel, _make_entry(item.path, f"{url_prefix}{rel}", stat, previous.get(item.path))
+
+
+def _link_webp_sibling(entry, by_path):
+    stem, ext = os.path.splitext(entry['path'])
+    sibling = by_path.get(f"{stem}.webp") if ext.lower() != '.webp' else None
+    entry['webp_path'] = sibling['path'] if sibling else None
+    entry['webp_url'] = sibling['url'] if sibling else None
+
+
+def build_image_index():
+    """Scan the image roots and replace this process's index. Returns the number of files indexed."""
+    started = time.monotonic()
+    generation = _current_generation()
+    previous = _index['by_path']
+    entries = {}
+    by_path = {}
+    media_root = str(settings.MEDIA_ROOT) if settings.MEDIA_ROOT else None
+
+    for root, url_prefix in _roots():
+        if not os.path.isdir(root):
+            continue
+        for rel, entry in _scan(root, url_prefix, previous):
+            if entry['path'] in by_path:
+                continue
+            by_path[entry['path']] = entry
+            entries.setdefault(rel, entry)
+            if root == media_root:
+                entries.setdefault(normalize_source(entry['url']), entry)
+
+    for entry in by_path.values():
+        _link_webp_sibling(entry, by_path)
+
+    with _lock:
+        _index['entries'] = entries
+        _index['by_path'] = by_path
+        # Changes published during the scan are applied on the next check
+        _index['generation'] = generation
+        _index['checked'] = time.monotonic()
+        _misses.clear()
+    logger.info(f"Image index built: {len(by_path)} files in {(time.monotonic() - started) * 1000:.0f} ms")
+    return len(by_path)
+
+
+def _current_generation():
+    try:
+        return cache.get(GENERATION_KEY, 0)
+    except Exception:
+        return None
+
+
+def _publish_change(change):
+    """Append a change to the shared log so other processes apply it too"""
+    try:
+        for _ in range(3):
+            try:
+                generation = cache.incr(GENERATION_KEY)
+            except ValueError:
+                generation = 1 if cache.add(GENERATION_KEY, 1, None) else cache.incr(GENERATION_KEY)
+            # incr is not atomic on every backend; never overwrite another process's change
+            if cache.add(CHANGE_KEY.format(generation), change, CHANGE_TIMEOUT):
+                return generation
+    except Exception as e:
+        logger.error(f"Could not publish image index change: {str(e)}")
+    return None
+
+
+def _apply_change(change):
+    op, path, url = change
+    if op == 'record':
+        _record(path, url)
+    else:
+        _forget(path)
+
+
+def _ensure_fresh():
+    """Apply the changes other processes published since the last check"""
+    now = time.monotonic()
+    with _lock:
+        if now - _index['checked'] < INDEX_CHECK_INTERVAL:
+            return
+        _index['checked'] = now
+        generation = _current_generation()
+        seen = _index['generation']
+        if generation is None or generation == seen:
+            return
+        _index['generation'] = generation
+        if seen is None or generation < seen:
+            # First check in this process, or the cache was cleared
+            _misses.clear()
+            return
+
+        keys = [CHANGE_KEY.format(n) for n in range(max(seen + 1, generation - MAX_CHANGES_APPLIED + 1), generation + 1)]
+        try:
+            changes = cache.get_many(keys)
+        except Exception as e:
+            logger.error(f"Could not read image index changes: {str(e)}")
+            changes = {}
+        for key in keys:
+            if key in changes:
+                _apply_change(changes[key])
+        if len(changes) < generation - seen:
+            # Some changes expired or were never written; let unknown URLs be probed again
+            _misses.clear()
+
+
+def _probe(key):
+    """Filesystem fallback for a URL the scan did not see (once per key)"""
+    media_root = str(settings.MEDIA_ROOT) if settings.MEDIA_ROOT else None
+    for root, url_prefix in _roots():
+        candidates = [key]
+        if root == media_root and key.startswith('media/'):
+            candidates.append(key[len('media/'):])
+        for rel in candidates:
+            path = os.path.join(root, rel)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entry = _make_entry(path, f"{url_prefix}{rel}", stat)
+            webp_path = f"{os.path.splitext(path)[0]}.webp"
+            if webp_path != path and os.path.exists(webp_path):
+                entry['webp_path'] = webp_path
+                entry['webp_url'] = f"{os.path.splitext(entry['url'])[0]}.webp"
+            return entry
+    return None
+
+
+def lookup_image(img_url):
+    """
+    Index entry (path, url, mtime, size, width, height, webp_path, webp_url)
+    for an image URL or static/media relative path, or None if there is no
+    such file.
+    """
+    key = normalize_source(img_url)
+    if not key:
+        return None
+    _ensure_fresh()
+
+    entry = _index['entries'].get(key)
+    if entry is not None or key in _misses:
+        return entry
+
+    entry = _probe(key)
+    with _lock:
+        if entry is None:
+            _misses.add(key)
+        else:
+            _index['entries'][key] = entry
+            _index['by_path'][entry['path']] = entry
+    return entry
+
+
+def _relink_webp(path, by_path):
+    """Re-link the originals sharing a WebP file's stem"""
+    if path.lower().endswith('.webp'):
+        stem = os.path.splitext(path)[0]
+        for other in by_path.values():
+            if other['path'] != path and os.path.splitext(other['path'])[0] == stem:
+                _link_webp_sibling(other, by_path)
+
+
+def _record(path, url):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = normalize_source(url)
+    with _lock:
+        by_path = _index['by_path']
+        entry = _make_entry(str(path), url, stat, by_path.get(str(path)))
+        by_path[entry['path']] = entry
+        _index['entries'][key] = entry
+        _misses.discard(key)
+        _link_webp_sibling(entry, by_path)
+        _relink_webp(entry['path'], by_path)
+    return entry
+
+
+def _forget(path):
+    path = str(path)
+    with _lock:
+        by_path = _index['by_path']
+        entry = by_path.pop(path, None)
+        if entry is None:
+            return
+        entries = _index['entries']
+        for key in [key for key, value in entries.items() if value is entry]:
+            del entries[key]
+        _relink_webp(path, by_path)
+
+
+def record_file(path, url):
+    """Add or refresh one file in the index of every process (e.g. a new upload)"""
+    entry = _record(path, url)
+    if entry is not None:
+        _publish_change(('record', entry['path'], url))
+    return entry
+
+
+def forget_file(path):
+    """Drop one file from the index of every process (e.g. a deleted upload)"""
+    _forget(path)
+    _publish_change(('forget', str(path), None))
+
+
+def image_index_size():
+    return len(_index['by_path'])
@@ -0,0 +1,233 @@
+import contextvars
+import logging
+import os
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .models import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+# Background jobs
+# ---------------
+# Slow work (image processing and the like) is stored as BackgroundJob rows
+# and executed by `manage.py run_jobs`, which claims due jobs and runs them
+# in a process pool. Handlers are plain functions taking the job payload:
+#
+#     @job_handler('media.process_image')
+#     def process_image(payload):
+#         ...
+#
+# and are registered when their module is imported (from an AppConfig.ready).
+# A handler that raises is retried with a growing delay until max_attempts;
+# raising PermanentJobError fails the job straight away. The optional
+# on_failure callback gets (payload, error) once a job has finally failed.
+#
+# enqueue_once() queues a single-flight job: while one job with the same key
+# is queued or running, it is returned instead of a second one (enforced by
+# a partial unique constraint, so it also holds across processes). Long
+# handlers call report_progress(), which also keeps their lock fresh so
+# requeue_stale_jobs leaves them alone.
+
+# A running job whose worker has not finished it after this many seconds is
+# assumed dead (worker killed, server restarted) and queued again
+JOB_LOCK_TIMEOUT = getattr(settings, 'BACKGROUND_JOB_LOCK_TIMEOUT', 600)
+# Seconds to wait before retry N is attempt * JOB_RETRY_DELAY
+JOB_RETRY_DELAY = getattr(settings, 'BACKGROUND_JOB_RETRY_DELAY', 30)
+
+# report_progress writes at most this often (seconds)
+PROGRESS_INTERVAL = 1.0
+
+JOB_HANDLERS = {}
+_current_job = contextvars.ContextVar('current_background_job', default=None)
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler when retrying the job cannot help"""
+
+
+def job_handler(job_type, on_failure=None):
+    def register(func):
+        JOB_HANDLERS[job_type] = (func, on_failure)
+        return func
+    return register
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enqueue(job_type, payload=None, run_after=None, max_attempts=3):
+    """
+    Queue a job. Inside a transaction the job only becomes visible to the
+    worker on commit, together with the rows it refers to.
+
+    With BACKGROUND_JOBS_EAGER the job runs immediately in this process
+    instead (development without a worker).
+    """
+    job = BackgroundJob.objects.create(
+        job_type=job_type,
+        payload=payload or {},
+        run_after=run_after or timezone.now(),
+        max_attempts=max_attempts,
+    )
+    if getattr(settings, 'BACKGROUND_JOBS_EAGER', False):
+        transaction.on_commit(lambda: _run_eagerly(job.pk))
+    return job
+
+
+def enqueue_once(job_type, payload=None, key=None, max_attempts=1):
+    """
+    Queue a single-flight job. Returns (job, created): when a job with the
+    same key (default: the job type) is already queued or running, that job
+    and False.
+    """
+    key = key or job_type
+    try:
+        with transaction.atomic():
+            job = BackgroundJob.objects.create(
+                job_type=job_type,
+                payload=payload or {},
+                max_attempts=max_attempts,
+                singleton_key=key,
+            )
+    except IntegrityError:
+        existing = BackgroundJob.objects.filter(singleton_key=key, status__in=['queued', 'running']).first()
+        if existing is not None:
+            return existing, False
+        # The other job finished in between
+        return enqueue_once(job_type, payload, key, max_attempts)
+    if getattr(settings, 'BACKGROUND_JOBS_EAGER', False):
+        transaction.on_commit(lambda: _run_eagerly(job.pk))
+    return job, True
+
+
+def report_progress(files=None, files_total=None, bytes_done=None, bytes_total=None, force=False):
+    """
+    Record the progress of the job running in this process (a no-op outside
+    a job). Throttled to one write per PROGRESS_INTERVAL unless ``force``.
+    """
+    state = _current_job.get()
+    if state is None:
+        return
+    now = time.monotonic()
+    if not force and now - state['reported'] < PROGRESS_INTERVAL:
+        return
+    state['reported'] = now
+    fields = {'locked_at': timezone.now()}
+    for field, value in (('progress_files', files), ('progress_files_total', files_total),
+                         ('progress_bytes', bytes_done), ('progress_bytes_total', bytes_total)):
+        if value is not None:
+            fields[field] = value
+    BackgroundJob.objects.filter(pk=state['job_id'], status='running').update(**fields)
+
+
+def _run_eagerly(job_id):
+    if BackgroundJob.objects.filter(pk=job_id, status='queued').update(
+        status='running', locked_by=worker_id(), locked_at=timezone.now(), attempts=F('attempts') + 1
+    ):
+        run_job(job_id)
+
+
+def claim_jobs(limit, job_types=None, locked_by=None):
+    """
+    Mark up to ``limit`` due jobs as running for this worker and return their ids.
+
+    Each job is claimed with a conditional UPDATE, so concurrent workers
+    never run the same job, on any database backend.
+    """
+    if limit <= 0:
+        return []
+    locked_by = locked_by or worker_id()
+    candidates = BackgroundJob.objects.filter(status='queued', run_after__lte=timezone.now())
+    if job_types:
+        candidates = candidates.filter(job_type__in=job_types)
+
+    claimed = []
+    for job_id in candidates.order_by('run_after', 'pk').values_list('pk', flat=True)[:limit * 2]:
+        updated = BackgroundJob.objects.filter(pk=job_id, status='queued').update(
+            status='running', locked_by=locked_by, locked_at=timezone.now(), attempts=F('attempts') + 1
+        )
+        if updated:
+            claimed.append(job_id)
+            if len(claimed) >= limit:
+                break
+    return claimed
+
+
+def requeue_stale_jobs(timeout=JOB_LOCK_TIMEOUT):
+    """Queue again the running jobs whose worker went away. Returns the number requeued."""
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    stale = BackgroundJob.objects.filter(status='running', locked_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status='failed', error='Worker stopped before the job finished', finished_at=timezone.now()
+    )
+    requeued = stale.update(status='queued', locked_by='', locked_at=None)
+    if failed or requeued:
+        logger.warning(f"Recovered stale background jobs: {requeued} requeued, {failed} failed")
+    return requeued
+
+
+def run_job(job_id):
+    """
+    Execute one claimed job and record the outcome. Runs inside the worker's
+    pool processes; returns the final status.
+    """
+    try:
+        job = BackgroundJob.objects.get(pk=job_id)
+    except BackgroundJob.DoesNotExist:
+        return 'missing'
+
+    handler, on_failure = JOB_HANDLERS.get(job.job_type, (None, None))
+    context = _current_job.set({'job_id': job.pk, 'reported': 0.0})
+    try:
+        if handler is None:
+            raise PermanentJobError(f"No handler registered for job type '{job.job_type}'")
+        result = handler(job.payload)
+    except Exception as e:
+        retry = not isinstance(e, PermanentJobError) and job.attempts < job.max_attempts
+        logger.error(f"Background job {job} failed (attempt {job.attempts}/{job.max_attempts}): {str(e)}")
+        BackgroundJob.objects.filter(pk=job.pk).update(
+            status='queued' if retry else 'failed',
+            run_after=timezone.now() + timedelta(seconds=JOB_RETRY_DELAY * job.attempts),
+            locked_by='',
+            locked_at=None,
+            error=traceback.format_exc(),
+            finished_at=None if retry else timezone.now(),
+        )
+        if not retry and on_failure is not None:
+            try:
+                on_failure(job.payload, str(e))
+            except Exception as callback_error:
+                logger.error(f"on_failure callback for {job} failed: {str(callback_error)}")
+        return 'queued' if retry else 'failed'
+    finally:
+        _current_job.reset(context)
+
+    BackgroundJob.objects.filter(pk=job.pk).update(
+        status='done', result=result, error='', finished_at=timezone.now()
+    )
+    return 'done'
+
+
+def prune_finished_jobs(days=7):
+    """Delete completed jobs older than ``days``; failed jobs are kept for inspection"""
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = BackgroundJob.objects.filter(status='done', finished_at__lt=cutoff).delete()
+    return deleted
+
+
+def job_counts():
+    """Number of jobs per status, for dashboards"""
+    counts = {status: 0 for status, _ in BackgroundJob.STATUS_CHOICES}
+    for row in BackgroundJob.objects.order_by().values('status').annotate(total=Count('pk')):
+        counts[row['status']] = row['total']
+    return counts
+
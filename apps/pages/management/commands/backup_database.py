@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.pages.backup_utils import backup_sqlite_database
+from apps.pages.db_snapshot import apply_retention
+
+
+class Command(BaseCommand):
+    help = 'Take an online snapshot of the SQLite database into SECURE_DOWNLOAD_ROOT (run from cron, e.g. hourly)'
+
+    def add_arguments(self, parser):
+        compress = parser.add_mutually_exclusive_group()
+        compress.add_argument('--compress', action='store_true', default=None, help='gzip the snapshot')
+        compress.add_argument('--no-compress', action='store_false', dest='compress', help='Keep the snapshot uncompressed')
+        parser.add_argument('--no-retention', action='store_true', help='Keep all older snapshots')
+        parser.add_argument('--retention-only', action='store_true', help='Only apply the retention policy')
+
+    def handle(self, *args, **options):
+        if options['retention_only']:
+            removed = apply_retention(settings.SECURE_DOWNLOAD_ROOT)
+            self.stdout.write(self.style.SUCCESS(f'Removed {len(removed)} old database snapshots'))
+            return
+
+        result = backup_sqlite_database(compress=options['compress'], retention=not options['no_retention'])
+        if not result['success']:
+            raise CommandError(f"Database backup failed: {result['error']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Database snapshot {result['filename']} ({result['size']}), sha256 {result['sha256']}"
+        ))
@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.pages.backup_engine import forget_snapshots, list_snapshots
+from apps.pages.backup_utils import DEFAULT_EXCLUDES, create_project_backup, format_size
+
+
+class Command(BaseCommand):
+    help = 'Take an incremental snapshot of the project into the backup repository'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--name', default='', help='Label added to the snapshot id')
+        parser.add_argument('--no-media', action='store_true', help='Leave MEDIA_ROOT out of the snapshot')
+        parser.add_argument('--no-db', action='store_true', help='Leave the SQLite database out of the snapshot')
+        parser.add_argument('--keep', type=int, help='Afterwards delete all but the newest KEEP snapshots')
+        parser.add_argument('--list', action='store_true', help='List snapshots instead of taking one')
+
+    def handle(self, *args, **options):
+        if options['list']:
+            for snapshot in list_snapshots():
+                stats = snapshot['stats'] or {}
+                self.stdout.write(
+                    f"{snapshot['id']}  {stats.get('files', 0)} files, {format_size(stats.get('bytes', 0))}"
+                    f" ({format_size(stats.get('stored_bytes', 0))} new)"
+                )
+            return
+
+        exclude_dirs = [settings.MEDIA_ROOT] if options['no_media'] else []
+        result = create_project_backup(
+            backup_name=options['name'],
+            exclude_patterns=DEFAULT_EXCLUDES,
+            exclude_dirs=exclude_dirs,
+            backup_db=not options['no_db'],
+        )
+        if not result['success']:
+            raise CommandError(f"Backup failed: {result['error']}")
+
+        stats = result['snapshot']
+        self.stdout.write(self.style.SUCCESS(
+            f"Snapshot {result['filename']}: {stats['files']} files ({format_size(stats['bytes'])}), "
+            f"{stats['changed_files']} changed, {result['size']} new data in {stats['duration']}s"
+        ))
+        if stats['errors']:
+            self.stdout.write(self.style.WARNING(f"{stats['errors']} files could not be read (see the log)"))
+
+        if options['keep'] is not None:
+            removed, freed = forget_snapshots(max(1, options['keep']))
+            self.stdout.write(f"Removed {removed} old snapshots, freed {format_size(freed)}")
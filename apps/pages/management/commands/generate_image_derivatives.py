@@ -0,0 +1,93 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.pages.image_derivatives import (
+    DERIVATIVES_ROOT, SOURCE_EXTENSIONS, build_derivatives, get_derivatives, is_stale,
+    load_manifest, normalize_source, update_manifest,
+)
+from apps.pages.static_assets import is_hashed_static
+
+
+def _static_roots():
+    roots = [str(root) for root in getattr(settings, 'STATICFILES_DIRS', [])]
+    if settings.STATIC_ROOT:
+        roots.append(str(settings.STATIC_ROOT))
+    return [root for root in dict.fromkeys(roots) if os.path.isdir(root)]
+
+
+def _walk_images(root, skip_dir=None):
+    for dirpath, dirnames, filenames in os.walk(root):
+        if skip_dir:
+            dirnames[:] = [d for d in dirnames if os.path.join(dirpath, d) != skip_dir]
+        for filename in filenames:
+            if filename.lower().endswith(SOURCE_EXTENSIONS):
+                yield os.path.join(dirpath, filename)
+
+
+class Command(BaseCommand):
+    help = 'Build responsive WebP/AVIF derivatives for static and media images ahead of time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--skip-static', action='store_true', help='Do not process static images')
+        parser.add_argument('--skip-media', action='store_true', help='Do not process media uploads')
+        parser.add_argument('--force', action='store_true', help='Re-check sources already in the manifest')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help='Processes used for resizing')
+        parser.add_argument('--prune', action='store_true', help='Drop manifest entries whose source file is gone')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        # (manifest key, path on disk, public URL)
+        sources = {}
+        if not options['skip_static']:
+            for root in _static_roots():
+                for path in _walk_images(root):
+                    rel = os.path.relpath(path, root).replace(os.sep, '/')
+                    if is_hashed_static(rel):
+                        # A fingerprinted copy made by collectstatic
+                        continue
+                    sources.setdefault(normalize_source(rel), (path, f"{settings.STATIC_URL}{rel}"))
+        if not options['skip_media'] and os.path.isdir(settings.MEDIA_ROOT):
+            for path in _walk_images(str(settings.MEDIA_ROOT), skip_dir=DERIVATIVES_ROOT):
+                rel = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+                url = f"{settings.MEDIA_URL}{rel}"
+                sources.setdefault(normalize_source(url), (path, url))
+
+        todo = {}
+        for key, (path, url) in sources.items():
+            entry = get_derivatives(key)
+            if entry is None or (options['force'] and is_stale(entry)):
+                todo[key] = (path, url)
+
+        self.stdout.write(f'{len(sources)} images found, {len(todo)} to process with {options["workers"]} workers...')
+
+        changes = {}
+        failed = 0
+        keys = list(todo)
+        with ProcessPoolExecutor(max_workers=max(1, options['workers'])) as executor:
+            results = executor.map(build_derivatives, [todo[key][0] for key in keys], chunksize=4)
+            for key, entry in zip(keys, results):
+                path, url = todo[key]
+                if entry is None:
+                    failed += 1
+                    self.stdout.write(self.style.WARNING(f'  skipped {path}'))
+                    continue
+                stat = os.stat(path)
+                changes[key] = dict(entry, path=path, url=url, mtime=stat.st_mtime, size=stat.st_size)
+                self.stdout.write(f'  {key}')
+
+        removals = []
+        if options['prune']:
+            removals = [key for key, entry in load_manifest(force=True).items() if not os.path.exists(entry.get('path', ''))]
+
+        if changes or removals:
+            update_manifest(changes, removals)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {len(changes)} images ({failed} skipped, {len(removals)} pruned) '
+            f'in {time.monotonic() - started:.1f}s'
+        ))
@@ -0,0 +1,58 @@
+import signal
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.pages.publishing import next_publication, release_due
+
+
+class Command(BaseCommand):
+    help = 'Invalidate cached views for scheduled articles whose publication time has come'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            type=int,
+            default=60,
+            help='Release articles that became visible in the last N minutes (default 60)',
+        )
+        parser.add_argument('--loop', action='store_true', help='Keep running, waking up at each publication time')
+        parser.add_argument(
+            '--max-sleep',
+            type=float,
+            default=60.0,
+            help='Seconds between checks for newly scheduled articles when looping',
+        )
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(minutes=options['since'])
+        now = timezone.now()
+        count = release_due(since, now)
+        self.stdout.write(self.style.SUCCESS(f'Released {count} scheduled articles'))
+        if not options['loop']:
+            return
+
+        stopping = {'flag': False}
+
+        def stop(signum, frame):
+            stopping['flag'] = True
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        while not stopping['flag']:
+            upcoming = next_publication(now)
+            wait = options['max_sleep']
+            if upcoming is not None:
+                wait = min(wait, max((upcoming - timezone.now()).total_seconds(), 0))
+            # Short naps so a stop signal is handled promptly
+            deadline = time.monotonic() + wait
+            while not stopping['flag'] and time.monotonic() < deadline:
+                time.sleep(min(1.0, max(deadline - time.monotonic(), 0)))
+
+            since, now = now, timezone.now()
+            count = release_due(since, now)
+            if count:
+                self.stdout.write(self.style.SUCCESS(f'Released {count} scheduled articles'))
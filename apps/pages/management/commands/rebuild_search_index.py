@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.pages.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for articles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='Articles loaded per query')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = rebuild_search_index(batch_size=options['batch_size'])
+
+        if count is None:
+            self.stdout.write(self.style.ERROR(
+                'Full-text search is not available on this database; searches use icontains filtering'
+            ))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {count} articles in {time.monotonic() - started:.1f}s'
+        ))
@@ -0,0 +1,16 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.pages.related import refresh_all_related
+
+
+class Command(BaseCommand):
+    help = 'Recompute all precomputed related-article lists (run daily so topic lists age out old articles)'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = refresh_all_related()
+        self.stdout.write(self.style.SUCCESS(
+            f'Refreshed {count} related-article lists in {time.monotonic() - started:.1f}s'
+        ))
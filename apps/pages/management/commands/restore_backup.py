@@ -0,0 +1,32 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.pages.backup_engine import BackupError, list_snapshots, restore_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Restore a backup snapshot into a directory (never over the live project)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('snapshot', help="Snapshot id, or 'latest'")
+        parser.add_argument('--target', required=True, help='Directory to restore into')
+        parser.add_argument('--path', action='append', dest='paths', help='Only restore this file or directory (repeatable)')
+
+    def handle(self, *args, **options):
+        snapshot_id = options['snapshot']
+        if snapshot_id == 'latest':
+            snapshots = list_snapshots()
+            if not snapshots:
+                raise CommandError('There are no snapshots')
+            snapshot_id = snapshots[0]['id']
+
+        target = os.path.abspath(options['target'])
+        if os.path.isdir(target) and os.listdir(target):
+            raise CommandError(f'{target} is not empty')
+
+        try:
+            restored = restore_snapshot(snapshot_id, target, paths=options['paths'])
+        except (OSError, BackupError) as e:
+            raise CommandError(f'Restore failed: {str(e)}')
+        self.stdout.write(self.style.SUCCESS(f'Restored {restored} files of {snapshot_id} to {target}'))
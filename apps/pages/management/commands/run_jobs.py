@@ -0,0 +1,108 @@
+import os
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+# Pool processes may be spawned fresh (not forked), so this module must be
+# importable before Django is set up: apps.pages.jobs is imported lazily.
+
+def _init_pool_process():
+    import django
+    django.setup()
+    # Never reuse database connections inherited from the parent
+    connections.close_all()
+
+
+def _run_in_pool(job_id):
+    from apps.pages.jobs import run_job
+    try:
+        return run_job(job_id)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (image processing, ...) in a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=getattr(settings, 'BACKGROUND_JOB_WORKERS', os.cpu_count() or 2),
+            help='Number of jobs run in parallel',
+        )
+        parser.add_argument('--type', action='append', dest='job_types', help='Only run jobs of this type (repeatable)')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds between checks for new jobs')
+        parser.add_argument('--once', action='store_true', help='Exit when no due jobs are left')
+        parser.add_argument(
+            '--max-tasks-per-process',
+            type=int,
+            default=50,
+            help='Replace a pool process after this many jobs (bounds image library memory growth)',
+        )
+
+    def handle(self, *args, **options):
+        from apps.pages.jobs import claim_jobs, prune_finished_jobs, requeue_stale_jobs, worker_id
+
+        workers = max(1, options['workers'])
+        stopping = {'flag': False}
+
+        def stop(signum, frame):
+            stopping['flag'] = True
+            self.stdout.write('Stopping after running jobs finish...')
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        identity = worker_id()
+        self.stdout.write(f'Job worker {identity} started with {workers} processes')
+
+        # Forked pool processes would otherwise inherit open connections
+        connections.close_all()
+        running = {}
+        completed = 0
+        last_maintenance = 0.0
+
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_pool_process,
+            max_tasks_per_child=options['max_tasks_per_process'],
+        ) as executor:
+            while True:
+                now = time.monotonic()
+                if now - last_maintenance > 60:
+                    requeue_stale_jobs()
+                    prune_finished_jobs()
+                    last_maintenance = now
+
+                if not stopping['flag']:
+                    for job_id in claim_jobs(workers - len(running), options['job_types'], identity):
+                        running[executor.submit(_run_in_pool, job_id)] = job_id
+
+                if not running:
+                    if stopping['flag'] or options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                done, _ = wait(list(running), timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                for future in done:
+                    job_id = running.pop(future)
+                    completed += 1
+                    try:
+                        status = future.result()
+                    except Exception as e:
+                        # The pool process itself died; the job is recovered as stale later
+                        self.stdout.write(self.style.ERROR(f'  job {job_id}: worker process error: {str(e)}'))
+                        continue
+                    if status == 'done':
+                        self.stdout.write(f'  job {job_id}: done')
+                    else:
+                        self.stdout.write(self.style.WARNING(f'  job {job_id}: {status}'))
+
+        self.stdout.write(self.style.SUCCESS(f'Job worker stopped after {completed} jobs'))
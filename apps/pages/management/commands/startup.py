@@ -40,6 +40,15 @@ class Command(BaseCommand):
             self.stdout.write('\nClearing cache...')
             call_command('clear_cache')
             
+            # 6. Build responsive image variants so pages never resize images on request
+            self.stdout.write('\nGenerating image derivatives...')
+            call_command('generate_image_derivatives')
+            
+            # 7. Pre-render public pages so the first visitors hit the cache
+            if getattr(settings, 'WARM_CACHE_AFTER_DEPLOY', False):
+                self.stdout.write('\nWarming cache...')
+                call_command('warm_cache')
+            
             self.stdout.write(self.style.SUCCESS('\nStartup completed successfully!'))
             
         except Exception as e:
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.pages.backup_engine import BackupError, list_snapshots, verify_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Check that backup snapshots are complete (and, with --full, intact)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('snapshots', nargs='*', help='Snapshot ids (default: all)')
+        parser.add_argument('--full', action='store_true', help='Decompress and re-hash every chunk')
+
+    def handle(self, *args, **options):
+        snapshot_ids = options['snapshots'] or [snapshot['id'] for snapshot in list_snapshots()]
+        failed = 0
+        for snapshot_id in snapshot_ids:
+            try:
+                result = verify_snapshot(snapshot_id, full=options['full'])
+            except (OSError, ValueError, BackupError) as e:
+                failed += 1
+                self.stdout.write(self.style.ERROR(f'{snapshot_id}: unreadable manifest ({str(e)})'))
+                continue
+            if result['missing'] or result['corrupt']:
+                failed += 1
+                self.stdout.write(self.style.ERROR(
+                    f"{snapshot_id}: {len(result['missing'])} missing and {len(result['corrupt'])} corrupt "
+                    f"of {result['chunks']} chunks"
+                ))
+            else:
+                self.stdout.write(f"{snapshot_id}: OK ({result['files']} files, {result['chunks']} chunks)")
+
+        if failed:
+            raise CommandError(f'{failed} of {len(snapshot_ids)} snapshots failed verification')
+        self.stdout.write(self.style.SUCCESS(f'{len(snapshot_ids)} snapshots verified'))
@@ -0,0 +1,74 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.pages.cache_warming import collect_warm_urls, warm_urls
+from apps.pages.utils import clear_view_cache
+
+
+class Command(BaseCommand):
+    help = 'Pre-render public pages so cached views are filled before the first visitor arrives'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=getattr(settings, 'WARM_CACHE_WORKERS', 4),
+            help='Number of pages rendered in parallel',
+        )
+        parser.add_argument(
+            '--news-pages',
+            type=int,
+            default=None,
+            help='Only warm the first N pages of the news listing',
+        )
+        parser.add_argument('--skip-articles', action='store_true', help='Do not warm article detail pages')
+        parser.add_argument('--skip-courses', action='store_true', help='Do not warm Maven course pages')
+        parser.add_argument(
+            '--refresh',
+            action='store_true',
+            help='Invalidate all cached views first, so pages are re-rendered with freshly deployed code',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Only list the URLs that would be warmed')
+
+    def handle(self, *args, **options):
+        urls = collect_warm_urls(
+            news_pages=options['news_pages'],
+            include_articles=not options['skip_articles'],
+            include_courses=not options['skip_courses'],
+        )
+
+        if options['dry_run']:
+            for url in urls:
+                self.stdout.write(url)
+            self.stdout.write(self.style.SUCCESS(f'{len(urls)} URLs would be warmed'))
+            return
+
+        if options['refresh']:
+            clear_view_cache()
+            self.stdout.write('Invalidated cached views')
+
+        self.stdout.write(f"Warming {len(urls)} URLs with {options['workers']} workers...")
+
+        def report(result):
+            if result['error']:
+                self.stdout.write(self.style.ERROR(f"  ERR  {result['seconds'] * 1000:8.1f} ms  {result['url']}  ({result['error']})"))
+            elif result['status'] >= 400:
+                self.stdout.write(self.style.WARNING(f"  {result['status']}  {result['seconds'] * 1000:8.1f} ms  {result['url']}"))
+            else:
+                self.stdout.write(f"  {result['status']}  {result['seconds'] * 1000:8.1f} ms  {result['url']}")
+
+        results = warm_urls(urls, workers=options['workers'], callback=report)
+
+        failed = [result for result in results if result['error'] or result['status'] >= 400]
+        total = sum(result['seconds'] for result in results)
+        slowest = sorted(results, key=lambda result: result['seconds'], reverse=True)[:5]
+
+        self.stdout.write('\nSlowest pages:')
+        for result in slowest:
+            self.stdout.write(f"  {result['seconds'] * 1000:8.1f} ms  {result['url']}")
+
+        summary = f'\nWarmed {len(results) - len(failed)}/{len(results)} URLs in {total:.1f}s of render time'
+        if failed:
+            self.stdout.write(self.style.WARNING(summary + f' ({len(failed)} failed)'))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import Http404
+from django.middleware.gzip import GZipMiddleware
+
+from apps.pages.file_delivery import MODE_PYTHON, deliver_file, resolve_accel_location
+
+
+class FileDeliveryGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware that leaves file deliveries alone (byte ranges, sendfile, offload headers)"""
+
+    def process_response(self, request, response):
+        if getattr(response, 'file_delivery', False):
+            return response
+        return super().process_response(request, response)
+
+
+class FakeProxyMiddleware:
+    """
+    Stands in for nginx / mod_xsendfile in development: responses carrying
+    X-Accel-Redirect or X-Sendfile are replaced by the file they point to,
+    streamed with Range and conditional request support like the proxy does.
+
+    Enabled by FILE_DELIVERY_FAKE_PROXY; it has to be the first middleware so
+    it sees responses last, where the proxy would.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'FILE_DELIVERY_FAKE_PROXY', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        if response.has_header('X-Accel-Redirect'):
+            path = resolve_accel_location(response['X-Accel-Redirect'])
+        elif response.has_header('X-Sendfile'):
+            path = response['X-Sendfile']
+        else:
+            return response
+
+        if path is None:
+            raise Http404('Internal location not found')
+        delivered = deliver_file(request, path, content_type=response['Content-Type'], mode=MODE_PYTHON)
+        for header in ('Content-Disposition', 'Cache-Control'):
+            if response.has_header(header):
+                delivered[header] = response[header]
+        return delivered
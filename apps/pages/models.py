@@ -143,6 +143,25 @@ def validate_file_extension(value):
     if not ext.lower() in valid_extensions:
         raise ValidationError('Unsupported file extension.')
 
+def visible_from(now=None, prefix=''):
+    """
+    Q for articles readers can see: published, with a publication time that
+    has come. A plain comparison on published_at, so the (status,
+    -published_at) index serves it; ``prefix`` is the relation path when
+    filtering through another model (e.g. 'articles__').
+    """
+    return models.Q(**{
+        f"{prefix}status": 'published',
+        f"{prefix}published_at__lte": now or timezone.now(),
+    })
+
+
+class ArticleQuerySet(models.QuerySet):
+    def visible(self, now=None):
+        """Published articles whose publication time has come"""
+        return self.filter(visible_from(now))
+
+
 class Article(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -196,6 +215,8 @@ class Article(models.Model):
         related_name='updated_articles'
     )
 
+    objects = ArticleQuerySet.as_manager()
+
     class Meta:
         ordering = ['-published_at', '-created_at']
         indexes = [
@@ -283,6 +304,91 @@ class ArticleReviewHistory(models.Model):
     def __str__(self):
         return f"{self.article.title} - {self.status} by {self.reviewed_by}"
 
+class RelatedArticle(models.Model):
+    """
+    Precomputed related-article rankings, maintained by apps.pages.related.
+
+    ``source`` is ``article:<id>`` for the articles related to one article,
+    or ``topic:<slug>`` for a prodi/category slug shown on profile pages.
+    """
+    source = models.CharField(max_length=120)
+    article = models.ForeignKey(
+        Article,
+        on_delete=models.CASCADE,
+        related_name='related_entries'
+    )
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField(default=0)
+
+    class Meta:
+        ordering = ['source', 'rank']
+        constraints = [
+            # Also the index used to read one source's list in rank order
+            models.UniqueConstraint(fields=['source', 'rank'], name='unique_related_article_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.source} #{self.rank}: {self.article_id}"
+
+class BackgroundJob(models.Model):
+    """
+    A unit of work for the background worker (manage.py run_jobs).
+
+    Jobs are created with apps.pages.jobs.enqueue and dispatched by
+    ``job_type`` to a handler registered with @job_handler.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    job_type = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Set for single-flight jobs: at most one queued or running job per key
+    singleton_key = models.CharField(max_length=100, null=True, blank=True)
+    # Reported by long handlers through apps.pages.jobs.report_progress
+    progress_files = models.PositiveIntegerField(default=0)
+    progress_files_total = models.PositiveIntegerField(default=0)
+    progress_bytes = models.PositiveBigIntegerField(default=0)
+    progress_bytes_total = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            # The worker's polling query: next due queued jobs
+            models.Index(fields=['status', 'run_after'], name='background_job_due'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['singleton_key'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='background_job_single_flight',
+            ),
+        ]
+
+    @property
+    def progress_percent(self):
+        if self.progress_bytes_total:
+            return min(100, round(self.progress_bytes * 100 / self.progress_bytes_total))
+        if self.progress_files_total:
+            return min(100, round(self.progress_files * 100 / self.progress_files_total))
+        return 100 if self.status == 'done' else 0
+
+    def __str__(self):
+        return f"{self.job_type} #{self.pk} ({self.status})"
+
 class MaintenanceMode(models.Model):
     is_active = models.BooleanField(default=False)
     message = models.TextField(
@@ -0,0 +1,106 @@
+import logging
+from datetime import datetime
+
+from django.utils import timezone
+
+from .jobs import enqueue, job_handler
+from .models import Article, ArticleCategory
+from .related import refresh_for_changed_article
+from .utils import invalidate_cache_tags
+
+logger = logging.getLogger(__name__)
+
+# Scheduled publishing
+# --------------------
+# An article is visible once it is published and its published_at has come
+# (Article.objects.visible()). Cached views and the sitemap are invalidated
+# when an article is saved, but a scheduled article becomes visible later
+# without any write, so its publication time is a cache event of its own:
+#
+#   - saving a published article with a future published_at queues a
+#     'pages.publish_article' job with run_after=published_at, which the
+#     worker (manage.py run_jobs) runs at that time to invalidate the views
+#     listing it;
+#   - `manage.py publish_scheduled` does the same from the database alone
+#     (after downtime, or on servers without a job worker): once for every
+#     article that became visible in the last --since minutes, or with
+#     --loop sleeping until the next publication time.
+#
+# Releasing an article also ranks it into the precomputed related-article
+# lists (apps/pages/related.py), which only hold visible articles.
+#
+# Invalidation is idempotent, so a job and the command releasing the same
+# article is harmless. A job whose article was rescheduled or unpublished
+# in the meantime does nothing; the later save queued its own job.
+
+PUBLISH_JOB_TYPE = 'pages.publish_article'
+
+
+def publication_tags(article):
+    """Cache tags of the views that start listing an article when it becomes visible"""
+    tags = ['articles', 'homepage', 'categories', 'sitemap', f"article:{article.pk}"]
+    try:
+        tags.append(f"category:{article.category.slug}")
+    except ArticleCategory.DoesNotExist:
+        pass
+    return tags
+
+
+def schedule_publication(article, now=None):
+    """Queue the cache invalidation for an article's publication time, if it is still ahead"""
+    now = now or timezone.now()
+    if article.status != 'published' or not article.published_at or article.published_at <= now:
+        return None
+    payload = {'article_id': article.pk, 'published_at': article.published_at.isoformat()}
+    return enqueue(PUBLISH_JOB_TYPE, payload, run_after=article.published_at)
+
+
+def release_articles(articles):
+    """Invalidate the cached views listing these (now visible) articles"""
+    tags = []
+    for article in articles:
+        for tag in publication_tags(article):
+            if tag not in tags:
+                tags.append(tag)
+    invalidate_cache_tags(*tags)
+    return tags
+
+
+def release_due(since, now=None):
+    """Release every article that became visible after ``since``; returns their count"""
+    now = now or timezone.now()
+    articles = list(
+        Article.objects.visible(now)
+        .filter(published_at__gt=since)
+        .select_related('category')
+        .only('id', 'title', 'category__slug')
+    )
+    if articles:
+        for article in articles:
+            refresh_for_changed_article(article.pk)
+            logger.info(f"Scheduled article '{article.title}' ({article.pk}) is now visible")
+        release_articles(articles)
+    return len(articles)
+
+
+def next_publication(now=None):
+    """Time of the next scheduled publication, or None"""
+    now = now or timezone.now()
+    return (
+        Article.objects.filter(status='published', published_at__gt=now)
+        .order_by('published_at')
+        .values_list('published_at', flat=True)
+        .first()
+    )
+
+
+@job_handler(PUBLISH_JOB_TYPE)
+def publish_article_job(payload):
+    article = Article.objects.select_related('category').filter(pk=payload['article_id']).first()
+    if article is None or article.status != 'published' or article.published_at is None:
+        return {'released': False, 'reason': 'unpublished'}
+    if article.published_at != datetime.fromisoformat(payload['published_at']):
+        return {'released': False, 'reason': 'rescheduled'}
+    # Rank it into the related lists first, so re-rendered pages include it
+    refresh_for_changed_article(article.pk)
+    return {'released': True, 'tags': release_articles([article])}
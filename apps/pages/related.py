@@ -0,0 +1,320 @@
+import logging
+import re
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .jobs import enqueue, enqueue_once, job_handler
+from .models import Article, ArticleCategory, BackgroundJob, RelatedArticle
+
+logger = logging.getLogger(__name__)
+
+# Related articles
+# ----------------
+# Rankings are computed when articles change, not when pages render. Each
+# source (an article, or a prodi/category slug) keeps its top
+# RELATED_ARTICLES_STORED articles in the RelatedArticle table, scored by
+# term overlap:
+#   category  3 per shared term (same category for article-to-article)
+#   keywords  2 per shared meta keyword term
+#   title     1 per shared title term
+# Lists are topped up with the latest articles when fewer have a score.
+#
+# Saving or deleting an article queues a 'pages.refresh_related' job (one
+# per article while queued) instead of re-ranking inside the request.
+
+RELATED_ARTICLES_STORED = getattr(settings, 'RELATED_ARTICLES_STORED', 6)
+# Topic lists only look at articles created within this many days
+RELATED_TOPIC_WINDOW_DAYS = getattr(settings, 'RELATED_TOPIC_WINDOW_DAYS', 180)
+
+REFRESH_JOB_TYPE = 'pages.refresh_related'
+
+# Slugs the prodi and profile pages ask for
+RELATED_TOPICS = (
+    'manajemen', 'manajemens', 'akuntansi', 'hospar', 'fisika-medis', 'informatika',
+    'statistika', 'dkv', 'arsitektur', 'k3', 'profil-matana',
+)
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+_STOPWORDS = {
+    'dan', 'yang', 'di', 'ke', 'dari', 'untuk', 'dengan', 'pada', 'dalam', 'ini', 'itu', 'atau',
+    'the', 'and', 'for', 'with', 'from', 'of', 'in', 'to', 'a', 'an', 'on',
+}
+
+Profile = namedtuple('Profile', 'id category_id category_terms title_terms keyword_terms created_at')
+
+_built_sources = set()
+
+
+def _terms(text):
+    return frozenset(
+        word for word in _WORD_RE.findall((text or '').lower())
+        if len(word) > 2 and word not in _STOPWORDS
+    )
+
+
+def _topic_terms(slug):
+    return frozenset(part for part in slug.lower().split('-') if part) | {slug.lower()}
+
+
+def article_source(article_id):
+    return f"article:{article_id}"
+
+
+def topic_source(slug):
+    return f"topic:{slug}"
+
+
+def topic_slugs():
+    return list(dict.fromkeys(list(RELATED_TOPICS) + list(ArticleCategory.objects.values_list('slug', flat=True))))
+
+
+def load_profiles():
+    """Term profiles of every visible article, newest first (one query, no content column)"""
+    rows = Article.objects.visible().order_by('-created_at').values_list(
+        'id', 'category_id', 'category__slug', 'title', 'meta_keywords', 'created_at'
+    )
+    return [
+        Profile(pk, category_id, _topic_terms(category_slug or ''), _terms(title), _terms(keywords), created_at)
+        for pk, category_id, category_slug, title, keywords, created_at in rows
+    ]
+
+
+def score_articles(a, b):
+    score = 3.0 if a.category_id == b.category_id else 0.0
+    score += 2 * len(a.keyword_terms & b.keyword_terms)
+    score += len(a.title_terms & b.title_terms)
+    return score
+
+
+def score_topic(terms, profile):
+    return (
+        3 * len(terms & profile.category_terms)
+        + 2 * len(terms & profile.keyword_terms)
+        + len(terms & profile.title_terms)
+    )
+
+
+def _rank(scored, fallback, limit=RELATED_ARTICLES_STORED):
+    """
+    Order (score, profile) pairs best first, newest first on ties, then top up
+    with fallback profiles (already newest first). Returns [(article_id, score)].
+    """
+    matches = sorted(
+        ((score, profile) for score, profile in scored if score > 0),
+        key=lambda item: (item[0], item[1].created_at),
+        reverse=True,
+    )[:limit]
+    ranked = [(profile.id, score) for score, profile in matches]
+    seen = {article_id for article_id, _ in ranked}
+    for profile in fallback:
+        if len(ranked) >= limit:
+            break
+        if profile.id not in seen:
+            ranked.append((profile.id, 0.0))
+            seen.add(profile.id)
+    return ranked
+
+
+def rank_for_article(profile, profiles):
+    others = [other for other in profiles if other.id != profile.id]
+    scored = [(score_articles(profile, other), other) for other in others]
+    fallback = [other for other in others if other.category_id == profile.category_id]
+    return _rank(scored, fallback)
+
+
+def rank_for_topic(slug, profiles):
+    cutoff = timezone.now() - timedelta(days=RELATED_TOPIC_WINDOW_DAYS)
+    recent = [profile for profile in profiles if profile.created_at >= cutoff]
+    terms = _topic_terms(slug)
+    return _rank([(score_topic(terms, profile), profile) for profile in recent], recent)
+
+
+def _store(lists):
+    """Replace the stored rows of each source in ``lists`` ({source: [(article_id, score)]})"""
+    if not lists:
+        return
+    with transaction.atomic():
+        RelatedArticle.objects.filter(source__in=list(lists)).delete()
+        RelatedArticle.objects.bulk_create([
+            RelatedArticle(source=source, article_id=article_id, rank=rank, score=score)
+            for source, ranked in lists.items()
+            for rank, (article_id, score) in enumerate(ranked)
+        ])
+    _built_sources.update(lists)
+
+
+def refresh_topic(slug, profiles=None):
+    profiles = load_profiles() if profiles is None else profiles
+    _store({topic_source(slug): rank_for_topic(slug, profiles)})
+
+
+def refresh_article(article_id, profiles=None):
+    profiles = load_profiles() if profiles is None else profiles
+    profile = next((p for p in profiles if p.id == article_id), None)
+    if profile is None:
+        RelatedArticle.objects.filter(source=article_source(article_id)).delete()
+        return
+    _store({article_source(article_id): rank_for_article(profile, profiles)})
+
+
+def refresh_all_related():
+    """Recompute every list. Returns the number of sources written."""
+    profiles = load_profiles()
+    lists = {topic_source(slug): rank_for_topic(slug, profiles) for slug in topic_slugs()}
+    for profile in profiles:
+        lists[article_source(profile.id)] = rank_for_article(profile, profiles)
+
+    with transaction.atomic():
+        RelatedArticle.objects.exclude(source__in=list(lists)).delete()
+        _store(lists)
+    return len(lists)
+
+
+def _merge(current, by_id, changed, score):
+    """
+    Rank ``changed`` into a stored top N without recomputing it: the stored
+    matches plus the changed article, topped up from the stored fallback rows.
+    """
+    merged = [(by_id[listed_id], listed_score) for listed_id, listed_score in current if listed_id in by_id]
+    merged.append((changed, score))
+    matches = [(listed_score, profile) for profile, listed_score in merged]
+    fallback = [profile for profile, listed_score in merged if listed_score <= 0]
+    fallback.sort(key=lambda profile: profile.created_at, reverse=True)
+    return _rank(matches, fallback)
+
+
+def refresh_for_changed_article(article_id, listed_in=()):
+    """
+    Update the stored lists after one article was saved, published,
+    unpublished or deleted.
+
+    The article's own list is recomputed. Other lists are only touched when
+    the changed article should enter them or already sits in them: entering
+    is a merge into the stored top N, and only a list that held the article
+    is recomputed from scratch. Topic lists are entered by term overlap with
+    the article's category, keywords or title, or as a newer fallback.
+
+    Args:
+        article_id: the changed article
+        listed_in: sources that held the article before it was deleted (the
+            rows themselves are gone by then)
+    """
+    profiles = load_profiles()
+    by_id = {profile.id: profile for profile in profiles}
+    changed = by_id.get(article_id)
+
+    lists = {}
+    if changed is not None:
+        lists[article_source(article_id)] = rank_for_article(changed, profiles)
+    else:
+        RelatedArticle.objects.filter(source=article_source(article_id)).delete()
+
+    stored = {}
+    for source, other_id, score in RelatedArticle.objects.exclude(
+        source=article_source(article_id)
+    ).order_by('source', 'rank').values_list('source', 'article_id', 'score'):
+        stored.setdefault(source, []).append((other_id, score))
+    holding = set(listed_in) | {
+        source for source, rows in stored.items() if any(listed_id == article_id for listed_id, _ in rows)
+    }
+
+    cutoff = timezone.now() - timedelta(days=RELATED_TOPIC_WINDOW_DAYS)
+    for slug in topic_slugs():
+        source = topic_source(slug)
+        current = stored.get(source)
+        if source in holding or (current is None and changed is not None):
+            # Held it (anything could take its place), or was never stored
+            lists[source] = rank_for_topic(slug, profiles)
+            continue
+        if changed is None or changed.created_at < cutoff:
+            continue
+
+        score = score_topic(_topic_terms(slug), changed)
+        if score <= 0 and len(current) >= RELATED_ARTICLES_STORED and all(s > 0 for _, s in current):
+            # No shared term, and no fallback slot it could take
+            continue
+        ranked = _merge(current, by_id, changed, score)
+        if ranked != current:
+            lists[source] = ranked
+
+    for other in profiles:
+        if other.id == article_id:
+            continue
+        source = article_source(other.id)
+
+        if source in holding:
+            lists[source] = rank_for_article(other, profiles)
+            continue
+        if changed is None:
+            continue
+
+        score = score_articles(changed, other)
+        if score <= 0:
+            continue
+
+        current = stored.get(source, [])
+        ranked = _merge(current, by_id, changed, score)
+        if ranked != current:
+            lists[source] = ranked
+
+    _store(lists)
+
+
+def queue_related_refresh(article_id, listed_in=()):
+    """Refresh the lists affected by one article in the background (one queued job per article)"""
+    payload = {'article_id': article_id, 'listed_in': sorted(listed_in)}
+    job, created = enqueue_once(REFRESH_JOB_TYPE, payload, key=f"{REFRESH_JOB_TYPE}:{article_id}")
+    if created:
+        return job
+    if job.status == 'running':
+        # It may already have read the article as it was before this change
+        return enqueue(REFRESH_JOB_TYPE, payload, max_attempts=1)
+    if listed_in:
+        payload['listed_in'] = sorted(set(job.payload.get('listed_in', [])) | set(listed_in))
+        BackgroundJob.objects.filter(pk=job.pk, status='queued').update(payload=payload)
+    return job
+
+
+@job_handler(REFRESH_JOB_TYPE)
+def refresh_related_job(payload):
+    refresh_for_changed_article(payload['article_id'], payload.get('listed_in', ()))
+    return {'article_id': payload['article_id']}
+
+
+def get_related_articles(slug, limit=3):
+    """
+    Published articles related to a prodi or category slug, best match first.
+
+    A single indexed query over the precomputed RelatedArticle rows; the
+    list is built on first use if it has never been computed.
+    """
+    return _read(topic_source(slug), limit, lambda: refresh_topic(slug))
+
+
+def get_articles_related_to(article, limit=3):
+    """Published articles related to one article, best match first"""
+    return _read(article_source(article.pk), limit, lambda: refresh_article(article.pk))
+
+
+def _read(source, limit, build):
+    def query():
+        return list(
+            Article.objects.select_related('category', 'created_by')
+            .visible()
+            .filter(related_entries__source=source)
+            .order_by('related_entries__rank')[:limit]
+        )
+
+    try:
+        articles = query()
+        if not articles and source not in _built_sources:
+            build()
+            articles = query()
+        return articles
+    except Exception as e:
+        logger.exception(f"Error getting related articles for {source}: {str(e)}")
+        return list(Article.objects.visible()[:limit])
@@ -0,0 +1,273 @@
+import html
+import logging
+import re
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+from django.db.models import Case, IntegerField, Q, When
+from django.utils.html import escape, strip_tags
+from django.utils.safestring import mark_safe
+
+logger = logging.getLogger(__name__)
+
+# Full-text index for Article search
+# ---------------------------------
+# SQLite uses an FTS5 virtual table, PostgreSQL a tsvector table with a GIN
+# index. Both hold a stripped-HTML copy of each article keyed by article id
+# and are kept in sync by the Article save/delete signals. The table is
+# created at runtime (after migrate, or on first use) since migrations are
+# generated on the server. On any other database, or if the index cannot be
+# created, search falls back to icontains filtering.
+
+SEARCH_TABLE = 'pages_article_search'
+SEARCH_MAX_RESULTS = getattr(settings, 'SEARCH_MAX_RESULTS', 1000)
+SEARCH_CONFIG = getattr(settings, 'SEARCH_CONFIG', 'simple')  # PostgreSQL text search configuration
+
+# Highlight markers used inside the database; swapped for <mark> after escaping
+_MARK_START = '\x02'
+_MARK_END = '\x03'
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+_SPACE_RE = re.compile(r'\s+')
+
+_index_ready = {}
+
+
+def _vendor(using):
+    return connections[using].vendor
+
+
+def ensure_search_index(using=DEFAULT_DB_ALIAS):
+    """Create the search table if it does not exist. Returns True when search is available."""
+    vendor = _vendor(using)
+    if vendor == 'sqlite':
+        statements = [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+            "title, excerpt, content, keywords, tokenize='unicode61 remove_diacritics 2')"
+        ]
+    elif vendor == 'postgresql':
+        statements = [
+            f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ("
+            "article_id bigint PRIMARY KEY, title text NOT NULL, body text NOT NULL, document tsvector NOT NULL)",
+            f"CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document ON {SEARCH_TABLE} USING GIN (document)",
+        ]
+    else:
+        _index_ready[using] = False
+        return False
+
+    try:
+        with transaction.atomic(using=using):
+            with connections[using].cursor() as cursor:
+                for statement in statements:
+                    cursor.execute(statement)
+        _index_ready[using] = True
+    except DatabaseError as e:
+        logger.error(f"Full-text search index unavailable, falling back to icontains: {str(e)}")
+        _index_ready[using] = False
+    return _index_ready[using]
+
+
+def search_available(using=DEFAULT_DB_ALIAS):
+    if using not in _index_ready:
+        ensure_search_index(using)
+    return _index_ready[using]
+
+
+def _plain_text(value):
+    return _SPACE_RE.sub(' ', html.unescape(strip_tags(value or ''))).strip()
+
+
+def article_document(article):
+    """The searchable fields of an article as plain text"""
+    return {
+        'title': _plain_text(article.title),
+        'excerpt': _plain_text(article.excerpt),
+        'content': _plain_text(article.content),
+        'keywords': _plain_text(article.meta_keywords),
+    }
+
+
+def index_article(article, using=DEFAULT_DB_ALIAS):
+    """Add or refresh one article in the search index"""
+    if not search_available(using):
+        return
+    doc = article_document(article)
+    try:
+        with transaction.atomic(using=using):
+            with connections[using].cursor() as cursor:
+                if _vendor(using) == 'sqlite':
+                    cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [article.pk])
+                    cursor.execute(
+                        f"INSERT INTO {SEARCH_TABLE} (rowid, title, excerpt, content, keywords) VALUES (%s, %s, %s, %s, %s)",
+                        [article.pk, doc['title'], doc['excerpt'], doc['content'], doc['keywords']],
+                    )
+                else:
+                    cursor.execute(
+                        f"INSERT INTO {SEARCH_TABLE} (article_id, title, body, document) VALUES (%s, %s, %s, "
+                        "setweight(to_tsvector(%s::regconfig, %s), 'A') || "
+                        "setweight(to_tsvector(%s::regconfig, %s), 'B') || "
+                        "setweight(to_tsvector(%s::regconfig, %s), 'B') || "
+                        "setweight(to_tsvector(%s::regconfig, %s), 'C')) "
+                        "ON CONFLICT (article_id) DO UPDATE SET "
+                        "title = EXCLUDED.title, body = EXCLUDED.body, document = EXCLUDED.document",
+                        [
+                            article.pk, doc['title'], f"{doc['excerpt']} {doc['content']}",
+                            SEARCH_CONFIG, doc['title'],
+                            SEARCH_CONFIG, doc['keywords'],
+                            SEARCH_CONFIG, doc['excerpt'],
+                            SEARCH_CONFIG, doc['content'],
+                        ],
+                    )
+    except DatabaseError as e:
+        logger.error(f"Could not index article {article.pk}: {str(e)}")
+
+
+def remove_article(article_id, using=DEFAULT_DB_ALIAS):
+    """Drop one article from the search index"""
+    if not search_available(using):
+        return
+    column = 'rowid' if _vendor(using) == 'sqlite' else 'article_id'
+    try:
+        with transaction.atomic(using=using):
+            with connections[using].cursor() as cursor:
+                cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE {column} = %s", [article_id])
+    except DatabaseError as e:
+        logger.error(f"Could not remove article {article_id} from search index: {str(e)}")
+
+
+def rebuild_search_index(using=DEFAULT_DB_ALIAS, batch_size=200):
+    """Re-index every article. Returns the number of articles indexed, or None if search is unavailable."""
+    from .models import Article
+
+    if not ensure_search_index(using):
+        return None
+
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+
+    count = 0
+    articles = Article.objects.using(using).only('id', 'title', 'excerpt', 'content', 'meta_keywords')
+    for article in articles.iterator(chunk_size=batch_size):
+        index_article(article, using)
+        count += 1
+    return count
+
+
+def search_index_size(using=DEFAULT_DB_ALIAS):
+    if not search_available(using):
+        return None
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"SELECT COUNT(*) FROM {SEARCH_TABLE}")
+        return cursor.fetchone()[0]
+
+
+def _query_terms(query):
+    return _WORD_RE.findall(query or '')[:20]
+
+
+def _fts5_query(terms):
+    # Quote every term so user input can never be read as FTS5 syntax, and
+    # prefix-match the last one since searches are run as the user types
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def _tsquery(terms):
+    return ' & '.join(terms[:-1] + [f"{terms[-1]}:*"])
+
+
+def search_article_ids(query, using=DEFAULT_DB_ALIAS, limit=SEARCH_MAX_RESULTS):
+    """
+    Ranked ids of the articles matching a search query.
+
+    Returns a list of ids, best match first, or None when the index is not
+    available and the caller should fall back to a LIKE search.
+    """
+    if not search_available(using):
+        return None
+    terms = _query_terms(query)
+    if not terms:
+        return []
+
+    try:
+        with connections[using].cursor() as cursor:
+            if _vendor(using) == 'sqlite':
+                cursor.execute(
+                    f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s "
+                    f"ORDER BY bm25({SEARCH_TABLE}, 10.0, 4.0, 1.0, 6.0) LIMIT %s",
+                    [_fts5_query(terms), limit],
+                )
+            else:
+                cursor.execute(
+                    f"SELECT article_id FROM {SEARCH_TABLE}, to_tsquery(%s::regconfig, %s) query "
+                    "WHERE document @@ query ORDER BY ts_rank_cd(document, query) DESC LIMIT %s",
+                    [SEARCH_CONFIG, _tsquery(terms), limit],
+                )
+            return [row[0] for row in cursor.fetchall()]
+    except DatabaseError as e:
+        logger.error(f"Full-text search failed for '{query}': {str(e)}")
+        return None
+
+
+def search_articles(queryset, query, fallback_fields=('title', 'excerpt', 'content')):
+    """
+    Filter an Article queryset by a search query, best matches first.
+
+    Uses the full-text index when available (at most SEARCH_MAX_RESULTS
+    matches), otherwise an icontains filter over fallback_fields.
+    """
+    ids = search_article_ids(query, queryset.db)
+    if ids is None:
+        condition = Q()
+        for field in fallback_fields:
+            condition |= Q(**{f"{field}__icontains": query})
+        return queryset.filter(condition)
+    if not ids:
+        return queryset.none()
+
+    ranking = Case(*[When(pk=pk, then=position) for position, pk in enumerate(ids)], output_field=IntegerField())
+    return queryset.filter(pk__in=ids).annotate(search_rank=ranking).order_by('search_rank')
+
+
+def _render_snippet(text):
+    return mark_safe(escape(text).replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>'))
+
+
+def attach_search_snippets(articles, query, using=DEFAULT_DB_ALIAS):
+    """
+    Set ``search_snippet`` (highlighted HTML, or None) on each article.
+
+    Returns the articles as a list, so it can replace a page's object_list.
+    """
+    articles = list(articles)
+    terms = _query_terms(query)
+    if not articles or not terms or not search_available(using):
+        return articles
+
+    ids = [article.pk for article in articles]
+    placeholders = ', '.join(['%s'] * len(ids))
+    snippets = {}
+    try:
+        with connections[using].cursor() as cursor:
+            if _vendor(using) == 'sqlite':
+                cursor.execute(
+                    f"SELECT rowid, snippet({SEARCH_TABLE}, -1, %s, %s, '…', 24) FROM {SEARCH_TABLE} "
+                    f"WHERE {SEARCH_TABLE} MATCH %s AND rowid IN ({placeholders})",
+                    [_MARK_START, _MARK_END, _fts5_query(terms)] + ids,
+                )
+            else:
+                cursor.execute(
+                    f"SELECT article_id, ts_headline(%s::regconfig, body, to_tsquery(%s::regconfig, %s), %s) "
+                    f"FROM {SEARCH_TABLE} WHERE article_id IN ({placeholders})",
+                    [SEARCH_CONFIG, SEARCH_CONFIG, _tsquery(terms),
+                     f'StartSel={_MARK_START}, StopSel={_MARK_END}, MaxWords=35, MinWords=15'] + ids,
+                )
+            snippets = dict(cursor.fetchall())
+    except DatabaseError as e:
+        logger.error(f"Could not build search snippets: {str(e)}")
+
+    for article in articles:
+        snippet = snippets.get(article.pk)
+        article.search_snippet = _render_snippet(snippet) if snippet and _MARK_START in snippet else None
+    return articles
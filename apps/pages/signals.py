@@ -0,0 +1,110 @@
+import logging
+
+from django.db.models.signals import post_save, post_delete, post_migrate, pre_delete
+from django.dispatch import receiver
+
+from .models import Page, ContentBlock, Article, ArticleCategory, RelatedArticle
+from .publishing import schedule_publication
+from .related import queue_related_refresh
+from .search import ensure_search_index, index_article, rebuild_search_index, remove_article, search_index_size
+from .snapshots import invalidate_page_snapshot, POPUP_SLUG
+from .utils import invalidate_cache_tags
+
+logger = logging.getLogger(__name__)
+
+
+def page_cache_tags(page):
+    """Cache tags that views rendering this page depend on"""
+    tags = [f"page:{page.slug}"]
+    if page.is_homepage:
+        tags.append('homepage')
+    if page.slug == POPUP_SLUG:
+        tags.append('popup')
+    return tags
+
+
+@receiver([post_save, post_delete], sender=Page)
+def invalidate_page_on_change(sender, instance, **kwargs):
+    """Drop the page snapshot when a page is edited or deleted"""
+    invalidate_page_snapshot(instance.slug)
+    invalidate_cache_tags(*page_cache_tags(instance))
+
+
+@receiver([post_save, post_delete], sender=ContentBlock)
+def invalidate_page_on_block_change(sender, instance, **kwargs):
+    """Drop the owning page snapshot when one of its blocks changes"""
+    try:
+        page = instance.page
+    except Page.DoesNotExist:
+        # The page itself is being deleted; its own signal handles it
+        return
+    invalidate_page_snapshot(page.slug)
+    invalidate_cache_tags(*page_cache_tags(page))
+
+
+@receiver([post_save, post_delete], sender=Article)
+def invalidate_article_on_change(sender, instance, **kwargs):
+    """Invalidate views listing or showing this article"""
+    tags = ['articles', f"article:{instance.pk}"]
+    try:
+        tags.append(f"category:{instance.category.slug}")
+    except ArticleCategory.DoesNotExist:
+        pass
+    invalidate_cache_tags(*tags)
+
+
+@receiver(post_save, sender=Article)
+def schedule_article_publication(sender, instance, **kwargs):
+    """Invalidate cached views again when a scheduled article's time comes"""
+    schedule_publication(instance)
+
+
+@receiver([post_save, post_delete], sender=ArticleCategory)
+def invalidate_category_on_change(sender, instance, **kwargs):
+    """Invalidate views showing this category or the category list"""
+    invalidate_cache_tags('categories', f"category:{instance.slug}")
+
+
+@receiver(post_save, sender=Article)
+def index_article_on_save(sender, instance, **kwargs):
+    """Keep the full-text search index in step with the article"""
+    index_article(instance)
+
+
+@receiver(post_delete, sender=Article)
+def remove_article_from_index(sender, instance, **kwargs):
+    remove_article(instance.pk)
+
+
+@receiver(post_save, sender=Article)
+def refresh_related_on_save(sender, instance, **kwargs):
+    """Re-rank related-article lists the article belongs to or should enter"""
+    try:
+        queue_related_refresh(instance.pk)
+    except Exception as e:
+        logger.error(f"Could not queue related articles refresh for {instance.pk}: {str(e)}")
+
+
+@receiver(pre_delete, sender=Article)
+def remember_related_sources(sender, instance, **kwargs):
+    # The rows listing this article are cascade-deleted with it
+    instance._related_sources = list(
+        RelatedArticle.objects.filter(article_id=instance.pk).values_list('source', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Article)
+def refresh_related_on_delete(sender, instance, **kwargs):
+    try:
+        queue_related_refresh(instance.pk, getattr(instance, '_related_sources', ()))
+    except Exception as e:
+        logger.error(f"Could not queue related articles refresh after deleting {instance.pk}: {str(e)}")
+
+
+@receiver(post_migrate)
+def create_search_index(sender, using, **kwargs):
+    """Create the search table after migrate and fill it on first run"""
+    if sender.label != 'pages' or not ensure_search_index(using):
+        return
+    if not search_index_size(using) and Article.objects.using(using).exists():
+        rebuild_search_index(using)
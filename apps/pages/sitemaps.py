@@ -7,7 +7,7 @@ class ArticleSitemap(Sitemap):
     priority = 0.8
 
     def items(self):
-        return Article.objects.filter(status='published')
+        return Article.objects.visible()
 
     def lastmod(self, obj):
         return obj.updated_at
@@ -0,0 +1,150 @@
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# How long an assembled page snapshot may live in the cache. Edits never wait
+# for this to expire: saving a Page or ContentBlock bumps the page version.
+PAGE_SNAPSHOT_TIMEOUT = getattr(settings, 'PAGE_SNAPSHOT_TIMEOUT', 60 * 60 * 24)
+
+
+def _version_key(slug):
+    return f"page_snapshot_version:{slug}"
+
+
+def _snapshot_key(slug, version):
+    return f"page_snapshot:{slug}:{version}"
+
+
+def _new_version():
+    # A timestamp instead of a counter, so a culled version key can never
+    # fall back to a number an older snapshot was stored under.
+    return time.time_ns()
+
+
+def get_page_version(slug):
+    """Return the current snapshot version for a page slug"""
+    version = cache.get(_version_key(slug))
+    if version is None:
+        version = _new_version()
+        cache.add(_version_key(slug), version, None)
+        version = cache.get(_version_key(slug), version)
+    return version
+
+
+def build_page_snapshot(page):
+    """Assemble the blocks dict (and its JSON form) for a page from the database"""
+    blocks = {}
+    for block in page.content_blocks.all().order_by('order'):
+        blocks[block.identifier] = block.content
+
+    return {
+        'blocks': blocks,
+        'blocks_json': json.dumps(blocks),
+    }
+
+
+def get_page_snapshot(page):
+    """
+    Get the compiled snapshot for a page.
+
+    Returns a dict with:
+        - blocks (dict): content blocks keyed by identifier, in block order
+        - blocks_json (str): the same blocks serialized for JavaScript
+
+    The snapshot is stored per slug and version, so a single cache get
+    replaces the content block query and the JSON dump on every request.
+    """
+    key = _snapshot_key(page.slug, get_page_version(page.slug))
+    snapshot = cache.get(key)
+
+    if snapshot is None:
+        snapshot = build_page_snapshot(page)
+        try:
+            cache.set(key, snapshot, PAGE_SNAPSHOT_TIMEOUT)
+        except Exception as e:
+            logger.error(f"Could not store page snapshot for {page.slug}: {str(e)}")
+
+    return snapshot
+
+
+def invalidate_page_snapshot(slug):
+    """Move a page to a new version so the next request rebuilds its snapshot"""
+    if not slug:
+        return
+    cache.set(_version_key(slug), _new_version(), None)
+    logger.info(f"Page snapshot invalidated for '{slug}'")
+
+
+# Popup provider
+# --------------
+# The popup is rendered on almost every public page, so its context is kept
+# in two tiers: a process-local copy tagged with the popup page version, and
+# a shared cache entry for the other workers. Saving the popup page or one
+# of its blocks bumps the version, which retires both tiers.
+
+POPUP_SLUG = 'popup'
+
+_popup_local = {'version': None, 'context': None}
+_popup_lock = threading.Lock()
+
+
+def _popup_key(version):
+    return f"popup_context:{version}"
+
+
+def build_popup_context():
+    """Read the popup page from the database and build its template context"""
+    from .models import Page
+
+    context = {}
+    try:
+        popup_page = Page.objects.get(slug=POPUP_SLUG, status=Page.PUBLISHED)
+    except Page.DoesNotExist:
+        return context
+
+    if popup_page.metadata.get('is_active', False):
+        context['blocks_popup'] = get_page_snapshot(popup_page)['blocks']
+        context['popup_active'] = True
+    return context
+
+
+def get_popup_context():
+    """
+    Get popup blocks if the popup is active.
+
+    Returns an empty dict when the popup page is missing or inactive, so
+    views can always do ``context.update(get_popup_context())``.
+    """
+    version = get_page_version(POPUP_SLUG)
+
+    with _popup_lock:
+        if _popup_local['version'] == version:
+            return dict(_popup_local['context'])
+
+    context = cache.get(_popup_key(version))
+    if context is None:
+        context = build_popup_context()
+        try:
+            cache.set(_popup_key(version), context, PAGE_SNAPSHOT_TIMEOUT)
+        except Exception as e:
+            logger.error(f"Could not store popup context: {str(e)}")
+
+    with _popup_lock:
+        _popup_local['version'] = version
+        _popup_local['context'] = context
+
+    return dict(context)
+
+
+def invalidate_popup_context():
+    """Retire the cached popup context in this process and the shared cache"""
+    with _popup_lock:
+        _popup_local['version'] = None
+        _popup_local['context'] = None
+    invalidate_page_snapshot(POPUP_SLUG)
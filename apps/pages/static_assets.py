@@ -0,0 +1,131 @@
+import json
+import logging
+import os
+import time
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+logger = logging.getLogger(__name__)
+
+# Fingerprinted static assets
+# ---------------------------
+# collectstatic copies every asset to <name>.<content hash>.<ext>, writes
+# staticfiles.json (name -> hashed name) and pre-compresses each file with
+# gzip and brotli. Hashed names never change content, so they are served with
+# far-future immutable caching; a changed asset simply gets a new name.
+#
+# {% static %} resolves hashed names by itself. Code that builds static URLs
+# by hand (optimized_image, the i18n loader's locale bundles) goes through
+# static_url(). With DEBUG on, plain names are used and nothing needs
+# collecting.
+
+LOCALE_LANGUAGES = ('id', 'en', 'zh')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+class HashedStaticStorage(CompressedManifestStaticFilesStorage):
+    """
+    WhiteNoise's manifest storage, but a file that does not exist (a
+    vendored script's missing source map, a name not collected yet) keeps
+    its plain name instead of failing collectstatic or the page.
+    """
+
+    manifest_strict = False
+    # How often (seconds) a running process checks for a new manifest
+    MANIFEST_CHECK_INTERVAL = 1.0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._manifest_checked = time.monotonic()
+        self._manifest_mtime = self._manifest_stat()
+
+    def _manifest_stat(self):
+        try:
+            return os.stat(self.manifest_storage.path(self.manifest_name)).st_mtime_ns
+        except (OSError, NotImplementedError):
+            return None
+
+    def _reload_changed_manifest(self):
+        # collectstatic after a git pull runs in one process; the others load
+        # the new manifest here instead of linking old hashes until a restart
+        now = time.monotonic()
+        if now - self._manifest_checked < self.MANIFEST_CHECK_INTERVAL:
+            return
+        self._manifest_checked = now
+        mtime = self._manifest_stat()
+        if mtime != self._manifest_mtime:
+            self._manifest_mtime = mtime
+            self.hashed_files, self.manifest_hash = self.load_manifest()
+
+    def stored_name(self, name):
+        self._reload_changed_manifest()
+        return super().stored_name(name)
+
+    def url(self, name, force=False):
+        # Templates use both {% static 'js/x.js' %} and {% static '/js/x.js' %}
+        return super().url(name.lstrip('/') if name else name, force)
+
+    def hashed_name(self, name, content=None, filename=None):
+        try:
+            return super().hashed_name(name, content, filename)
+        except ValueError:
+            if content is not None:
+                raise
+            logger.debug(f"Static file {name} not found, using the unhashed name")
+            return name
+
+
+def _uses_manifest():
+    return hasattr(staticfiles_storage, 'stored_name')
+
+
+def static_url(path):
+    """Public URL of a static file, hashed when the manifest has it"""
+    path = path.lstrip('/')
+    if path.startswith('static/'):
+        path = path[len('static/'):]
+    try:
+        return staticfiles_storage.url(path)
+    except ValueError:
+        return f"{settings.STATIC_URL}{path}"
+
+
+def hashed_static_url(url):
+    """Swap a /static/... URL for its hashed form; other URLs are returned unchanged"""
+    if not url or not url.startswith(settings.STATIC_URL):
+        return url
+    return static_url(url[len(settings.STATIC_URL):])
+
+
+def is_hashed_static(path):
+    """True for a name written by the manifest storage (its content never changes)"""
+    if not _uses_manifest():
+        return False
+    try:
+        return path in _hashed_names()
+    except Exception as e:
+        logger.error(f"Could not read static manifest: {str(e)}")
+        return False
+
+
+_hashed_names_cache = {'manifest': None, 'names': frozenset()}
+
+
+def _hashed_names():
+    hashed_files = staticfiles_storage.hashed_files
+    if _hashed_names_cache['manifest'] is not hashed_files:
+        _hashed_names_cache['names'] = frozenset(hashed_files.values())
+        _hashed_names_cache['manifest'] = hashed_files
+    return _hashed_names_cache['names']
+
+
+def locale_urls():
+    """{language: URL of its static/locales/<lang>.json bundle}"""
+    return {lang: static_url(os.path.join('locales', f"{lang}.json")) for lang in LOCALE_LANGUAGES}
+
+
+def locale_urls_json():
+    # Safe inside a <script> element
+    return json.dumps(locale_urls()).replace('<', '\\u003C').replace('>', '\\u003E').replace('&', '\\u0026')
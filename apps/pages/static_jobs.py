@@ -0,0 +1,57 @@
+import logging
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+
+from .cache_warming import spawn_warm_cache
+from .jobs import PermanentJobError, enqueue_once, job_handler
+
+logger = logging.getLogger(__name__)
+
+# collectstatic after a deploy
+# ----------------------------
+# Collecting and post-processing every asset (hashing, gzip, brotli) takes
+# tens of seconds, so git_pull_view queues 'pages.collectstatic' instead of
+# running it inside the request; the page polls the job for its status.
+#
+# The worker runs collectstatic in a fresh `manage.py` process, which loads
+# the settings that were just pulled. Other web processes pick up the new
+# manifest by themselves (HashedStaticStorage). With WARM_CACHE_AFTER_DEPLOY
+# the cache is warmed once the assets are collected, so pages are rendered
+# with the new hashed names.
+
+COLLECTSTATIC_JOB_TYPE = 'pages.collectstatic'
+COLLECTSTATIC_TIMEOUT = getattr(settings, 'COLLECTSTATIC_TIMEOUT', 30 * 60)
+
+
+def queue_collectstatic(warm_cache=False):
+    """Returns (job, created); see enqueue_once"""
+    return enqueue_once(COLLECTSTATIC_JOB_TYPE, {'warm_cache': warm_cache})
+
+
+@job_handler(COLLECTSTATIC_JOB_TYPE)
+def collectstatic_job(payload):
+    command = [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'collectstatic', '--noinput']
+    try:
+        process = subprocess.run(
+            command,
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            timeout=COLLECTSTATIC_TIMEOUT,
+        )
+    except subprocess.TimeoutExpired:
+        raise PermanentJobError(f"collectstatic did not finish within {COLLECTSTATIC_TIMEOUT} seconds")
+    if process.returncode != 0:
+        error = process.stderr.strip().splitlines()
+        raise PermanentJobError(f"collectstatic failed: {error[-1] if error else process.returncode}")
+
+    output = process.stdout.strip().splitlines()
+    logger.info(f"collectstatic after deploy: {output[-1] if output else 'done'}")
+    cache_warming_pid = spawn_warm_cache(refresh=True) if payload.get('warm_cache') else None
+    return {
+        'output': output[-1] if output else '',
+        'cache_warming_pid': cache_warming_pid,
+    }
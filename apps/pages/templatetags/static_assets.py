@@ -0,0 +1,25 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from apps.pages.static_assets import locale_urls_json, static_url
+
+register = template.Library()
+
+
+@register.simple_tag
+def hashed_static(path):
+    """
+    URL of a static file under its fingerprinted name (like {% static %},
+    but also accepts '/static/...' URLs as stored in content)
+    Usage: {% hashed_static 'locales/en.json' %}
+    """
+    return static_url(path)
+
+
+@register.simple_tag
+def i18n_locale_urls():
+    """
+    JSON map of language -> locale bundle URL for i18n-init.js
+    Usage: <script>window.I18N_LOCALE_URLS = {% i18n_locale_urls %};</script>
+    """
+    return mark_safe(locale_urls_json())
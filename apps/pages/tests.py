@@ -1,3 +1,579 @@
-from django.test import TestCase
+import datetime
+import gzip
+import io
+import os
+import sqlite3
+import tempfile
+import zipfile
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.http import Http404, HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from django.utils.http import http_date
+
+from apps.media.models import MediaFile
+from apps.media.pagination import decode_cursor, keyset_page
+from .backup_utils import DEFAULT_EXCLUDES, ExcludeMatcher
+from .cache_backends import TieredCache
+from .db_snapshot import apply_retention, file_sha256, list_database_snapshots, snapshot_database
+from .file_delivery import MODE_X_ACCEL, MODE_X_SENDFILE, deliver_file, file_etag, resolve_accel_location
+from .middleware.file_delivery import FakeProxyMiddleware
+from .zip_stream import READ_BLOCK_SIZE, directory_entries, iter_zip, iter_zip_members
+
+L2_ALIAS = 'tiered_test_l2'
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    L2_ALIAS: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tiered-test-l2'},
+})
+class TieredCacheTests(SimpleTestCase):
+    """TieredCache with a LocMemCache standing in for the shared L2"""
+
+    def setUp(self):
+        self.l2 = caches[L2_ALIAS]
+        self.l2.clear()
+        self.cache = self.make_cache()
+
+    def make_cache(self, **options):
+        options = {'L2_ALIAS': L2_ALIAS, 'L1_TIMEOUT': 5, **options}
+        return TieredCache('', {'OPTIONS': options})
+
+    def test_l1_hit(self):
+        self.cache.set('key', {'value': 1})
+        self.l2.delete('key')
+        # Still answered from L1 although L2 lost it
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+        self.assertEqual(self.cache.info()['l1_hits'], 1)
+
+    def test_l2_fallthrough(self):
+        self.l2.set('key', 'from l2')
+        self.assertEqual(self.cache.get('key'), 'from l2')
+        self.assertEqual(self.cache.get('key'), 'from l2')
+        info = self.cache.info()
+        self.assertEqual(info['l2_hits'], 1)
+        self.assertEqual(info['l1_hits'], 1)
+
+    def test_l1_values_are_copies(self):
+        self.cache.set('key', ['a'])
+        self.cache.get('key').append('b')
+        self.assertEqual(self.cache.get('key'), ['a'])
+
+    def test_delete_passes_through(self):
+        self.cache.set('key', 'value')
+        self.cache.delete('key')
+        self.assertIsNone(self.l2.get('key'))
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_delete_from_another_worker_reaches_l2(self):
+        other = self.make_cache()
+        self.cache.set('key', 'value')
+        other.delete('key')
+        self.assertIsNone(self.l2.get('key'))
+
+    def test_add_passes_through(self):
+        self.assertTrue(self.cache.add('key', 'first'))
+        self.assertEqual(self.l2.get('key'), 'first')
+        self.assertFalse(self.cache.add('key', 'second'))
+        self.assertEqual(self.l2.get('key'), 'first')
+        self.assertEqual(self.cache.get('key'), 'first')
+
+    def test_add_respects_l2_value(self):
+        self.l2.set('key', 'other worker')
+        self.assertFalse(self.cache.add('key', 'mine'))
+        self.assertEqual(self.cache.get('key'), 'other worker')
+
+    def test_incr_passes_through(self):
+        self.cache.set('counter', 1)
+        self.assertEqual(self.cache.get('counter'), 1)
+        self.assertEqual(self.cache.incr('counter', 5), 6)
+        self.assertEqual(self.l2.get('counter'), 6)
+        # The L1 copy was dropped, not left at the old value
+        self.assertEqual(self.cache.get('counter'), 6)
+
+    def test_incr_missing_key(self):
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_eviction_counter(self):
+        cache = self.make_cache(L1_MAX_BYTES=1000, L1_MAX_ENTRY_BYTES=1000)
+        for name in ('a', 'b', 'c'):
+            cache.set(name, 'x' * 400)
+        info = cache.info()
+        self.assertEqual(info['l1_evictions'], 1)
+        self.assertEqual(info['l1_entries'], 2)
+        self.assertLessEqual(info['l1_bytes'], 1000)
+        # The evicted (least recently used) entry comes from L2 again
+        self.assertEqual(cache.get('a'), 'x' * 400)
+        self.assertEqual(cache.info()['l2_hits'], 1)
+
+    def test_oversized_entries_skip_l1(self):
+        cache = self.make_cache(L1_MAX_BYTES=1000, L1_MAX_ENTRY_BYTES=100)
+        cache.set('big', 'x' * 500)
+        self.assertEqual(cache.info()['l1_entries'], 0)
+        self.assertEqual(cache.get('big'), 'x' * 500)
+
+    def test_l1_timeout_expiry(self):
+        with mock.patch('apps.pages.cache_backends.time.monotonic', return_value=1000.0) as monotonic:
+            self.cache.set('key', 'value')
+            self.l2.set('key', 'changed by another worker')
+            monotonic.return_value = 1004.0
+            self.assertEqual(self.cache.get('key'), 'value')
+            monotonic.return_value = 1005.5
+            self.assertEqual(self.cache.get('key'), 'changed by another worker')
+        info = self.cache.info()
+        self.assertEqual(info['l1_hits'], 1)
+        self.assertEqual(info['l2_hits'], 1)
+
+    def test_short_timeout_bounds_l1(self):
+        with mock.patch('apps.pages.cache_backends.time.monotonic', return_value=1000.0) as monotonic:
+            self.cache.set('key', 'value', timeout=1)
+            monotonic.return_value = 1002.0
+            self.l2.delete('key')
+            self.assertIsNone(self.cache.get('key'))
+
+    def test_info_counters(self):
+        self.cache.set('a', 1)
+        self.cache.set_many({'b': 2, 'c': 3})
+        self.cache.get('a')
+        self.cache.get('missing')
+        self.l2.set('d', 4)
+        self.cache.get_many(['b', 'd', 'missing'])
+        self.cache.delete('a')
+        self.cache.delete_many(['b', 'c'])
+
+        info = self.cache.info()
+        self.assertEqual(info['sets'], 3)
+        self.assertEqual(info['l1_hits'], 2)
+        self.assertEqual(info['l2_hits'], 1)
+        self.assertEqual(info['misses'], 2)
+        self.assertEqual(info['deletes'], 3)
+        self.assertEqual(info['hit_rate'], 0.6)
+        self.assertEqual(info['l2_backend'], 'django.core.cache.backends.locmem.LocMemCache')
+
+    def test_info_without_lookups(self):
+        self.assertIsNone(self.cache.info()['hit_rate'])
+
+    def test_invalidation_keys_skip_l1(self):
+        self.cache.set('cache_tag:articles', 1)
+        self.cache.set_many({'page_snapshot_version:home': 'a'})
+        # Another worker bumps them in L2
+        self.l2.set('cache_tag:articles', 2)
+        self.l2.set('page_snapshot_version:home', 'b')
+        self.assertEqual(self.cache.get('cache_tag:articles'), 2)
+        self.assertEqual(self.cache.get_many(['page_snapshot_version:home']), {'page_snapshot_version:home': 'b'})
+        info = self.cache.info()
+        self.assertEqual(info['l1_entries'], 0)
+        self.assertEqual(info['l1_hits'], 0)
+
+    def test_custom_exclude_prefixes(self):
+        cache = self.make_cache(L1_EXCLUDE_PREFIXES=('live:',))
+        cache.set('live:counter', 1)
+        cache.set('cache_tag:articles', 1)
+        self.l2.set('live:counter', 2)
+        self.l2.set('cache_tag:articles', 2)
+        self.assertEqual(cache.get('live:counter'), 2)
+        self.assertEqual(cache.get('cache_tag:articles'), 1)
+
+
+class FakeProxyDeliveryTests(SimpleTestCase):
+    """
+    deliver_file in the offload modes behind FakeProxyMiddleware, built here
+    directly: settings only add it to MIDDLEWARE when they are imported.
+    """
+
+    CONTENT = bytes(range(256)) * 4
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.secure_root = os.path.join(tmp.name, 'secure')
+        os.makedirs(os.path.join(self.secure_root, 'docs'))
+        self.path = os.path.join(self.secure_root, 'docs', 'report.bin')
+        with open(self.path, 'wb') as f:
+            f.write(self.CONTENT)
+        self.stat = os.stat(self.path)
+
+        settings_override = override_settings(
+            MEDIA_ROOT=os.path.join(tmp.name, 'media'),
+            STATIC_ROOT=os.path.join(tmp.name, 'static'),
+            SECURE_DOWNLOAD_ROOT=self.secure_root,
+            FILE_DELIVERY_ACCEL_PREFIX='/protected/',
+            FILE_DELIVERY_FAKE_PROXY=True,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.factory = RequestFactory()
+
+    def proxied(self, view):
+        return FakeProxyMiddleware(view)
+
+    def get(self, mode, **headers):
+        offloaded = []
+
+        def view(request):
+            response = deliver_file(request, self.path, mode=mode)
+            offloaded.append(response)
+            return response
+
+        response = self.proxied(view)(self.factory.get('/download/', **headers))
+        # The view only sent the offload header; the fake proxy sent the file
+        self.assertFalse(offloaded[0].streaming)
+        return response
+
+    def body(self, response):
+        try:
+            return b''.join(response.streaming_content) if response.streaming else response.content
+        finally:
+            response.close()
+
+    def test_offload_headers(self):
+        request = self.factory.get('/download/')
+        accel = deliver_file(request, self.path, mode=MODE_X_ACCEL)
+        self.assertEqual(accel['X-Accel-Redirect'], '/protected/secure/docs/report.bin')
+        sendfile = deliver_file(request, self.path, mode=MODE_X_SENDFILE)
+        self.assertEqual(sendfile['X-Sendfile'], os.path.realpath(self.path))
+
+    def test_full_file(self):
+        for mode in (MODE_X_ACCEL, MODE_X_SENDFILE):
+            with self.subTest(mode=mode):
+                response = self.get(mode)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['Accept-Ranges'], 'bytes')
+                self.assertEqual(self.body(response), self.CONTENT)
+
+    def test_range(self):
+        for mode in (MODE_X_ACCEL, MODE_X_SENDFILE):
+            with self.subTest(mode=mode):
+                response = self.get(mode, HTTP_RANGE='bytes=10-19')
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.CONTENT)}')
+                self.assertEqual(response['Content-Length'], '10')
+                self.assertEqual(self.body(response), self.CONTENT[10:20])
+
+    def test_suffix_range(self):
+        response = self.get(MODE_X_ACCEL, HTTP_RANGE='bytes=-5')
+        self.assertEqual(response.status_code, 206)
+        size = len(self.CONTENT)
+        self.assertEqual(response['Content-Range'], f'bytes {size - 5}-{size - 1}/{size}')
+        self.assertEqual(self.body(response), self.CONTENT[-5:])
+
+    def test_unsatisfiable_range(self):
+        for mode in (MODE_X_ACCEL, MODE_X_SENDFILE):
+            with self.subTest(mode=mode):
+                response = self.get(mode, HTTP_RANGE=f'bytes={len(self.CONTENT)}-')
+                self.assertEqual(response.status_code, 416)
+                self.assertEqual(response['Content-Range'], f'bytes */{len(self.CONTENT)}')
+
+    def test_if_none_match(self):
+        for mode in (MODE_X_ACCEL, MODE_X_SENDFILE):
+            with self.subTest(mode=mode):
+                response = self.get(mode, HTTP_IF_NONE_MATCH=file_etag(self.stat))
+                self.assertEqual(response.status_code, 304)
+
+    def test_if_modified_since(self):
+        for mode in (MODE_X_ACCEL, MODE_X_SENDFILE):
+            with self.subTest(mode=mode):
+                response = self.get(mode, HTTP_IF_MODIFIED_SINCE=http_date(self.stat.st_mtime + 10))
+                self.assertEqual(response.status_code, 304)
+                response = self.get(mode, HTTP_IF_MODIFIED_SINCE=http_date(self.stat.st_mtime - 3600))
+                self.assertEqual(response.status_code, 200)
+                response.close()
+
+    def test_if_range_mismatch_sends_full_file(self):
+        for mode in (MODE_X_ACCEL, MODE_X_SENDFILE):
+            with self.subTest(mode=mode):
+                response = self.get(mode, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale-etag"')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(self.body(response), self.CONTENT)
+
+    def test_if_range_match_sends_range(self):
+        response = self.get(MODE_X_ACCEL, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=file_etag(self.stat))
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self.body(response), self.CONTENT[:10])
+
+    def test_path_traversal(self):
+        outside = os.path.join(os.path.dirname(self.secure_root), 'outside.txt')
+        with open(outside, 'w') as f:
+            f.write('secret')
+        for location in (
+            '/protected/secure/../outside.txt',
+            '/protected/secure/%2e%2e/outside.txt',
+            '/protected/secure/docs/../../outside.txt',
+            '/protected/unknown/report.bin',
+        ):
+            with self.subTest(location=location):
+                self.assertIsNone(resolve_accel_location(location))
+
+                def view(request):
+                    response = HttpResponse(content_type='text/plain')
+                    response['X-Accel-Redirect'] = location
+                    return response
+
+                with self.assertRaises(Http404):
+                    self.proxied(view)(self.factory.get('/download/'))
+
+
+class DatabaseSnapshotTests(SimpleTestCase):
+    """snapshot_database and the hourly/daily/weekly retention of its files"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.backup_dir = os.path.join(tmp.name, 'backups')
+        self.db_path = os.path.join(tmp.name, 'db.sqlite3')
+        with sqlite3.connect(self.db_path) as db:
+            db.execute('CREATE TABLE article (id INTEGER PRIMARY KEY, title TEXT)')
+            db.executemany('INSERT INTO article (title) VALUES (?)', [(f'Article {i}',) for i in range(100)])
+        db.close()
+
+    def count_articles(self, path):
+        db = sqlite3.connect(path)
+        try:
+            return db.execute('SELECT COUNT(*) FROM article').fetchone()[0]
+        finally:
+            db.close()
+
+    def test_snapshot(self):
+        now = datetime.datetime(2026, 10, 18, 10, 30)
+        path, checksum = snapshot_database(self.db_path, self.backup_dir, now=now)
+        self.assertEqual(os.path.basename(path), 'db.sqlite3-2026-10-18---10-30')
+        self.assertEqual(self.count_articles(path), 100)
+        self.assertEqual(file_sha256(path), checksum)
+        with open(f"{path}.sha256") as f:
+            self.assertEqual(f.read(), f"{checksum}  db.sqlite3-2026-10-18---10-30\n")
+        # No temporary copies left behind
+        self.assertEqual(sorted(os.listdir(self.backup_dir)), [os.path.basename(path), f"{os.path.basename(path)}.sha256"])
+
+    def test_compressed_snapshot(self):
+        path, checksum = snapshot_database(self.db_path, self.backup_dir, compress=True)
+        self.assertTrue(path.endswith('.gz'))
+        # The checksum is of the compressed file, as written
+        self.assertEqual(file_sha256(path), checksum)
+        restored = os.path.join(self.backup_dir, 'restored.sqlite3')
+        with gzip.open(path, 'rb') as source, open(restored, 'wb') as dest:
+            dest.write(source.read())
+        self.assertEqual(self.count_articles(restored), 100)
+
+    def make_snapshots(self, times):
+        os.makedirs(self.backup_dir)
+        for taken in times:
+            name = f"db.sqlite3-{taken:%Y-%m-%d---%H-%M}"
+            for filename in (name, f"{name}.sha256"):
+                open(os.path.join(self.backup_dir, filename), 'w').close()
+
+    def test_retention_buckets(self):
+        times = [datetime.datetime(*args) for args in (
+            (2026, 10, 18, 10, 30),  # newest: hour, day and (ISO) week 42
+            (2026, 10, 18, 10, 0),   # same hour, older
+            (2026, 10, 18, 9, 15),   # second hour
+            (2026, 10, 18, 8, 0),    # third hour
+            (2026, 10, 17, 23, 0),   # second day
+            (2026, 10, 17, 12, 0),   # same day, older
+            (2026, 10, 16, 12, 0),   # third day, still week 42
+            (2026, 10, 5, 12, 0),    # week 41
+            (2026, 9, 28, 12, 0),    # week 40
+        )]
+        self.make_snapshots(times)
+        open(os.path.join(self.backup_dir, 'unrelated.txt'), 'w').close()
+
+        removed = apply_retention(self.backup_dir, keep_hourly=2, keep_daily=2, keep_weekly=2)
+
+        kept = [taken for taken, _ in list_database_snapshots(self.backup_dir)]
+        self.assertEqual(kept, [times[0], times[2], times[4], times[7]])
+        self.assertEqual(len(removed), 5)
+        for path in removed:
+            self.assertFalse(os.path.exists(path))
+            self.assertFalse(os.path.exists(f"{path}.sha256"))
+        self.assertTrue(os.path.exists(os.path.join(self.backup_dir, 'unrelated.txt')))
+
+    def test_retention_keeps_everything_within_policy(self):
+        times = [datetime.datetime(2026, 10, 18, hour) for hour in range(5)]
+        self.make_snapshots(times)
+        self.assertEqual(apply_retention(self.backup_dir, keep_hourly=24, keep_daily=7, keep_weekly=4), [])
+        self.assertEqual(len(list_database_snapshots(self.backup_dir)), 5)
+
+
+def legacy_should_exclude(path, exclude_patterns, exclude_dirs):
+    """should_exclude as it was before ExcludeMatcher"""
+    path = Path(path)
+    for dir_path in exclude_dirs:
+        if os.path.abspath(path).startswith(os.path.abspath(dir_path)):
+            return True
+    for pattern in exclude_patterns:
+        if pattern.startswith('*') and path.name.endswith(pattern[1:]):
+            return True
+        elif pattern.endswith('*') and path.name.startswith(pattern[:-1]):
+            return True
+        elif pattern == path.name or pattern == str(path):
+            return True
+    return False
+
+
+class ExcludeMatcherTests(SimpleTestCase):
+    PATHS = [
+        '/srv/cms/.git', '/srv/cms/.github', '/srv/cms/apps/pages/__pycache__',
+        '/srv/cms/apps/pages/views.pyc', '/srv/cms/apps/pages/views.py', '/srv/cms/.idea',
+        '/srv/cms/.vscode', '/srv/cms/venv', '/srv/cms/env', '/srv/cms/.env', '/srv/cms/environment',
+        '/srv/cms/static/node_modules', '/srv/cms/tmp', '/srv/cms/temp', '/srv/cms/template',
+        '/srv/cms/logs/error.log', '/srv/cms/logs/error.log.1', '/srv/cms/backup.zip',
+        '/srv/cms/db.sqlite3.bak', '/srv/cms/.views.py.swp', '/srv/cms/upload.tmp',
+        '/srv/cms/media/uploads/photo.jpg', '/srv/cms/catalog', '/srv/cms/README.md',
+        '/srv/cms/media/.log', '/srv/cms/LOG.LOG',
+    ]
+
+    def test_matches_legacy_should_exclude(self):
+        matcher = ExcludeMatcher(DEFAULT_EXCLUDES)
+        for path in self.PATHS:
+            with self.subTest(path=path):
+                self.assertEqual(matcher(path), legacy_should_exclude(path, DEFAULT_EXCLUDES, []))
+
+    def test_excluded_dirs(self):
+        matcher = ExcludeMatcher(DEFAULT_EXCLUDES, ['/srv/cms/media'])
+        for path in ('/srv/cms/media', '/srv/cms/media/uploads/photo.jpg', '/srv/cms/static/css/site.css'):
+            with self.subTest(path=path):
+                self.assertEqual(matcher(path), legacy_should_exclude(path, DEFAULT_EXCLUDES, ['/srv/cms/media']))
+        # The old string prefix check also matched a sibling sharing the prefix
+        self.assertFalse(matcher('/srv/cms/media-archive/file.txt'))
+
+    def test_excludes_entry_checks_only_the_entry(self):
+        matcher = ExcludeMatcher(DEFAULT_EXCLUDES, ['/srv/cms/media'])
+        self.assertTrue(matcher.excludes_entry('/srv/cms/media', 'media'))
+        self.assertTrue(matcher.excludes_entry('/srv/cms/apps/__pycache__', '__pycache__'))
+        self.assertFalse(matcher.excludes_entry('/srv/cms/apps/views.py', 'views.py'))
+
+    def test_fingerprint(self):
+        self.assertEqual(ExcludeMatcher(['*.log', 'tmp']).fingerprint, ExcludeMatcher(['tmp', '*.log']).fingerprint)
+        self.assertNotEqual(ExcludeMatcher(['tmp']).fingerprint, ExcludeMatcher(['tmp'], ['/srv']).fingerprint)
+
+
+class ZipStreamTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = os.path.join(tmp.name, 'site')
+        self.files = {
+            'index.html': b'<h1>Hello</h1>' * 100,
+            'img/photo.jpg': os.urandom(1000),
+            'docs/large.bin': os.urandom(READ_BLOCK_SIZE * 2 + 17),
+            'docs/empty.txt': b'',
+        }
+        for rel, content in self.files.items():
+            path = os.path.join(self.root, *rel.split('/'))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(content)
+
+    def test_directory_round_trip(self):
+        pieces = list(iter_zip(directory_entries(self.root)))
+        # Sent while it is written, not as one buffer at the end
+        self.assertGreater(len(pieces), 3)
+
+        with zipfile.ZipFile(io.BytesIO(b''.join(pieces))) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertEqual(sorted(archive.namelist()), sorted(f"site/{rel}" for rel in self.files))
+            for rel, content in self.files.items():
+                self.assertEqual(archive.read(f"site/{rel}"), content)
+            self.assertEqual(archive.getinfo('site/img/photo.jpg').compress_type, zipfile.ZIP_STORED)
+            self.assertEqual(archive.getinfo('site/index.html').compress_type, zipfile.ZIP_DEFLATED)
+
+    def test_skip(self):
+        data = b''.join(iter_zip(directory_entries(self.root, skip=[os.path.join(self.root, 'docs')])))
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            self.assertEqual(sorted(archive.namelist()), ['site/img/photo.jpg', 'site/index.html'])
+
+    def test_members_from_blocks(self):
+        def blocks():
+            yield b'first '
+            yield b'second'
+
+        info = zipfile.ZipInfo('notes/readme.txt', date_time=(2026, 10, 18, 12, 0, 0))
+        data = b''.join(iter_zip_members([(info, blocks)]))
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            self.assertEqual(archive.read('notes/readme.txt'), b'first second')
+            self.assertEqual(archive.getinfo('notes/readme.txt').date_time, (2026, 10, 18, 12, 0, 0))
+
+    def test_failing_member_keeps_archive_valid(self):
+        def broken():
+            yield b'partial'
+            raise OSError('disk went away')
+
+        def intact():
+            yield b'intact'
+
+        members = [
+            (zipfile.ZipInfo('broken.txt'), broken),
+            (zipfile.ZipInfo('intact.txt'), intact),
+        ]
+        with self.assertLogs('apps.pages.zip_stream', level='ERROR'):
+            data = b''.join(iter_zip_members(members))
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            self.assertEqual(archive.read('intact.txt'), b'intact')
+
+
+class KeysetPaginationTests(TestCase):
+    PAGE_SIZE = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('keyset')
+        # bulk_create skips the upload signals; several files share a timestamp
+        MediaFile.objects.bulk_create([
+            MediaFile(
+                title=f'File {i}', file=f'uploads/file{i}.txt', content_type='document',
+                file_size=1, file_extension='txt', uploaded_by=user,
+            )
+            for i in range(8)
+        ])
+        base = timezone.now()
+        for i, media in enumerate(MediaFile.objects.order_by('id')):
+            MediaFile.objects.filter(pk=media.pk).update(uploaded_at=base - datetime.timedelta(minutes=i // 3))
+        cls.expected = list(MediaFile.objects.order_by('-uploaded_at', '-id').values_list('id', flat=True))
+
+    def ids(self, page):
+        return [media.pk for media in page]
+
+    def test_forward_without_gaps_or_duplicates(self):
+        seen = []
+        page = keyset_page(MediaFile.objects.all(), self.PAGE_SIZE)
+        self.assertFalse(page.has_previous)
+        pages = 1
+        while True:
+            seen.extend(self.ids(page))
+            if not page.has_next:
+                break
+            page = keyset_page(MediaFile.objects.all(), self.PAGE_SIZE, after=page.next_cursor)
+            self.assertTrue(page.has_previous)
+            pages += 1
+        self.assertEqual(seen, self.expected)
+        self.assertEqual(pages, 3)
+
+    def test_backward_returns_the_same_pages(self):
+        forward = []
+        page = keyset_page(MediaFile.objects.all(), self.PAGE_SIZE)
+        forward.append(self.ids(page))
+        while page.has_next:
+            page = keyset_page(MediaFile.objects.all(), self.PAGE_SIZE, after=page.next_cursor)
+            forward.append(self.ids(page))
+
+        backward = [self.ids(page)]
+        while page.has_previous:
+            page = keyset_page(MediaFile.objects.all(), self.PAGE_SIZE, before=page.previous_cursor)
+            backward.append(self.ids(page))
+        self.assertEqual(list(reversed(backward)), forward)
+
+    def test_invalid_cursor_starts_over(self):
+        self.assertIsNone(decode_cursor('not-a-cursor'))
+        page = keyset_page(MediaFile.objects.all(), self.PAGE_SIZE, after='not-a-cursor')
+        self.assertEqual(self.ids(page), self.expected[:self.PAGE_SIZE])
+
+    def test_filtered_queryset(self):
+        queryset = MediaFile.objects.filter(title__in=['File 1', 'File 4', 'File 7'])
+        page = keyset_page(queryset, 2)
+        rest = keyset_page(queryset, 2, after=page.next_cursor)
+        self.assertEqual(self.ids(page) + self.ids(rest), [pk for pk in self.expected if pk in set(queryset.values_list('id', flat=True))])
+        self.assertFalse(rest.has_next)
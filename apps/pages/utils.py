@@ -1,16 +1,27 @@
 from django.contrib.auth.decorators import user_passes_test
 from django.core.exceptions import PermissionDenied
-from django.http import HttpResponseForbidden
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseNotModified
 from django.shortcuts import redirect
 from django.urls import reverse
 from functools import wraps
+import gzip
+import hashlib
 import logging
 import os
+import re
+import time
 from pathlib import Path
 import mimetypes
 from django.views.decorators.cache import cache_page
 from django.conf import settings
 from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+from .cache_stats import record_hit, record_miss, record_fill
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
 
 logger = logging.getLogger(__name__)
 
@@ -75,18 +86,215 @@ def get_file_details(path):
         logger.error(f"Error getting file details for {path}: {e}")
         return None 
 
-def togglable_cache(timeout=None, *, key_prefix=None, cache=None, description=None):
+# Every cached view entry depends on these tags in addition to its own
+ALL_VIEWS_TAG = 'views'
+
+
+def _tag_key(tag):
+    return f"cache_tag:{tag}"
+
+
+def _new_generation():
+    return time.time_ns()
+
+
+def get_tag_generations(tags, cache_instance=None):
+    """
+    Get the current generation of each dependency tag.
+
+    Tags that have never been seen get a fresh generation. Generations are
+    timestamps rather than counters, so a tag key that gets culled from the
+    cache can never come back with a value an old entry was stored under.
+
+    Returns:
+        dict: Mapping of tag to its current generation
+    """
+    cache_instance = cache_instance or cache
+    keys = {_tag_key(tag): tag for tag in tags}
+    found = cache_instance.get_many(list(keys))
+
+    generations = {}
+    for key, tag in keys.items():
+        if key in found:
+            generations[tag] = found[key]
+        else:
+            generation = _new_generation()
+            cache_instance.add(key, generation, None)
+            generations[tag] = cache_instance.get(key, generation)
+    return generations
+
+
+def invalidate_cache_tags(*tags, cache_instance=None):
+    """
+    Invalidate every cached view entry that depends on any of the given tags.
+
+    Usage:
+        invalidate_cache_tags('page:mitra', 'popup')
+    """
+    tags = [tag for tag in tags if tag]
+    if not tags:
+        return
+    cache_instance = cache_instance or cache
+    generation = _new_generation()
+    cache_instance.set_many({_tag_key(tag): generation for tag in tags}, None)
+    logger.info(f"Cache tags invalidated: {', '.join(tags)}")
+
+
+def _resolve_tags(tags, view_name, request, *args, **kwargs):
+    """Build the full tag list for one request of a cached view"""
+    if callable(tags):
+        tags = tags(request, *args, **kwargs)
+    resolved = [ALL_VIEWS_TAG, f"view:{view_name}"]
+    for tag in tags or []:
+        if tag and tag not in resolved:
+            resolved.append(tag)
+    return resolved
+
+
+def _entry_is_current(entry, cache_instance):
+    """Check that none of the tags an entry was stored with has been bumped"""
+    stored = entry.get('tags', {})
+    if not stored:
+        return True
+    return get_tag_generations(stored.keys(), cache_instance) == stored
+
+
+def _acquire_lock(cache_instance, lock_key, lock_timeout):
+    """Take a cache-backed lock; cache.add only succeeds for one caller"""
+    return cache_instance.add(lock_key, 1, lock_timeout)
+
+
+def _wait_for_entry(cache_instance, cache_key, wait_timeout, poll_interval=0.05):
+    """
+    Poll the cache while another worker regenerates an entry.
+
+    Returns:
+        dict or None: The fresh entry, or None if it did not show up in time
+    """
+    deadline = time.monotonic() + wait_timeout
+    while time.monotonic() < deadline:
+        time.sleep(poll_interval)
+        entry = cache_instance.get(cache_key)
+        if (entry is not None and entry.get('expires_at', 0) > time.time()
+                and _entry_is_current(entry, cache_instance)):
+            return entry
+    return None
+
+
+# Headers that are recomputed for each cached hit instead of being stored
+_UNCACHED_HEADERS = {'content-length', 'content-encoding', 'etag', 'set-cookie'}
+# Bodies smaller than this are not worth compressing (same as GZipMiddleware)
+_MIN_COMPRESS_LENGTH = 200
+_ACCEPTS_GZIP = re.compile(r"\bgzip\b")
+_ACCEPTS_BR = re.compile(r"\bbr\b")
+
+
+def build_cache_record(response):
+    """
+    Turn a rendered response into a compact cache record.
+
+    The body is stored raw and pre-compressed with gzip (and brotli when
+    installed), so cache hits never spend CPU on compression.
+
+    Returns:
+        dict or None: The record, or None if the response cannot be cached
+    """
+    if getattr(response, 'streaming', False) or response.has_header('Content-Encoding'):
+        return None
+
+    body = response.content
+    record = {
+        'status': response.status_code,
+        'headers': [
+            (name, value) for name, value in response.items()
+            if name.lower() not in _UNCACHED_HEADERS
+        ],
+        'body': body,
+        'gzip': None,
+        'br': None,
+        'etag': f'W/"{hashlib.md5(body).hexdigest()}"',
+    }
+
+    if len(body) >= _MIN_COMPRESS_LENGTH:
+        gzipped = gzip.compress(body, compresslevel=6)
+        if len(gzipped) < len(body):
+            record['gzip'] = gzipped
+        if brotli is not None:
+            compressed = brotli.compress(body)
+            if len(compressed) < len(body):
+                record['br'] = compressed
+
+    return record
+
+
+def _etag_matches(request, etag):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH', '')
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    # Weak comparison: ignore the W/ prefix on both sides
+    opaque = etag.removeprefix('W/')
+    return any(
+        candidate.strip().removeprefix('W/') == opaque
+        for candidate in if_none_match.split(',')
+    )
+
+
+def response_from_cache_record(request, record):
+    """
+    Build the response for a cache hit from a stored record.
+
+    Returns 304 Not Modified when If-None-Match matches the record ETag,
+    otherwise the body in the best encoding the client accepts.
+    """
+    if _etag_matches(request, record['etag']):
+        response = HttpResponseNotModified()
+        response['ETag'] = record['etag']
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+    accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    encoding = None
+    body = record['body']
+    if record['br'] is not None and _ACCEPTS_BR.search(accept_encoding):
+        encoding, body = 'br', record['br']
+    elif record['gzip'] is not None and _ACCEPTS_GZIP.search(accept_encoding):
+        encoding, body = 'gzip', record['gzip']
+
+    response = HttpResponse(body, status=record['status'])
+    for name, value in record['headers']:
+        response[name] = value
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Content-Length'] = str(len(body))
+    response['ETag'] = record['etag']
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+def togglable_cache(timeout=None, *, key_prefix=None, cache=None, description=None, tags=None, swr=False):
     """
     A decorator that implements Django's cache_page with the ability to toggle it on/off.
     
+    Responses are stored as compact records (see build_cache_record) rather
+    than pickled HttpResponse objects. Hits pick a pre-compressed body from
+    Accept-Encoding and answer If-None-Match with 304 Not Modified.
+    
     Args:
         timeout: Cache timeout in seconds. If None, uses settings.CACHE_TIMEOUT.
         key_prefix: A prefix for the cache key to help distinguish cache entries.
         cache: The cache backend to use. If None, uses the default cache.
         description: Human-readable description of what this view displays (for admin UI)
+        tags: Dependency tags for the cached entries, e.g. ['page:mitra', 'popup'].
+            May also be a callable taking the view arguments and returning tags.
+        swr: Stale-while-revalidate mode. Expired entries are kept for another
+            CACHE_STALE_TIMEOUT seconds and served while a single worker, holding
+            a cache-backed lock, regenerates them. Concurrent misses wait for that
+            worker's result instead of rendering the view in parallel.
     
     Usage:
-        @togglable_cache(60*60, description="Homepage")
+        @togglable_cache(60*60, description="Homepage", tags=['homepage', 'articles'], swr=True)
         def my_view(request):
             # View logic here
             return render(request, 'template.html', context)
@@ -94,9 +302,9 @@ def togglable_cache(timeout=None, *, key_prefix=None, cache=None, description=No
     To disable caching for all views:
         1. Set CACHE_ENABLED=False in settings or .env
     
-    To clear the cache for a specific view:
-        from django.core.cache import cache
-        cache.delete_pattern(f"views.decorators.cache.cache_page.{key_prefix}.*")
+    To clear the cache for a specific view or for a piece of content:
+        clear_view_cache(view_name='my_view')
+        invalidate_cache_tags('page:mitra')
     """
     if timeout is None:
         timeout = getattr(settings, 'CACHE_TIMEOUT', 3600 * 24 * 2)  # Default to 2 days
@@ -104,6 +312,10 @@ def togglable_cache(timeout=None, *, key_prefix=None, cache=None, description=No
     # Ensure timeout is an integer
     timeout = int(timeout)
     
+    stale_timeout = int(getattr(settings, 'CACHE_STALE_TIMEOUT', 300)) if swr else 0
+    lock_timeout = int(getattr(settings, 'CACHE_LOCK_TIMEOUT', 30))
+    lock_wait = float(getattr(settings, 'CACHE_LOCK_WAIT', 5))
+    
     def decorator(view_func):
         view_name = view_func.__name__
         
@@ -112,7 +324,9 @@ def togglable_cache(timeout=None, *, key_prefix=None, cache=None, description=No
             'name': view_name,
             'description': description or view_name.replace('_', ' ').title(),
             'timeout': timeout,
-            'key_prefix': key_prefix
+            'key_prefix': key_prefix,
+            'tags': tags if not callable(tags) else [],
+            'swr': swr,
         }
         
         @wraps(view_func)
@@ -128,44 +342,107 @@ def togglable_cache(timeout=None, *, key_prefix=None, cache=None, description=No
                         # Allow staff/superusers to override cache setting via URL param
                         cache_enabled = cache_override.lower() in ('true', '1', 'yes')
                 
-                if cache_enabled:
-                    # Get the cache instance to use
-                    cache_instance = cache or globals().get('cache')
-                    
-                    # Create a unique cache key based on view name, path, and query parameters
-                    # This ensures different URLs with different parameters get different cache entries
-                    request_path = request.get_full_path()
-                    view_key = key_prefix or f"view:{view_name}"
-                    cache_key = f"{view_key}:{request_path}"
+                if not cache_enabled:
+                    # Skip caching
+                    return view_func(request, *args, **kwargs)
+                
+                # Get the cache instance to use
+                cache_instance = cache or globals().get('cache')
+                
+                # Create a unique cache key based on view name, path, and query parameters
+                # This ensures different URLs with different parameters get different cache entries
+                request_path = request.get_full_path()
+                view_key = key_prefix or f"view:{view_name}"
+                cache_key = f"{view_key}:{request_path}"
+                lock_key = f"lock:{cache_key}"
+                
+                def render_and_store(release_lock=False):
+                    # Read tag generations before rendering, so an edit made
+                    # while the view runs leaves this entry already stale
+                    generations = get_tag_generations(
+                        _resolve_tags(tags, view_name, request, *args, **kwargs),
+                        cache_instance
+                    )
+                    started = time.monotonic()
+                    response = view_func(request, *args, **kwargs)
                     
-                    # Try to get the cached response
-                    cached_response = cache_instance.get(cache_key)
+                    def store_response(rendered_response):
+                        try:
+                            record = build_cache_record(rendered_response)
+                            if record is not None:
+                                record.update({
+                                    'tags': generations,
+                                    'expires_at': time.time() + timeout,
+                                })
+                                cache_instance.set(cache_key, record, timeout + stale_timeout)
+                                rendered_response['ETag'] = record['etag']
+                                record_fill(view_name, cache_key, time.monotonic() - started,
+                                            len(record['body']), record['expires_at'] + stale_timeout)
+                        finally:
+                            if release_lock:
+                                cache_instance.delete(lock_key)
+                        return rendered_response
                     
-                    if cached_response is None:
-                        # Cache miss - generate and cache the response
-                        logger.info(f"Cache MISS for view '{view_name}' - generating new response")
-                        response = view_func(request, *args, **kwargs)
-                        
-                        # If the response is a TemplateResponse, it hasn't been rendered yet
-                        if hasattr(response, 'render') and callable(response.render):
-                            # Add a callback to cache after rendering
-                            def cache_response(rendered_response):
-                                cache_instance.set(cache_key, rendered_response, timeout)
-                                return rendered_response
-                            
-                            response.add_post_render_callback(cache_response)
-                        else:
-                            # For pre-rendered responses, cache immediately
-                            cache_instance.set(cache_key, response, timeout)
-                        
-                        return response
+                    # If the response is a TemplateResponse, it hasn't been rendered yet
+                    if hasattr(response, 'render') and callable(response.render):
+                        # Add a callback to cache after rendering
+                        response.add_post_render_callback(store_response)
                     else:
-                        # Cache hit
-                        logger.info(f"Cache HIT for view '{view_name}'")
-                        return cached_response
-                else:
-                    # Skip caching
-                    return view_func(request, *args, **kwargs)
+                        # For pre-rendered responses, cache immediately
+                        store_response(response)
+                    
+                    return response
+                
+                # Try to get the cached entry and check its tags are still current.
+                # An entry whose tags moved on is never served, not even as stale.
+                entry = cache_instance.get(cache_key)
+                entry_found = entry is not None
+                invalidated = entry is not None and not _entry_is_current(entry, cache_instance)
+                if invalidated:
+                    entry = None
+                    record_miss(view_name, cache_key, entry_found=True, invalidated=True)
+                
+                if entry is not None and entry.get('expires_at', 0) > time.time():
+                    # Cache hit
+                    logger.info(f"Cache HIT for view '{view_name}'")
+                    record_hit(view_name, cache_key)
+                    return response_from_cache_record(request, entry)
+                
+                if not swr:
+                    # Cache miss - generate and cache the response
+                    logger.info(f"Cache MISS for view '{view_name}' - generating new response")
+                    if not invalidated:
+                        record_miss(view_name, cache_key, entry_found=entry_found)
+                    return render_and_store()
+                
+                if _acquire_lock(cache_instance, lock_key, lock_timeout):
+                    # This worker won the lock and regenerates the entry
+                    logger.info(f"Cache {'REVALIDATE' if entry else 'MISS'} for view '{view_name}' - generating new response")
+                    if not invalidated:
+                        record_miss(view_name, cache_key, entry_found=entry_found)
+                    try:
+                        return render_and_store(release_lock=True)
+                    except Exception:
+                        cache_instance.delete(lock_key)
+                        raise
+                
+                if entry is not None:
+                    # Another worker is regenerating; serve the stale copy meanwhile
+                    logger.info(f"Cache STALE for view '{view_name}' - serving while revalidating")
+                    record_hit(view_name, cache_key, stale=True)
+                    return response_from_cache_record(request, entry)
+                
+                # Nothing to serve yet; wait for the winner's result
+                entry = _wait_for_entry(cache_instance, cache_key, lock_wait)
+                if entry is not None:
+                    logger.info(f"Cache HIT for view '{view_name}' after waiting on regeneration")
+                    record_hit(view_name, cache_key)
+                    return response_from_cache_record(request, entry)
+                
+                logger.warning(f"Cache lock wait timed out for view '{view_name}' - rendering directly")
+                if not invalidated:
+                    record_miss(view_name, cache_key, entry_found=entry_found)
+                return view_func(request, *args, **kwargs)
             except Exception as e:
                 # Log the error and fall back to uncached view
                 logger.error(f"Cache error in {view_func.__name__}: {str(e)}")
@@ -179,6 +456,10 @@ def clear_view_cache(view_name=None, key_prefix=None):
     """
     Utility function to clear the cache for a specific view or all views.
     
+    Entries are not deleted one by one. Instead the view's tag (or the tag
+    shared by every cached view) is bumped, which works the same on every
+    cache backend and leaves unrelated cache entries untouched.
+    
     Args:
         view_name: The name of the view to clear. If None, clears all views with the given key_prefix.
         key_prefix: The key prefix used by the cache. If None, uses the default.
@@ -187,60 +468,19 @@ def clear_view_cache(view_name=None, key_prefix=None):
         bool: True if cache was successfully cleared, False otherwise.
     """
     try:
-        # For our new cache key format
-        if view_name and not key_prefix:
-            key_prefix = f"view:{view_name}"
-        elif not key_prefix:
-            key_prefix = "view"
-        
-        # Check registry for custom key_prefix
-        if view_name and view_name in CACHED_VIEWS_REGISTRY and CACHED_VIEWS_REGISTRY[view_name].get('key_prefix'):
-            key_prefix = CACHED_VIEWS_REGISTRY[view_name]['key_prefix']
-        
-        # Create pattern for cache clearing
-        pattern = f"{key_prefix}:*" if key_prefix else "*"
-        
-        # Django's default cache doesn't have delete_pattern method
-        # so we'll need to handle this differently based on the cache backend
-        if hasattr(cache, 'delete_pattern'):
-            # Redis and some other backends have delete_pattern
-            cache.delete_pattern(pattern)
-            logger.info(f"Cache cleared with pattern: {pattern}")
+        if view_name:
+            invalidate_cache_tags(f"view:{view_name}")
+        elif key_prefix:
+            # Clear every registered view that shares this key prefix
+            invalidate_cache_tags(*[
+                f"view:{name}" for name, info in CACHED_VIEWS_REGISTRY.items()
+                if info.get('key_prefix') == key_prefix
+            ])
         else:
-            # For FileBasedCache, we need to clear specific keys or the entire cache
-            if settings.CACHES['default']['BACKEND'].endswith('FileBasedCache'):
-                if view_name:
-                    # Try to clear the cache directory for a specific view
-                    cache_dir = settings.CACHES['default'].get('LOCATION')
-                    if cache_dir and os.path.exists(cache_dir):
-                        import glob
-                        import pathlib
-                        
-                        # Search for cache files with the pattern
-                        pattern_for_files = f"*{key_prefix.replace(':', '_')}*"
-                        matching_files = glob.glob(str(pathlib.Path(cache_dir) / pattern_for_files))
-                        
-                        # Delete all matching cache files
-                        for cache_file in matching_files:
-                            try:
-                                os.remove(cache_file)
-                                logger.info(f"Removed cache file: {cache_file}")
-                            except (OSError, PermissionError) as e:
-                                logger.warning(f"Could not remove cache file {cache_file}: {e}")
-                        
-                        logger.info(f"Cleared {len(matching_files)} cache files for pattern: {pattern_for_files}")
-                    else:
-                        logger.warning("Could not locate cache directory for FileBasedCache")
-                else:
-                    # Clear the entire cache
-                    cache.clear()
-                    logger.info("Cleared entire cache")
-            else:
-                # For other cache backends without delete_pattern, clear the entire cache
-                cache.clear()
-                logger.info("Cleared entire cache (cache backend doesn't support pattern deletion)")
-            
+            invalidate_cache_tags(ALL_VIEWS_TAG)
+        
+        logger.info(f"Cache cleared for {view_name or key_prefix or 'all views'}")
         return True
     except Exception as e:
         logger.error(f"Failed to clear cache: {str(e)}")
-        return False 
\ No newline at end of file
+        return False
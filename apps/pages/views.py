@@ -2,8 +2,8 @@ from django.shortcuts import render, get_object_or_404
 from django.http import Http404
 from django.core.cache import cache
 from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
-from django.db.models import Q, Count
-from .models import Page, Article, ArticleCategory, ContentBlock
+from django.db.models import Count
+from .models import Page, Article, ArticleCategory, ContentBlock, visible_from
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
 from django.shortcuts import redirect
@@ -27,28 +27,39 @@ from apps.media.models import MediaFile
 from django.urls import reverse
 import logging
 from django.db import transaction
+from django.db.models.signals import post_save
 from .models import ProdiAdmin, ProgramStudi
 import requests
 from django.conf import settings
 from django.contrib.auth import logout
 from django.views.decorators.cache import cache_page
-from datetime import timedelta
 from .models import ArticleReviewHistory
-import mimetypes
 from datetime import datetime
 from django.conf import settings
-from django.http import HttpResponse, FileResponse
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header, urlencode
+from .file_delivery import deliver_file
+from .zip_stream import directory_entries, iter_zip, iter_zip_members, snapshot_members
+from .backup_engine import BackupError, load_snapshot, repository_root
+from .publishing import schedule_publication
+from .file_listing import PAGE_SIZE as LISTING_PAGE_SIZE, SORT_FIELDS, describe, directory_size_pending, directory_sizes, request_directory_sizes, scan_directory, sort_and_filter
+from .static_assets import IMMUTABLE_CACHE_CONTROL, is_hashed_static
 from django.views.decorators.http import require_safe
 from django.template.response import TemplateResponse
 from django.contrib import messages
 from django.shortcuts import redirect, get_object_or_404
 from django.utils import timezone
 from django.core.exceptions import PermissionDenied
-from .utils import superuser_required, safe_join_paths, get_file_details
-from .models import DownloadToken
+from .utils import superuser_required, safe_join_paths
+from .snapshots import get_page_snapshot, get_popup_context, invalidate_popup_context
+from .models import DownloadToken, BackgroundJob
 from .backup_utils import create_project_backup, get_project_size_estimation, check_available_space, DEFAULT_EXCLUDES
-import threading
+from .backup_jobs import BACKUP_JOB_TYPE, job_status, queue_project_backup
 from apps.pages.utils import togglable_cache, clear_view_cache, CACHED_VIEWS_REGISTRY
+from apps.pages.cache_stats import get_view_stats, get_top_keys, reset_cache_stats
+from apps.pages.cache_warming import spawn_warm_cache
+from apps.pages.search import search_articles, attach_search_snippets
+from apps.pages.related import get_related_articles, get_articles_related_to
 
 
 # Get logger for this file
@@ -266,9 +277,8 @@ def profile_view_lppm(request):
     )
     
     # Get latest 3 published articles from LPPM category
-    lppm_articles = Article.objects.filter(
-        category=lppm_category, 
-        status='published'
+    lppm_articles = Article.objects.visible().filter(
+        category=lppm_category
     ).order_by('-published_at')[:3]
     
     context = {
@@ -285,9 +295,8 @@ def profile_view_mbkm(request):
     )
     
     # Get latest 3 published articles from MBKM category
-    mbkm_articles = Article.objects.filter(
-        category=mbkm_category, 
-        status='published'
+    mbkm_articles = Article.objects.visible().filter(
+        category=mbkm_category
     ).order_by('-published_at')[:3]
     
     context = {
@@ -304,9 +313,8 @@ def profile_view_mku(request):
     )
     
     # Get latest 3 published articles from MKU category
-    mku_articles = Article.objects.filter(
-        category=mku_category, 
-        status='published'
+    mku_articles = Article.objects.visible().filter(
+        category=mku_category
     ).order_by('-published_at')[:3]
     
     context = {
@@ -315,7 +323,7 @@ def profile_view_mku(request):
     }
     return render(request, 'pages/profile_view_mku.html', context)
 
-@togglable_cache()
+@togglable_cache(tags=['homepage', 'articles', 'popup'], swr=True)
 def home_view(request):
     try:
         page = Page.objects.get(is_homepage=True, status=Page.PUBLISHED)
@@ -345,17 +353,14 @@ def home_view(request):
     #         }
     #     cache.set(cache_key, blocks, timeout=300)  # Cache for 5 minutes
     
-    blocks = {}
-    for block in page.content_blocks.all().order_by('order'):
-        blocks[block.identifier] = block.content
+    snapshot = get_page_snapshot(page)
+    blocks = dict(snapshot['blocks'])
 
     # tambahakn 4 berita terbaru
-    today = timezone.now().date()
-    current_year = today.year
-    berita_terbaru = Article.objects.filter(
-        status='published', 
-        published_at__date__lte=today,
-        published_at__year=current_year
+    now = timezone.now()
+    start_of_year = timezone.localtime(now).replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+    berita_terbaru = Article.objects.visible(now).filter(
+        published_at__gte=start_of_year
     ).order_by('-published_at')[:6]
     blocks['berita_terbaru'] = berita_terbaru
     
@@ -373,40 +378,18 @@ def home_view(request):
     
     return render(request, f'pages/{page.template}', context)
 
-def get_popup_context():
-    """Helper function to get popup blocks if the popup is active"""
-    context = {}
-    try:
-        popup_page = Page.objects.get(slug='popup', status=Page.PUBLISHED)
-        if popup_page.metadata.get('is_active', False):
-            context['blocks_popup'] = {
-                i.identifier: i.content 
-                for i in popup_page.content_blocks.all().order_by('order')
-            }
-            context['popup_active'] = True
-    except Page.DoesNotExist:
-        pass
-    return context
-
 def page_view(request, slug):
     page = get_object_or_404(Page, slug=slug, status=Page.PUBLISHED)
     
     try:
-        # Get content blocks with error handling
-        blocks = {}
-        for block in page.content_blocks.all().order_by('order'):
-            try:
-                blocks[block.identifier] = block.content
-            except Exception as e:
-                # Log error but continue processing other blocks
-                print(f"Error processing block {block.identifier}: {str(e)}")
-                continue
+        # Get content blocks from the page snapshot
+        snapshot = get_page_snapshot(page)
         
         context = {
             'page': page,
             'meta': page.metadata,
-            'blocks': blocks,
-            'blocks_json': json.dumps(blocks)  # Safe JSON serialization for JavaScript
+            'blocks': snapshot['blocks'],
+            'blocks_json': snapshot['blocks_json']  # Safe JSON serialization for JavaScript
         }
         
         # Add popup context
@@ -702,7 +685,7 @@ def create_default_mitra_page():
     create_standardized_blocks(mitra_page, default_blocks)
     return mitra_page
 
-@togglable_cache()
+@togglable_cache(tags=['page:mitra', 'popup'])
 def mitra_view(request):
     """View for mitra page"""
     try:
@@ -714,18 +697,19 @@ def mitra_view(request):
         mitra_page = create_default_mitra_page()
     
     # Get content blocks
-    blocks = {}
-    for block in mitra_page.content_blocks.all().order_by('order'):
-        blocks[block.identifier] = block.content
+    snapshot = get_page_snapshot(mitra_page)
+    blocks = snapshot['blocks']
     
     context = {
         'page': mitra_page,
         'meta': mitra_page.metadata,
         'blocks': blocks,
-        'blocks_json': json.dumps(blocks),
-        'blocks_popup': { i.identifier: i.content for i in Page.objects.get(slug='popup', status=Page.PUBLISHED).content_blocks.all().order_by('order')  }  # Simplified - just send all blocks
+        'blocks_json': snapshot['blocks_json'],
     }
     
+    # Add popup context
+    context.update(get_popup_context())
+    
     return render(request, 'pages/mitra.html', context)
 
 @staff_member_required
@@ -735,6 +719,8 @@ def cache_management_view(request):
     1. Enable/disable caching globally
     2. Clear specific view caches or all caches
     3. See current cache status
+    4. See per-view hit/miss/fill stats and the largest and hottest keys
+       (?format=json exports the same data)
     """
     try:
         # Handle form submissions
@@ -764,10 +750,23 @@ def cache_management_view(request):
                     messages.success(request, f"Cache cleared for {'all views' if not view_name or view_name == 'all' else view_name}")
                 else:
                     messages.error(request, "Failed to clear cache")
+            
+            elif action == 'reset_stats':
+                reset_cache_stats(list(CACHED_VIEWS_REGISTRY))
+                messages.success(request, "Cache statistics reset")
         
         # Get current cache status
         print('Debug: CACHE_ENABLED from settings:', getattr(settings, 'CACHE_ENABLED', False))
         
+        view_names = list(CACHED_VIEWS_REGISTRY)
+        try:
+            view_stats = get_view_stats(view_names)
+            top_keys = get_top_keys(view_names)
+        except Exception as e:
+            logger.error(f"Could not read cache stats: {str(e)}")
+            view_stats = {}
+            top_keys = {'by_size': [], 'by_hits': []}
+        
         cache_status = {
             'global_enabled': getattr(settings, 'CACHE_ENABLED', False) ,
             'timeout': getattr(settings, 'CACHE_TIMEOUT', 3600 * 24 * 2),
@@ -776,10 +775,13 @@ def cache_management_view(request):
                 {
                     'name': name,
                     'description': info['description'],
-                    'timeout': info['timeout']
+                    'timeout': info['timeout'],
+                    'stats': view_stats.get(name),
                 } 
                 for name, info in CACHED_VIEWS_REGISTRY.items()
-            ]
+            ],
+            'top_keys_by_size': top_keys['by_size'],
+            'top_keys_by_hits': top_keys['by_hits'],
         }
         
         # Get popup status
@@ -798,6 +800,17 @@ def cache_management_view(request):
             except:
                 cache_status['stats'] = None
         
+        if request.GET.get('format') == 'json':
+            return JsonResponse({
+                'global_enabled': cache_status['global_enabled'],
+                'timeout': cache_status['timeout'],
+                'backend': cache_status['backend'],
+                'backend_stats': cache_status.get('stats'),
+                'views': view_stats,
+                'top_keys_by_size': cache_status['top_keys_by_size'],
+                'top_keys_by_hits': cache_status['top_keys_by_hits'],
+            })
+        
         return render(request, 'admin/cache_management.html', {
             'cache_status': cache_status,
             'title': 'Cache Management',
@@ -810,31 +823,25 @@ def cache_management_view(request):
 
 
 
-@togglable_cache()
+@togglable_cache(tags=['articles', 'categories', 'popup'], swr=True)
 def news_view(request):
     # Get query parameters with defaults
     category_slug = request.GET.get('category', '')
     search_query = request.GET.get('search', '').strip()
     page_number = request.GET.get('page', 1)
     
-    # Get current date
-    today = timezone.now().date()
+    # Scheduled articles appear once their publication time has come
+    now = timezone.now()
     
     # Base queryset with select_related for performance
-    articles = Article.objects.select_related('category', 'created_by').filter(
-        status='published',
-        published_at__date__lte=today  # Only show articles with publication date today or earlier
-    )
+    articles = Article.objects.select_related('category', 'created_by').visible(now)
     
     # Apply filters
     if category_slug:
         articles = articles.filter(category__slug=category_slug)
     if search_query:
-        articles = articles.filter(
-            Q(title__icontains=search_query) |
-            Q(excerpt__icontains=search_query) |
-            Q(content__icontains=search_query)
-        )
+        # Full-text index, ranked best match first
+        articles = search_articles(articles, search_query)
     
     # Featured article - only show if no search/filter is active
     featured_article = None
@@ -855,9 +862,13 @@ def news_view(request):
     except EmptyPage:
         page_obj = paginator.page(paginator.num_pages)
     
+    if search_query:
+        # Highlighted matches for the articles on this page only
+        page_obj.object_list = attach_search_snippets(page_obj.object_list, search_query)
+    
     # Get all categories with article counts
     categories = ArticleCategory.objects.annotate(
-        article_count=Count('articles', filter=Q(articles__status='published', articles__published_at__date__lte=today))
+        article_count=Count('articles', filter=visible_from(now, prefix='articles__'))
     )
     
     context = {
@@ -876,16 +887,12 @@ def news_view(request):
 
 def article_detail_view(request, slug):
     article = get_object_or_404(
-        Article.objects.select_related('category', 'created_by'),
-        slug=slug,
-        status='published'
+        Article.objects.select_related('category', 'created_by').visible(),
+        slug=slug
     )
     
-    # Get related articles
-    related_articles = Article.objects.select_related('category').filter(
-        category=article.category,
-        status='published'
-    ).exclude(id=article.id)[:3]
+    # Get related articles (precomputed, see apps/pages/related.py)
+    related_articles = get_articles_related_to(article)
 
     # print(article.content)
     
@@ -1126,6 +1133,8 @@ def article_save_view(request):
                 Article.objects.filter(id=article.id).update(published_at=scheduled_date)
                 # Refresh to get updated values
                 article.refresh_from_db()
+                # update() skips post_save, so queue the publication here
+                schedule_publication(article)
                 
                 if article.status == 'published':
                     messages.success(request, f'Article "{article.title}" has been scheduled for publication on {scheduled_date.strftime("%B %d, %Y at %H:%M")}.')
@@ -1564,7 +1573,7 @@ def create_default_profile_page_manajemen():
     create_standardized_blocks(profile_page, default_blocks)
     return profile_page
 
-@togglable_cache()
+@togglable_cache(tags=['page:prodi-manajemen', 'articles', 'popup'])
 def profile_view_manajemen(request):
     """View for profile page"""
     try:
@@ -1576,9 +1585,8 @@ def profile_view_manajemen(request):
         profile_page = create_default_profile_page_manajemen()
     
     # Get content blocks
-    blocks = {}
-    for block in profile_page.content_blocks.all().order_by('order'):
-        blocks[block.identifier] = block.content
+    snapshot = get_page_snapshot(profile_page)
+    blocks = snapshot['blocks']
 
     # Get related articles
     related_articles = get_related_articles('manajemen')
@@ -1588,7 +1596,7 @@ def profile_view_manajemen(request):
         'page': profile_page,
         'meta': profile_page.metadata,
         'blocks': blocks,
-        'blocks_json': json.dumps(blocks),
+        'blocks_json': snapshot['blocks_json'],
         'related_articles': related_articles,
         'prodi_category': 'manajemen'
     }
@@ -1812,7 +1820,7 @@ def create_default_profile_page_manajemens2():
     create_standardized_blocks(profile_page, default_blocks)
     return profile_page
 
-@togglable_cache()
+@togglable_cache(tags=['page:prodi-manajemens2', 'articles', 'popup'])
 def profile_view_manajemens2(request):
     """View for profile page"""
     try:
@@ -1824,9 +1832,8 @@ def profile_view_manajemens2(request):
         profile_page = create_default_profile_page_manajemens2()
     
     # Get content blocks
-    blocks = {}
-    for block in profile_page.content_blocks.all().order_by('order'):
-        blocks[block.identifier] = block.content
+    snapshot = get_page_snapshot(profile_page)
+    blocks = snapshot['blocks']
 
     # Get related articles
     related_articles = get_related_articles('manajemens')
@@ -1836,7 +1843,7 @@ def profile_view_manajemens2(request):
         'page': profile_page,
         'meta': profile_page.metadata,
         'blocks': blocks,
-        'blocks_json': json.dumps(blocks),
+        'blocks_json': snapshot['blocks_json'],
         'related_articles': related_articles,
         'prodi_category': 'manajemens2'
     }
@@ -1980,7 +1987,7 @@ def create_default_profile_page_akuntansi():
     create_standardized_blocks(profile_page, default_blocks)
     return profile_page
 
-@togglable_cache()
+@togglable_cache(tags=['page:prodi-akuntansi', 'articles', 'popup'])
 def profile_view_akuntansi(request):
     """View for profile page"""
     try:
@@ -1992,9 +1999,8 @@ def profile_view_akuntansi(request):
         profile_page = create_default_profile_page_akuntansi()
     
     # Get content blocks
-    blocks = {}
-    for block in profile_page.content_blocks.all().order_by('order'):
-        blocks[block.identifier] = block.content
+    snapshot = get_page_snapshot(profile_page)
+    blocks = snapshot['blocks']
 
     # Get related articles
     related_articles = get_related_articles('akuntansi')
@@ -2003,17 +2009,13 @@ def profile_view_akuntansi(request):
         'page': profile_page,
         'meta': profile_page.metadata,
         'blocks': blocks,
-        'blocks_popup': {
-            i.identifier: i.content 
-            for i in Page.objects.get(
-                slug='popup', 
-                status=Page.PUBLISHED
-            ).content_blocks.all().order_by('order')
-        },
         'related_articles': related_articles,
         'prodi_category': 'akuntansi'
     }
     
+    # Add popup context
+    context.update(get_popup_context())
+    
     return render(request, 'pages/prodi.html', context)
 
 # Hospitality & Pariwisata
@@ -2146,7 +2148,7 @@ def create_default_profile_page_hospitality():
     create_standardized_blocks(profile_page, default_blocks)
     return profile_page
 
-@togglable_cache()
+@togglable_cache(tags=['page:prodi-hospar', 'articles', 'popup'])
 def profile_view_hospitality(request):
     """View for Hospitality & Tourism profile page"""
     try:
@@ -2158,9 +2160,8 @@ def profile_view_hospitality(request):
         profile_page = create_default_profile_page_hospitality()
     
     # Get content blocks
-    blocks = {}
-    for block in profile_page.content_blocks.all().order_by('order'):
-        blocks[block.identifier] = block.content
+    snapshot = get_page_snapshot(profile_page)
+    blocks = snapshot['blocks']
 
     # Get related articles
     related_articles = get_related_articles('hospar')
@@ -2170,7 +2171,7 @@ def profile_view_hospitality(request):
         'page': profile_page,
         'meta': profile_page.metadata,
         'blocks': blocks,
-        'blocks_json': json.dumps(blocks),
+        'blocks_json': snapshot['blocks_json'],
         'related_articles': related_articles,
         'prodi_category': 'hospar'
     }
@@ -2298,7 +2299,7 @@ def create_default_profile_page_fisika_medis():
     create_standardized_blocks(profile_page, default_blocks)
     return profile_page
 
-@togglable_cache()
+@togglable_cache(tags=['page:prodi-fisika-medis', 'articles', 'popup'])
 def profile_view_fisika_medis(request):
     """View for Fisika Medis profile page"""
     try:
@@ -2310,9 +2311,8 @@ def profile_view_fisika_medis(request):
         profile_page = create_default_profile_page_fisika_medis()
     
     # Get content blocks
-    blocks = {}
-    for block in profile_page.content_blocks.all().order_by('order'):
-        blocks[block.identifier] = block.content
+    snapshot = get_page_snapshot(profile_page)
+    blocks = snapshot['blocks']
 
     # Get related articles
     related_articles = get_related_articles('fisika-medis')
@@ -2321,17 +2321,13 @@ def profile_view_fisika_medis(request):
         'page': profile_page,
         'meta': profile_page.metadata,
         'blocks': blocks,
-        'blocks_popup': {
-            i.identifier: i.content 
-            for i in Page.objects.get(
-                slug='popup', 
-                status=Page.PUBLISHED
-            ).content_blocks.all().order_by('order')
-        },
         'related_articles': related_articles,
         'prodi_category': 'fisika-medis'
     }
     
+    # Add popup context
+    context.update(get_popup_context())
+    
     return render(request, 'pages/prodi.html', context)
 
 # Teknik Informatika
@@ -2622,7 +2618,7 @@ def create_default_profile_page_statistika():
     create_standardized_blocks(profile_page, default_blocks)
     return profile_page
 
-@togglable_cache()
+@togglable_cache(tags=['page:prodi-teknik-informatika', 'articles', 'popup'])
 def profile_view_informatika(request):
     """View for Teknik Informatika profile page"""
     try:
@@ -2633,9 +2629,8 @@ def profile_view_informatika(request):
     except Page.DoesNotExist:
         profile_page = create_default_profile_page_teknik_informatika()
     
-    blocks = {}
-    for block in profile_page.content_blocks.all().order_by('order'):
-        blocks[block.identifier] = block.content
+    snapshot = get_page_snapshot(profile_page)
+    blocks = snapshot['blocks']
 
     # Get related articles
     related_articles = get_related_articles('informatika')
@@ -2645,7 +2640,7 @@ def profile_view_informatika(request):
         'page': profile_page,
         'meta': profile_page.metadata,
         'blocks': blocks,
-        'blocks_json': json.dumps(blocks),
+        'blocks_json': snapshot['blocks_json'],
         'related_articles': related_articles,
         'prodi_category': 'informatika'
     }
@@ -2654,7 +2649,7 @@ def profile_view_informatika(request):
     return render(request, 'pages/prodi.html', context)
 
 
-@togglable_cache()
+@togglable_cache(tags=['page:prodi-statistika', 'articles', 'popup'])
 def profile_view_statistika(request):
     """View for Statistika profile page"""
     try:
@@ -2666,9 +2661,8 @@ def profile_view_statistika(request):
         profile_page = create_default_profile_page_statistika()
     
     # Get content blocks
-    blocks = {}
-    for block in profile_page.content_blocks.all().order_by('order'):
-        blocks[block.identifier] = block.content
+    snapshot = get_page_snapshot(profile_page)
+    blocks = snapshot['blocks']
 
     # Get related articles
     related_articles = get_related_articles('statistika')
@@ -2677,17 +2671,13 @@ def profile_view_statistika(request):
         'page': profile_page,
         'meta': profile_page.metadata,
         'blocks': blocks,
-        'blocks_popup': {
-            i.identifier: i.content 
-            for i in Page.objects.get(
-                slug='popup', 
-                status=Page.PUBLISHED
-            ).content_blocks.all().order_by('order')
-        },
         'related_articles': related_articles,
         'prodi_category': 'statistika'
     }
     
+    # Add popup context
+    context.update(get_popup_context())
+    
     return render(request, 'pages/prodi.html', context)
 
 # Prodi FSDH
@@ -2821,7 +2811,7 @@ def create_default_profile_page_dkv():
     create_standardized_blocks(profile_page, default_blocks)
     return profile_page
 
-@togglable_cache()
+@togglable_cache(tags=['page:prodi-dkv', 'articles', 'popup'])
 def profile_view_dkv(request):
     """View for Desain Komunikasi Visual profile page"""
     try:
@@ -2833,9 +2823,8 @@ def profile_view_dkv(request):
         profile_page = create_default_profile_page_dkv()
     
     # Get content blocks
-    blocks = {}
-    for block in profile_page.content_blocks.all().order_by('order'):
-        blocks[block.identifier] = block.content
+    snapshot = get_page_snapshot(profile_page)
+    blocks = snapshot['blocks']
 
     # Get related articles
     related_articles = get_related_articles('dkv')
@@ -2844,17 +2833,13 @@ def profile_view_dkv(request):
         'page': profile_page,
         'meta': profile_page.metadata,
         'blocks': blocks,
-        'blocks_popup': {
-            i.identifier: i.content 
-            for i in Page.objects.get(
-                slug='popup', 
-                status=Page.PUBLISHED
-            ).content_blocks.all().order_by('order')
-        },
         'related_articles': related_articles,
         'prodi_category': 'dkv'
     }
     
+    # Add popup context
+    context.update(get_popup_context())
+    
     return render(request, 'pages/prodi.html', context)
 
 # Arsitektur
@@ -3016,7 +3001,7 @@ def create_default_popup():
     return profile_page
 
 
-@togglable_cache()
+@togglable_cache(tags=['page:prodi-arsitektur', 'articles', 'popup'])
 def profile_view_arsitektur(request):
     """View for Arsitektur profile page"""
     try:
@@ -3028,9 +3013,8 @@ def profile_view_arsitektur(request):
         profile_page = create_default_profile_page_arsitektur()
     
     # Get content blocks
-    blocks = {}
-    for block in profile_page.content_blocks.all().order_by('order'):
-        blocks[block.identifier] = block.content
+    snapshot = get_page_snapshot(profile_page)
+    blocks = snapshot['blocks']
 
     # Get related articles
     related_articles = get_related_articles('arsitektur')
@@ -3040,7 +3024,7 @@ def profile_view_arsitektur(request):
         'page': profile_page,
         'meta': profile_page.metadata,
         'blocks': blocks,
-        'blocks_json': json.dumps(blocks),
+        'blocks_json': snapshot['blocks_json'],
         'related_articles': related_articles,
         'prodi_category': 'arsitektur'
     }
@@ -3152,7 +3136,7 @@ def create_default_profile_page_k3():
     create_standardized_blocks(profile_page, default_blocks)
     return profile_page
 
-@togglable_cache()
+@togglable_cache(tags=['page:prodi-k3', 'articles', 'popup'])
 def profile_view_k3(request):
     """View for Arsitektur profile page"""
     try:
@@ -3164,9 +3148,8 @@ def profile_view_k3(request):
         profile_page = create_default_profile_page_k3()
     
     # Get content blocks
-    blocks = {}
-    for block in profile_page.content_blocks.all().order_by('order'):
-        blocks[block.identifier] = block.content
+    snapshot = get_page_snapshot(profile_page)
+    blocks = snapshot['blocks']
 
     # Get related articles
     related_articles = get_related_articles('k3')
@@ -3176,7 +3159,7 @@ def profile_view_k3(request):
         'page': profile_page,
         'meta': profile_page.metadata,
         'blocks': blocks,
-        'blocks_json': json.dumps(blocks),
+        'blocks_json': snapshot['blocks_json'],
         'related_articles': related_articles,
         'prodi_category': 'k3'
     }
@@ -3184,7 +3167,7 @@ def profile_view_k3(request):
     
     return render(request, 'pages/prodi.html', context)
 
-@togglable_cache()
+@togglable_cache(tags=['page:profil-matana', 'articles', 'popup'])
 def profile_view(request):
     """View for profile page"""
     try:
@@ -3196,32 +3179,24 @@ def profile_view(request):
         profile_page = create_default_profile_page()
     
     # Get content blocks
-    blocks = {}
-    for block in profile_page.content_blocks.all().order_by('order'):
-        blocks[block.identifier] = block.content
+    snapshot = get_page_snapshot(profile_page)
+    blocks = snapshot['blocks']
 
     # Get related articles
     related_articles = get_related_articles('profil-matana')
     
-    # Get popup blocks safely
-    try:
-        popup_page = Page.objects.get(slug='popup', status=Page.PUBLISHED)
-    except Page.DoesNotExist:
-        popup_page = create_default_popup()
-
     context = {
         'page': profile_page,
         'meta': profile_page.metadata,
         'blocks': blocks,
-        'blocks_json': json.dumps(blocks),
-        'blocks_popup': {
-            i.identifier: i.content
-            for i in popup_page.content_blocks.all().order_by('order')
-        },
+        'blocks_json': snapshot['blocks_json'],
         'related_articles': related_articles,
         'prodi_category': 'profil-matana'
     }
     
+    # Add popup context
+    context.update(get_popup_context())
+    
     return render(request, 'pages/profile.html', context)
 
 def ratelimit(key='ip', rate='5/m'):
@@ -3373,12 +3348,7 @@ def article_list_view(request):
     if status:
         articles = articles.filter(status=status)
     if search:
-        articles = articles.filter(
-            Q(title__icontains=search) |
-            Q(excerpt__icontains=search) |
-            Q(content__icontains=search) |
-            Q(meta_keywords__icontains=search)
-        )
+        articles = search_articles(articles, search, fallback_fields=('title', 'excerpt', 'content', 'meta_keywords'))
     
     # Get categories with counts for filter dropdown
     categories = ArticleCategory.objects.annotate(
@@ -3405,6 +3375,9 @@ def article_list_view(request):
     except EmptyPage:
         articles_page = paginator.page(paginator.num_pages)
     
+    if search:
+        articles_page.object_list = attach_search_snippets(articles_page.object_list, search)
+    
     context = {
         'articles': articles_page,
         'categories': categories,
@@ -3420,6 +3393,14 @@ def article_list_view(request):
     
     return render(request, 'admin/article_list.html', context)
 
+def _send_bulk_post_save(articles, fields):
+    """
+    update() sends no post_save; send it for each updated article so cache
+    invalidation, search indexing, related lists and scheduling still run
+    """
+    for article in articles.select_related('category'):
+        post_save.send(sender=Article, instance=article, created=False, update_fields=frozenset(fields))
+
 @staff_member_required
 @require_POST
 def bulk_action_view(request):
@@ -3445,6 +3426,7 @@ def bulk_action_view(request):
                 published_at=timezone.now(),
                 updated_by=request.user
             )
+            _send_bulk_post_save(articles, ['status', 'published_at', 'updated_by'])
             message = f'Successfully published {len(article_ids)} articles'
             
         elif action == 'unpublish':
@@ -3452,6 +3434,7 @@ def bulk_action_view(request):
                 status='draft',
                 updated_by=request.user
             )
+            _send_bulk_post_save(articles, ['status', 'updated_by'])
             message = f'Successfully unpublished {len(article_ids)} articles'
             
         elif action == 'feature':
@@ -3459,6 +3442,7 @@ def bulk_action_view(request):
                 is_featured=True,
                 updated_by=request.user
             )
+            _send_bulk_post_save(articles, ['is_featured', 'updated_by'])
             message = f'Successfully featured {len(article_ids)} articles'
             
         elif action == 'unfeature':
@@ -3466,6 +3450,7 @@ def bulk_action_view(request):
                 is_featured=False,
                 updated_by=request.user
             )
+            _send_bulk_post_save(articles, ['is_featured', 'updated_by'])
             message = f'Successfully unfeatured {len(article_ids)} articles'
             
         else:
@@ -3604,16 +3589,18 @@ def registration_view(request):
         registration_page = create_default_registration_page()
     
     # Get content blocks
-    blocks = {}
-    for block in registration_page.content_blocks.all().order_by('order'):
-        blocks[block.identifier] = block.content
+    snapshot = get_page_snapshot(registration_page)
+    blocks = snapshot['blocks']
     
     context = {
         'page': registration_page,
         'meta': registration_page.metadata,
-        'blocks': blocks, 'blocks_popup': { i.identifier: i.content for i in Page.objects.get(slug='popup', status=Page.PUBLISHED).content_blocks.all().order_by('order')  }  # Simplified - just send all blocks
+        'blocks': blocks,
     }
     
+    # Add popup context
+    context.update(get_popup_context())
+    
     return render(request, 'pages/registration.html', context)
 
 @require_POST
@@ -3792,22 +3779,17 @@ def scholarship_view(request):
         scholarship_page = create_default_scholarship_page()
     
     try:
-        # Get content blocks with error handling
-        blocks = {}
-        beasiswa_page = []
-        for block in scholarship_page.content_blocks.all().order_by('order'):
-            try:
-                blocks[block.identifier] = block.content
-                if 'scholarship_programs' in block.identifier:
-                    beasiswa_page.append(block.content)
-            except Exception as e:
-                print(f"Error processing block {block.identifier}: {str(e)}")
-                continue
+        # Get content blocks from the page snapshot
+        blocks = get_page_snapshot(scholarship_page)['blocks']
+        beasiswa_page = [
+            content for identifier, content in blocks.items()
+            if 'scholarship_programs' in identifier
+        ]
         
         context = {
             'page': scholarship_page,
             'meta': scholarship_page.metadata,
-            'blocks': blocks, 'blocks_popup': { i.identifier: i.content for i in Page.objects.get(slug='popup', status=Page.PUBLISHED).content_blocks.all().order_by('order')  },
+            'blocks': blocks,
             'beasiswa_page': beasiswa_page,
         }
         
@@ -3815,6 +3797,9 @@ def scholarship_view(request):
     except Exception as e:
         print(f"Error rendering scholarship page: {str(e)}")
         raise Http404("Page could not be rendered")
+    # Add popup context
+    context.update(get_popup_context())
+    
     return render(request, 'pages/scholarship.html', context)
 
 @login_required
@@ -4220,7 +4205,7 @@ def create_default_management_page():
     create_standardized_blocks(management_page, default_blocks)
     return management_page
 
-@togglable_cache()
+@togglable_cache(tags=['page:manajemen', 'popup'])
 def management_view(request):
     """View for management page"""
     try:
@@ -4232,24 +4217,19 @@ def management_view(request):
         management_page = create_default_management_page()
     
     # Get content blocks
-    blocks = {}
-    for block in management_page.content_blocks.all().order_by('order'):
-        blocks[block.identifier] = block.content
+    snapshot = get_page_snapshot(management_page)
+    blocks = snapshot['blocks']
     
-    # Get popup blocks safely
-    try:
-        popup_page = Page.objects.get(slug='popup', status=Page.PUBLISHED)
-    except Page.DoesNotExist:
-        popup_page = create_default_popup()
-
     context = {
         'page': management_page,
         'meta': management_page.metadata,
         'blocks': blocks,
-        'blocks_json': json.dumps(blocks),
-        'blocks_popup': { i.identifier: i.content for i in popup_page.content_blocks.all().order_by('order') }
+        'blocks_json': snapshot['blocks_json'],
     }
     
+    # Add popup context
+    context.update(get_popup_context())
+    
     return render(request, 'pages/management.html', context)
 
 def create_default_ukm_page():
@@ -4377,16 +4357,18 @@ def ukm_view(request):
         ukm_page = create_default_ukm_page()
     
     # Get content blocks
-    blocks = {}
-    for block in ukm_page.content_blocks.all().order_by('order'):
-        blocks[block.identifier] = block.content
+    snapshot = get_page_snapshot(ukm_page)
+    blocks = snapshot['blocks']
     
     context = {
         'page': ukm_page,
         'meta': ukm_page.metadata,
-        'blocks': blocks, 'blocks_popup': { i.identifier: i.content for i in Page.objects.get(slug='popup', status=Page.PUBLISHED).content_blocks.all().order_by('order')  }
+        'blocks': blocks,
     }
     
+    # Add popup context
+    context.update(get_popup_context())
+    
     return render(request, 'pages/ukm.html', context)
 
 def create_default_exchange_page():
@@ -4510,16 +4492,18 @@ def exchange_view(request):
         exchange_page = create_default_exchange_page()
     
     # Get content blocks
-    blocks = {}
-    for block in exchange_page.content_blocks.all().order_by('order'):
-        blocks[block.identifier] = block.content
+    snapshot = get_page_snapshot(exchange_page)
+    blocks = snapshot['blocks']
     
     context = {
         'page': exchange_page,
         'meta': exchange_page.metadata,
-        'blocks': blocks, 'blocks_popup': { i.identifier: i.content for i in Page.objects.get(slug='popup', status=Page.PUBLISHED).content_blocks.all().order_by('order')  }
+        'blocks': blocks,
     }
     
+    # Add popup context
+    context.update(get_popup_context())
+    
     return render(request, 'pages/exchange.html', context)
 
 @login_required
@@ -4548,44 +4532,6 @@ def logout_view(request):
     return redirect('home')
 
 
-def get_related_articles(prodi_slug, limit=3):
-    """
-    Helper function to get related articles for a specific program study
-    """
-    try:
-        # Get articles from the last 6 months
-        six_months_ago = timezone.now() - timedelta(days=180)
-        
-        # Base queryset
-        articles = Article.objects.filter(
-            status='published',
-            created_at__gte=six_months_ago
-        )
-        
-        # Get articles with matching category or content/keywords
-        related = articles.filter(
-            Q(category__slug__icontains=prodi_slug) |
-            Q(meta_keywords__icontains=prodi_slug) |
-            Q(title__icontains=prodi_slug) |
-            Q(content__icontains=prodi_slug)
-        ).distinct()
-
-        # If not enough related articles, get latest articles
-        if related.count() < limit:
-            additional_needed = limit - related.count()
-            latest_articles = articles.exclude(
-                id__in=related.values_list('id', flat=True)
-            )[:additional_needed]
-            
-            # Combine querysets
-            related = (related | latest_articles).distinct()
-
-        return related.order_by('-created_at')[:limit]
-    
-    except Exception as e:
-        print(f"Error getting related articles: {str(e)}")
-        return Article.objects.filter(status='published')[:limit]
-
 @require_POST
 @login_required
 def delete_page(request, slug):
@@ -4637,10 +4583,17 @@ def secure_file_browser(request, token, subpath=''):
             logger.error(f"Path does not exist: {current_path}")
             raise Http404("The requested path does not exist")
         
+        # The backup repository is only chunks; snapshots download as ZIP from the backup API
+        if _in_backup_repository(current_path):
+            raise Http404("The requested path does not exist")
+        
         # If it's a file, serve it directly
         if os.path.isfile(current_path):
             return serve_file(request, current_path)
         
+        if request.GET.get('download') == 'zip':
+            return serve_directory_zip(request, current_path)
+        
         # Otherwise, show directory listing
         return directory_listing(request, download_root, current_path, token, subpath)
         
@@ -4655,22 +4608,13 @@ def secure_file_browser(request, token, subpath=''):
 def serve_file(request, file_path):
     """Serve a file for download"""
     try:
-        # Determine the file's MIME type
-        content_type, encoding = mimetypes.guess_type(file_path)
-        content_type = content_type or 'application/octet-stream'
-        
         # Check if file exists and is accessible
         if not os.path.exists(file_path) or not os.access(file_path, os.R_OK):
             logger.error(f"File not found or not readable: {file_path}")
             raise Http404("File not found or not readable")
         
-        # Use FileResponse for efficient file streaming
-        response = FileResponse(
-            open(file_path, 'rb'),
-            content_type=content_type,
-            as_attachment=True,
-            filename=os.path.basename(file_path)
-        )
+        # Streamed by Django or handed to the front proxy, see file_delivery.py
+        response = deliver_file(request, file_path, as_attachment=True, cache_control='private, no-store')
         
         logger.info(f"User {request.user.username} downloaded file: {file_path}")
         return response
@@ -4680,24 +4624,111 @@ def serve_file(request, file_path):
         messages.error(request, f"Error serving file: {str(e)}")
         raise Http404("Error serving file")
 
+
+def _in_backup_repository(path):
+    repo = os.path.realpath(repository_root())
+    real_path = os.path.realpath(path)
+    return real_path == repo or real_path.startswith(repo + os.sep)
+
+
+def serve_directory_zip(request, dir_path):
+    """Download a directory as a ZIP archive built while it is sent"""
+    name = os.path.basename(os.path.normpath(dir_path)) or 'download'
+    entries = directory_entries(dir_path, skip=[repository_root()])
+    response = StreamingHttpResponse(iter_zip(entries), content_type='application/zip')
+    response['Content-Disposition'] = content_disposition_header(True, f"{name}.zip")
+    response['Cache-Control'] = 'private, no-store'
+    # Already compressed per entry; GZipMiddleware must leave it alone
+    response.file_delivery = True
+    
+    logger.info(f"User {request.user.username} downloaded directory as ZIP: {dir_path}")
+    return response
+
+
+def _serve_from_root(request, root, path, cache_control=None):
+    file_path = safe_join_paths(root, path) if root else None
+    if file_path is None or not file_path.is_file():
+        raise Http404("File not found")
+    return deliver_file(request, file_path, cache_control=cache_control)
+
+
+@require_safe
+def serve_media(request, path):
+    """Files below MEDIA_ROOT (replaces django.views.static.serve)"""
+    # Derivative images are named after their source's content and never change
+    immutable = path.startswith('derivatives/') and not path.endswith('.json')
+    cache_control = IMMUTABLE_CACHE_CONTROL if immutable else None
+    return _serve_from_root(request, settings.MEDIA_ROOT, path, cache_control)
+
+
+@require_safe
+def serve_static(request, path):
+    """Files below STATIC_ROOT (replaces django.views.static.serve)"""
+    # Fingerprinted names (see static_assets.py) never change content
+    cache_control = IMMUTABLE_CACHE_CONTROL if is_hashed_static(path) else None
+    return _serve_from_root(request, settings.STATIC_ROOT, path, cache_control)
+
 def directory_listing(request, base_path, current_path, token, subpath):
-    """Generate a directory listing page"""
+    """Generate a directory listing page (sorted, filtered and paginated server-side)"""
     try:
-        # Get list of files and directories
+        query = request.GET.get('q', '').strip()
+        sort = request.GET.get('sort', 'name')
+        if sort not in SORT_FIELDS:
+            sort = 'name'
+        descending = request.GET.get('order') == 'desc'
+        
+        # Cached scandir rows, see file_listing.py
+        rows = scan_directory(current_path)
+        repo = os.path.realpath(repository_root())
+        if os.path.realpath(current_path) == os.path.dirname(repo):
+            # The backup repository holds thousands of chunk files; it is not browsable
+            rows = [row for row in rows if row[0] != os.path.basename(repo)]
+        rows = sort_and_filter(rows, query, sort, descending)
+        page_obj = Paginator(rows, LISTING_PAGE_SIZE).get_page(request.GET.get('page'))
+        
         items = []
-        for name in sorted(os.listdir(current_path)):
-            item_path = os.path.join(current_path, name)
-            file_data = get_file_details(item_path)
-            if file_data:
-                # Add relative path for navigation
-                rel_path = os.path.join(subpath, name) if subpath else name
-                file_data['rel_path'] = rel_path.replace('\\', '/')  # Normalize path for URLs
-                file_data['size_formatted'] = format_size(file_data['size'])
-                file_data['modified_formatted'] = datetime.fromtimestamp(file_data['modified']).strftime('%Y-%m-%d %H:%M:%S')
-                items.append(file_data)
+        for row in page_obj:
+            file_data = describe(row)
+            # Add relative path for navigation
+            rel_path = os.path.join(subpath, file_data['name']) if subpath else file_data['name']
+            file_data['rel_path'] = rel_path.replace('\\', '/')  # Normalize path for URLs
+            file_data['size_formatted'] = format_size(file_data['size'])
+            file_data['modified_formatted'] = datetime.fromtimestamp(file_data['modified']).strftime('%Y-%m-%d %H:%M:%S')
+            items.append(file_data)
         
-        # Sort items: directories first, then files
-        items.sort(key=lambda x: (not x['is_dir'], x['name'].lower()))
+        # Recursive sizes come from a background job. Symlinked directories
+        # are not walked by it, so they never get one and are not waited for.
+        current_dir_path = str(current_path)
+        dir_items = {}
+        for item in items:
+            if item['is_dir']:
+                path = os.path.join(current_dir_path, item['name'])
+                if os.path.islink(path):
+                    item['size_formatted'] = '-'
+                else:
+                    dir_items[path] = item
+        dir_paths = {item['name']: path for path, item in dir_items.items()}
+        sizes = directory_sizes([current_dir_path] + list(dir_items))
+        for path, item in dir_items.items():
+            known = sizes.get(path)
+            item['size_formatted'] = format_size(known['size']) if known else None
+        summary = sizes.get(current_dir_path)
+        sizes_missing = len(sizes) < len(dir_paths) + 1
+        
+        if request.GET.get('format') == 'sizes':
+            # Polling only reports; the page load below queued the job. Once
+            # it has finished, whatever is still missing stays missing.
+            return JsonResponse({
+                'status': 'success',
+                'pending': sizes_missing and directory_size_pending(current_dir_path),
+                'sizes': {name: format_size(sizes[path]['size']) for name, path in dir_paths.items() if path in sizes},
+                'summary': {'size': format_size(summary['size']), 'files': summary['files']} if summary else None,
+            })
+        
+        sizes_pending = False
+        if sizes_missing:
+            request_directory_sizes(current_dir_path)
+            sizes_pending = True
         
         # Prepare breadcrumbs for navigation
         breadcrumbs = []
@@ -4707,10 +4738,21 @@ def directory_listing(request, base_path, current_path, token, subpath):
                 path = '/'.join(path_parts[:i+1])
                 breadcrumbs.append({'name': part, 'path': path})
         
+        # Query string of the current view, for sort and page links
+        list_params = {key: value for key, value in (('q', query), ('sort', sort), ('order', 'desc' if descending else '')) if value}
+        
         context = {
             'files': items,
+            'page_obj': page_obj,
+            'total_items': len(rows),
+            'query': query,
+            'sort': sort,
+            'descending': descending,
+            'list_query': urlencode(list_params),
+            'summary': {'size': format_size(summary['size']), 'files': summary['files']} if summary else None,
+            'sizes_pending': sizes_pending,
             'current_dir': os.path.basename(current_path) or 'Root',
-            'parent_dir': os.path.dirname(subpath) if subpath else None,
+            'parent_dir': os.path.dirname(subpath.rstrip('/')) if subpath else None,
             'token': token,
             'breadcrumbs': breadcrumbs,
             'is_root': not subpath,
@@ -4799,7 +4841,6 @@ def backup_api_view(request):
         
         backup_name = data.get('backup_name', '')
         run_in_background = data.get('background', False)
-        token = data.get('token', '')
         
         # Set default directories to exclude based on parameters
         exclude_dirs = []
@@ -4812,19 +4853,17 @@ def backup_api_view(request):
             exclude_dirs.append(media_path)
         
         if run_in_background:
-            # Run backup in a separate thread to avoid blocking the request
-            backup_thread = threading.Thread(
-                target=_perform_backup_in_background,
-                args=(backup_name, DEFAULT_EXCLUDES, exclude_dirs, token)
-            )
-            backup_thread.daemon = True  # Thread will exit when main process exits
-            backup_thread.start()
+            # Queued for the job worker; a backup already queued or running is reused
+            job, created = queue_project_backup(backup_name, exclude_dirs)
             
             return JsonResponse({
                 'success': True,
-                'message': 'Backup started in background',
-                'background': True
-            })
+                'message': 'Backup started in background' if created else 'A backup is already in progress',
+                'background': True,
+                'already_running': not created,
+                'job_id': job.pk,
+                'status_url': reverse('backup_status_api', kwargs={'job_id': job.pk})
+            }, status=202)
         else:
             # Run backup synchronously
             result = create_project_backup(
@@ -4834,30 +4873,13 @@ def backup_api_view(request):
             )
             
             if result['success']:
-                response_data = {
+                return JsonResponse({
                     'success': True,
                     'filename': result['filename'],
                     'size': result['size'],
-                    'path': os.path.basename(result['path'])
-                }
-                
-                # Add download URL if a token was provided
-                if token:
-                    try:
-                        if DownloadToken.objects.filter(token=token, is_active=True).exists():
-                            backup_relpath = os.path.relpath(
-                                result['path'], 
-                                settings.SECURE_DOWNLOAD_ROOT
-                            )
-                            download_url = reverse('secure_file_browser', kwargs={
-                                'token': token,
-                                'subpath': backup_relpath
-                            })
-                            response_data['download_url'] = request.build_absolute_uri(download_url)
-                    except Exception as e:
-                        logger.error(f"Error generating download URL: {str(e)}")
-                
-                return JsonResponse(response_data)
+                    'path': result['path'],
+                    'download_url': request.build_absolute_uri(result['path']),
+                })
             else:
                 return JsonResponse({
                     'success': False,
@@ -4871,36 +4893,65 @@ def backup_api_view(request):
             'error': str(e)
         }, status=500)
 
-def _perform_backup_in_background(backup_name, exclude_patterns, exclude_dirs, token=None):
+@login_required
+@superuser_required
+@require_safe
+def backup_status_api(request, job_id=None):
+    """
+    Progress of a background backup (the latest one without job_id), for
+    polling. Includes an absolute download_url once the backup is done.
     """
-    Helper function to perform backup in a background thread.
+    jobs = BackgroundJob.objects.filter(job_type=BACKUP_JOB_TYPE)
+    job = jobs.filter(pk=job_id).first() if job_id else jobs.order_by('-created_at').first()
+    if job is None:
+        return JsonResponse({'success': False, 'error': 'Backup job not found'}, status=404)
     
-    Args:
-        backup_name (str): Name for the backup file
-        exclude_patterns (list): Patterns to exclude
-        exclude_dirs (list): Directories to exclude
-        token (str): Optional token ID for creating download URL
+    status = job_status(job)
+    download_url = (status['result'] or {}).get('download_url')
+    if download_url:
+        status['result']['download_url'] = request.build_absolute_uri(download_url)
+    return JsonResponse({'success': True, 'job': status})
+
+@login_required
+@superuser_required
+@require_safe
+def backup_estimate_api(request):
+    """
+    Estimated size of a project backup, for the backup dialog. Directory
+    sizes are cached by mtime, so repeated estimates are cheap.
     """
+    exclude_dirs = []
+    if request.GET.get('include_media', '1') == '0':
+        exclude_dirs.append(settings.MEDIA_ROOT)
+    return JsonResponse({
+        'success': True,
+        'estimated_size': get_project_size_estimation(DEFAULT_EXCLUDES, exclude_dirs),
+    })
+
+@login_required
+@superuser_required
+@require_safe
+def backup_snapshot_download(request, snapshot_id):
+    """Download a backup snapshot as a ZIP archive, put together from its chunks while it is sent"""
     try:
-        logger.info(f"Starting background backup: {backup_name}")
-        
-        result = create_project_backup(
-            backup_name=backup_name,
-            exclude_patterns=exclude_patterns,
-            exclude_dirs=exclude_dirs
-        )
-        
-        if result['success']:
-            logger.info(f"Background backup completed successfully: {result['filename']}")
-        else:
-            logger.error(f"Background backup failed: {result.get('error', 'Unknown error')}")
+        # Fails early (404) for an unknown id instead of inside the stream
+        load_snapshot(snapshot_id)
+    except (OSError, ValueError, BackupError):
+        raise Http404("Backup not found")
     
-    except Exception as e:
-        logger.exception(f"Error in background backup process: {str(e)}")
+    response = StreamingHttpResponse(iter_zip_members(snapshot_members(snapshot_id)), content_type='application/zip')
+    response['Content-Disposition'] = content_disposition_header(True, f"backup-{snapshot_id}.zip")
+    response['Cache-Control'] = 'private, no-store'
+    # Already compressed per entry; GZipMiddleware must leave it alone
+    response.file_delivery = True
+    
+    logger.info(f"User {request.user.username} downloaded backup snapshot {snapshot_id}")
+    return response
 
 import subprocess
 from django.http import JsonResponse
 from django.conf import settings
+from .static_jobs import COLLECTSTATIC_JOB_TYPE, queue_collectstatic
 from .utils import superuser_required  # Decorator superuser_required yang sudah Anda punya
 
 
@@ -4938,11 +4989,30 @@ def git_pull_view(request):
         if return_code == 0:
             log_message = f"Git pull berhasil dijalankan oleh user {request.user.username}:\nOutput:\n{output}"
             logger.info(log_message)
+            
+            # Static assets are served from the collected, hashed copy:
+            # pulled CSS/JS only reach users once they are collected again.
+            # That takes a while, so it runs as a background job.
+            warm_cache = getattr(settings, 'WARM_CACHE_AFTER_DEPLOY', False)
+            collectstatic_job = None
+            cache_warming_pid = None
+            if not settings.DEBUG:
+                # The job warms the cache itself, once the new assets exist
+                collectstatic_job, _ = queue_collectstatic(warm_cache=warm_cache)
+            elif warm_cache:
+                # Optional post-deploy hook: re-render public pages in a fresh process
+                cache_warming_pid = spawn_warm_cache(refresh=True)
+            
             return JsonResponse({
                 'success': True,
                 'message': 'Git pull berhasil!',
                 'output': output.strip(),
-                'error_output': error_output.strip()
+                'error_output': error_output.strip(),
+                'collectstatic_job_id': collectstatic_job.pk if collectstatic_job else None,
+                'collectstatic_status_url': (
+                    reverse('git_pull_status_api', kwargs={'job_id': collectstatic_job.pk}) if collectstatic_job else None
+                ),
+                'cache_warming_pid': cache_warming_pid,
             })
         else:
             error_message = (
@@ -4965,6 +5035,15 @@ def git_pull_view(request):
             'error': f'Terjadi kesalahan server: {str(e)}'
         }, status=500)
 
+@superuser_required
+@require_safe
+def git_pull_status_api(request, job_id):
+    """State of the collectstatic job queued by a git pull, for polling"""
+    job = BackgroundJob.objects.filter(job_type=COLLECTSTATIC_JOB_TYPE, pk=job_id).first()
+    if job is None:
+        return JsonResponse({'success': False, 'error': 'Job not found'}, status=404)
+    return JsonResponse({'success': True, 'job': job_status(job)})
+
 @staff_member_required
 def toggle_popup_view(request):
     """Toggle the visibility of the popup"""
@@ -4977,6 +5056,7 @@ def toggle_popup_view(request):
         metadata['is_active'] = not is_active
         popup_page.metadata = metadata
         popup_page.save()
+        invalidate_popup_context()
         
         status = "activated" if metadata['is_active'] else "deactivated"
         messages.success(request, f"Popup has been {status}")
@@ -5022,51 +5102,6 @@ def create_default_lpm_page():
     create_standardized_blocks(lpm_page, default_blocks)
     return lpm_page
 
-def get_related_articles(category_slug, limit=3):
-    """
-    Get related articles based on category slug
-    """
-    try:
-        # Get articles from the last 6 months
-        six_months_ago = timezone.now() - timedelta(days=180)
-        
-        # Base queryset with optimized loading
-        articles = Article.objects.select_related(
-            'category',
-            'created_by'
-        ).filter(
-            status='published',
-            created_at__gte=six_months_ago
-        )
-        
-        # Get articles with matching category or content/keywords
-        related = articles.filter(
-            Q(category__slug__icontains=category_slug) |
-            Q(meta_keywords__icontains=category_slug) |
-            Q(title__icontains=category_slug) |
-            Q(content__icontains=category_slug)
-        ).distinct()
-        
-        # If not enough related articles, get latest articles
-        if related.count() < limit:
-            additional_needed = limit - related.count()
-            latest = articles.exclude(
-                id__in=related.values_list('id', flat=True)
-            ).order_by('-created_at')[:additional_needed]
-            
-            # Combine querysets
-            related = (related | latest).distinct()
-        
-        return related.order_by('-created_at')[:limit]
-        
-    except Exception as e:
-        logger.exception(f"Error getting related articles: {str(e)}")
-        # Return latest published articles as fallback
-        return Article.objects.filter(status='published')[:limit]
-    
-    create_standardized_blocks(lpm_page, default_blocks)
-    return lpm_page
-
 
 # ============================================
 # MAVEN COURSE VIEWS - CRUD Based System
@@ -5103,10 +5138,7 @@ def get_course_blocks(course):
     """
     Get all content blocks for a course page
     """
-    blocks = {}
-    for block in course.content_blocks.all().order_by('order'):
-        blocks[block.identifier] = block.content
-    return blocks
+    return get_page_snapshot(course)['blocks']
 
 
 def maven_course_view(request):
@@ -5174,25 +5206,20 @@ def maven_course_detail_view(request, course_id):
         # Get course blocks
         blocks = get_course_blocks(course)
         
-        # Get popup blocks for modal
-        try:
-            popup_page = Page.objects.get(slug='popup', status=Page.PUBLISHED)
-            popup_blocks = {i.identifier: i.content for i in popup_page.content_blocks.all().order_by('order')}
-        except Page.DoesNotExist:
-            popup_blocks = {}
-        
         context = {
             'title': course.title.replace('_course', '') + ' - Matana University',
             'course': course,
             'course_id': course_id,
             'blocks': blocks,
-            'blocks_popup': popup_blocks,
             'meta': {
                 'description': course.metadata.get('meta_description', 'Maven Course at Matana University'),
                 'keywords': course.metadata.get('meta_keywords', 'Maven, Course, Training')
             }
         }
         
+        # Add popup context
+        context.update(get_popup_context())
+        
         return render(request, 'pages/maven_course_detail.html', context)
         
     except Http404:
@@ -0,0 +1,127 @@
+import functools
+import logging
+import os
+import time
+import zipfile
+
+from .backup_engine import STORED_EXTENSIONS, BackupError, load_snapshot, read_chunk, repository_root
+
+logger = logging.getLogger(__name__)
+
+# Streaming ZIP archives
+# ----------------------
+# zipfile writes to an unseekable sink here, so every entry gets a data
+# descriptor instead of a rewritten local header and the archive can be sent
+# while it is being built: memory use is one read block, whatever the size
+# of the directory. Formats that are already compressed are stored as they
+# are; everything else is deflated.
+#
+# Members are (ZipInfo, blocks) pairs, blocks being a callable returning the
+# data in pieces: files on disk (file_members) or the files of a backup
+# snapshot put back together from its chunks (snapshot_members), so a
+# snapshot downloads as an ordinary ZIP without being restored first.
+
+READ_BLOCK_SIZE = 256 * 1024
+
+
+class _Sink:
+    """Write-only file object collecting what zipfile writes until it is drained"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def compression_for(name):
+    if os.path.splitext(name)[1].lower() in STORED_EXTENSIONS:
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def directory_entries(root, skip=()):
+    """(archive name, path) of every regular file below root, in a stable order"""
+    base = os.path.basename(os.path.normpath(root))
+    skip = {os.path.realpath(path) for path in skip}
+    for dirpath, dirnames, filenames in os.walk(root):
+        if skip:
+            dirnames[:] = [d for d in dirnames if os.path.realpath(os.path.join(dirpath, d)) not in skip]
+        dirnames.sort()
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            if os.path.islink(path) or not os.path.isfile(path):
+                continue
+            rel = os.path.relpath(path, root).replace(os.sep, '/')
+            yield f"{base}/{rel}", path
+
+
+def _read_file(path):
+    with open(path, 'rb') as source:
+        yield from iter(lambda: source.read(READ_BLOCK_SIZE), b'')
+
+
+def file_members(entries):
+    """(ZipInfo, blocks) members for (archive name, path) entries"""
+    for arcname, path in entries:
+        try:
+            info = zipfile.ZipInfo.from_file(path, arcname)
+        except OSError as e:
+            logger.error(f"Could not add {path} to ZIP stream: {str(e)}")
+            continue
+        yield info, functools.partial(_read_file, path)
+
+
+def _read_chunks(repo, chunks):
+    for digest in chunks:
+        yield read_chunk(repo, digest)
+
+
+def snapshot_members(snapshot_id, repo=None):
+    """(ZipInfo, blocks) members restoring a backup snapshot, read chunk by chunk"""
+    repo = repo or repository_root()
+    manifest = load_snapshot(snapshot_id, repo)
+    for entry in manifest['files']:
+        mtime = time.localtime(entry['mtime_ns'] / 1e9)
+        info = zipfile.ZipInfo(f"{snapshot_id}/{entry['path']}", date_time=max(mtime[:6], (1980, 1, 1, 0, 0, 0)))
+        info.external_attr = (entry['mode'] & 0xFFFF) << 16
+        # Lets zipfile pick ZIP64 headers for large files up front
+        info.file_size = entry['size']
+        yield info, functools.partial(_read_chunks, repo, entry['chunks'])
+
+
+def iter_zip(entries):
+    """Yield the bytes of a ZIP archive of (archive name, path) entries as it is written"""
+    return iter_zip_members(file_members(entries))
+
+
+def iter_zip_members(members):
+    """Yield the bytes of a ZIP archive of (ZipInfo, blocks) members as it is written"""
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', allowZip64=True) as archive:
+        for info, blocks in members:
+            info.compress_type = compression_for(info.filename)
+            try:
+                with archive.open(info, 'w') as dest:
+                    for block in blocks():
+                        dest.write(block)
+                        data = sink.drain()
+                        if data:
+                            yield data
+            except (OSError, BackupError) as e:
+                # The entry may be cut short; the archive is still valid up to here
+                logger.error(f"Could not add {info.filename} to ZIP stream: {str(e)}")
+            data = sink.drain()
+            if data:
+                yield data
+    # The central directory
+    yield sink.drain()
@@ -144,7 +144,8 @@ MIDDLEWARE = [
 
     'axes.middleware.AxesMiddleware',
     # 'django.contrib.admin.middleware.LogEntryMiddleware',
-    'django.middleware.gzip.GZipMiddleware',
+    # GZipMiddleware that skips file deliveries (see apps/pages/file_delivery.py)
+    'apps.pages.middleware.file_delivery.FileDeliveryGZipMiddleware',
     #   "django_browser_reload.middleware.BrowserReloadMiddleware",
 
 ]
@@ -165,11 +166,13 @@ IS_PRODUCTION = os.getenv('DJANGO_ENV') == 'production'
 STATIC_URL = '/static/'
 
 if IS_PRODUCTION:
-    STATIC_ROOT = BASE_DIR / 'static'
-    # STATICFILES_DIRS = [
-    #     BASE_DIR / 'static',
-    #     BASE_DIR / 'theme/static'
-    # ]
+    # Collected (and fingerprinted) apart from the sources, so project files
+    # in static/ get hashed names too
+    STATIC_ROOT = BASE_DIR / 'staticfiles'
+    STATICFILES_DIRS = [
+        BASE_DIR / 'static',
+        BASE_DIR / 'theme/static'
+    ]
     # print(STATICFILES_DIRS)
     print("THIS IS  PROD")
 else:
@@ -184,6 +187,14 @@ else:
     print("THIS IS NOT PROD")
     # STATIC_ROOT = BASE_DIR / 'static'
 
+# collectstatic writes every asset under a content-hashed name (plus .gz/.br
+# copies) and templates refer to those, so they can be cached for a year.
+# With DEBUG on, plain names are used.
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'apps.pages.static_assets.HashedStaticStorage'},
+}
+
 print("===============\n\n\nDEBUG = ", DEBUG , "\n\n =========="  )
 print("===============\n\n\nDJANGO ENV = ", IS_PRODUCTION , "\n\n =========="  )
 if DEBUG:
@@ -198,9 +209,37 @@ print("MEDIA_ROOT = ", MEDIA_ROOT)
 UPLOAD_ROOT = os.path.join(BASE_DIR, 'uploads')
 THUMBNAIL_ROOT = os.path.join(BASE_DIR, 'thumbnails')
 
+# Media library upload limits: regular uploads are cut off past the first,
+# larger files (videos, documents) use the resumable chunked upload
+MEDIA_MAX_UPLOAD_SIZE = int(os.getenv('MEDIA_MAX_UPLOAD_SIZE', 10 * 1024 * 1024))
+MEDIA_MAX_CHUNKED_UPLOAD_SIZE = int(os.getenv('MEDIA_MAX_CHUNKED_UPLOAD_SIZE', 1024 * 1024 * 1024))
+
 
 
 SECURE_DOWNLOAD_ROOT = os.path.join(BASE_DIR, 'secure_downloads')
+# Incremental project backups (apps/pages/backup_engine.py): chunk store and
+# snapshot manifests, and the number of processes compressing new data
+BACKUP_REPOSITORY_ROOT = os.getenv('BACKUP_REPOSITORY_ROOT', os.path.join(SECURE_DOWNLOAD_ROOT, 'backup_repository'))
+BACKUP_WORKERS = int(os.getenv('BACKUP_WORKERS', os.cpu_count() or 2))
+# Online SQLite snapshots (apps/pages/db_snapshot.py): pages copied per step and
+# the pause after each step, gzip, and how many hourly/daily/weekly copies to keep
+DB_BACKUP_PAGES_PER_STEP = int(os.getenv('DB_BACKUP_PAGES_PER_STEP', 256))
+DB_BACKUP_STEP_SLEEP = float(os.getenv('DB_BACKUP_STEP_SLEEP', 0.01))
+DB_BACKUP_COMPRESS = os.getenv('DB_BACKUP_COMPRESS', 'True') == 'True'
+DB_BACKUP_KEEP_HOURLY = int(os.getenv('DB_BACKUP_KEEP_HOURLY', 24))
+DB_BACKUP_KEEP_DAILY = int(os.getenv('DB_BACKUP_KEEP_DAILY', 7))
+DB_BACKUP_KEEP_WEEKLY = int(os.getenv('DB_BACKUP_KEEP_WEEKLY', 4))
+
+# How /media/, /static/ and secure downloads are sent (apps/pages/file_delivery.py):
+# 'python' streams from Django, 'x-accel' hands the file to nginx with
+# X-Accel-Redirect, 'x-sendfile' to Apache/lighttpd with X-Sendfile
+FILE_DELIVERY_MODE = os.getenv('FILE_DELIVERY_MODE', 'python')
+# nginx internal locations for 'x-accel': <prefix>media/, <prefix>static/, <prefix>secure/
+FILE_DELIVERY_ACCEL_PREFIX = os.getenv('FILE_DELIVERY_ACCEL_PREFIX', '/protected/')
+# Resolve offload headers inside Django, to run the offload modes without a proxy
+FILE_DELIVERY_FAKE_PROXY = os.getenv('FILE_DELIVERY_FAKE_PROXY', 'False') == 'True'
+if FILE_DELIVERY_FAKE_PROXY:
+    MIDDLEWARE.insert(0, 'apps.pages.middleware.file_delivery.FakeProxyMiddleware')
 
 
 # Security Settings
@@ -304,6 +343,23 @@ CSP_FRAME_SRC = (
 # Cache configuration
 CACHE_ENABLED = os.getenv('CACHE_ENABLED', 'True') == 'True'  # Defaults to True
 CACHE_TIMEOUT = os.getenv('CACHE_TIMEOUT', 3600 ) # 2 days
+# Stale-while-revalidate for togglable_cache(swr=True) views: how long an expired
+# entry may still be served while one worker regenerates it, and how long that
+# worker's lock lives / other workers wait for its result
+CACHE_STALE_TIMEOUT = int(os.getenv('CACHE_STALE_TIMEOUT', 300))
+CACHE_LOCK_TIMEOUT = int(os.getenv('CACHE_LOCK_TIMEOUT', 30))
+CACHE_LOCK_WAIT = float(os.getenv('CACHE_LOCK_WAIT', 5))
+# Per-view hit/miss/fill counters shown in cache management; each worker
+# buffers them and folds them into shared cache counters every N seconds
+CACHE_STATS_ENABLED = os.getenv('CACHE_STATS_ENABLED', 'True') == 'True'
+CACHE_STATS_FLUSH_INTERVAL = int(os.getenv('CACHE_STATS_FLUSH_INTERVAL', 10))
+# Re-render public pages (manage.py warm_cache) after startup and git pull deploys
+WARM_CACHE_AFTER_DEPLOY = os.getenv('WARM_CACHE_AFTER_DEPLOY', 'False') == 'True'
+WARM_CACHE_WORKERS = int(os.getenv('WARM_CACHE_WORKERS', 4))
+# Background jobs (manage.py run_jobs): parallel job processes, and running
+# jobs inline instead for development setups without a worker
+BACKGROUND_JOB_WORKERS = int(os.getenv('BACKGROUND_JOB_WORKERS', os.cpu_count() or 2))
+BACKGROUND_JOBS_EAGER = os.getenv('BACKGROUND_JOBS_EAGER', 'False') == 'True'
 
 # CSRF settings
 CSRF_COOKIE_NAME = 'csrftoken'
@@ -458,16 +514,55 @@ CKEDITOR_CONFIGS = {
 # }
 
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
-        'LOCATION': os.path.join(BASE_DIR, 'django_file_cache'), # **PENTING: Ganti path ini jika perlu!**
-        'OPTIONS': {
-            'MAX_ENTRIES': 300, # Batasan jumlah file cache (opsional, sesuaikan)
-            'CULL_FREQUENCY': 3, # Rasio pembersihan cache (opsional, sesuaikan)
+# Cache profile (CACHE_PROFILE env):
+#   tiered - in-process LRU (L1) in front of Redis when REDIS_URL is set, else
+#            the file cache below (L2). Default.
+#   local  - in-process LRU in front of a per-process LocMemCache (development)
+#   file   - the file cache on its own (previous behaviour)
+CACHE_PROFILE = os.getenv('CACHE_PROFILE', 'tiered')
+REDIS_URL = os.getenv('REDIS_URL', '')
+
+FILE_CACHE = {
+    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    'LOCATION': os.path.join(BASE_DIR, 'django_file_cache'), # **PENTING: Ganti path ini jika perlu!**
+    'OPTIONS': {
+        # Page snapshots, view records and tag keys all live here, so 300
+        # entries were culled long before their timeouts
+        'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000)),
+        'CULL_FREQUENCY': 3, # Rasio pembersihan cache (opsional, sesuaikan)
+    },
+}
+
+if CACHE_PROFILE == 'file':
+    CACHES = {'default': FILE_CACHE}
+else:
+    if CACHE_PROFILE == 'local':
+        L2_CACHE = {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'cms-l2',
+            'OPTIONS': {'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000))},
+        }
+    elif REDIS_URL:
+        L2_CACHE = {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    else:
+        L2_CACHE = FILE_CACHE
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'apps.pages.cache_backends.TieredCache',
+            'OPTIONS': {
+                'L2_ALIAS': 'l2',
+                'L1_MAX_BYTES': int(os.getenv('CACHE_L1_MAX_BYTES', 64 * 1024 * 1024)),
+                # Upper bound on how long one worker may serve a value another
+                # worker has already replaced in L2
+                'L1_TIMEOUT': float(os.getenv('CACHE_L1_TIMEOUT', 5)),
+            },
         },
+        'l2': L2_CACHE,
     }
-}
 
 # Logging Configuration
 LOGGING = {
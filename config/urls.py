@@ -35,9 +35,8 @@ from django.contrib.sitemaps.views import sitemap
 from apps.pages.sitemaps import ArticleSitemap, StaticViewSitemap
 from django.views.generic import TemplateView
 from .sitemap import StaticViewSitemap
-from django.views.static import serve
 from django.contrib.auth.decorators import login_required
-from apps.pages.utils import superuser_required
+from apps.pages.utils import superuser_required, togglable_cache
 
 
 # Define sitemaps dictionary before using it
@@ -53,11 +52,12 @@ def test_404(request):
     return render(request, '404.html', status=200)
 
 urlpatterns = [
-    re_path(r'^media/(?P<path>.*)$', serve, {'document_root': settings.MEDIA_ROOT}),
-    re_path(r'^static/(?P<path>.*)$', serve, {'document_root': settings.STATIC_ROOT}),
+    re_path(r'^media/(?P<path>.*)$', serve_media, name='serve_media'),
+    re_path(r'^static/(?P<path>.*)$', serve_static, name='serve_static'),
     path(settings.SECRET_KEY_LOGIN+"_"+'admin/', admin.site.urls),
     path('', home_view, name='home'),
-    path('sitemap.xml', sitemap, {'sitemaps': sitemaps}, name='django.contrib.sitemaps.views.sitemap'),
+    # Cached like the pages it lists; invalidated when articles change or scheduled ones appear
+    path('sitemap.xml', togglable_cache(tags=['articles', 'sitemap'], description='Sitemap')(sitemap), {'sitemaps': sitemaps}, name='django.contrib.sitemaps.views.sitemap'),
     path('robots.txt', TemplateView.as_view(template_name="robots.txt", content_type="text/plain")),
     path('matana-news/', news_view, name='news'),
     path('profil-matana/', profile_view, name='profile'),
@@ -133,11 +133,16 @@ urlpatterns = [
     
     # Add backup API endpoint
     path('admin/api/backup/', backup_api_view, name='backup_api'),
+    path('admin/api/backup/status/', backup_status_api, name='backup_status_latest_api'),
+    path('admin/api/backup/status/<int:job_id>/', backup_status_api, name='backup_status_api'),
+    path('admin/api/backup/estimate/', backup_estimate_api, name='backup_estimate_api'),
+    path('admin/api/backup/snapshots/<str:snapshot_id>/download/', backup_snapshot_download, name='backup_snapshot_download'),
     
     # Add cache management view
     path('admin/cache-management/', cache_management_view, name='cache_management'),
     path('admin/toggle-popup/', toggle_popup_view, name='toggle_popup'),
     path('admin/git-pull/', git_pull_view, name='git_pull'), # Tambahkan ini di bawah namespace admin
+    path('admin/git-pull/status/<int:job_id>/', git_pull_status_api, name='git_pull_status_api'),
     path('admin/git-pull-page909/', git_pull_page_view, name='git_pull_page'),
     
     #path('qnWmCHVq7x7keXdxjyp4OkecPCxgda42FH0V5PGs7Hon1YTO/', include('apps.members.urls', namespace='members')),
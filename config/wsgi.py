@@ -24,3 +24,11 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 #     print(f"Error during startup, 9999999999999999999: {e}")
 
 application = get_wsgi_application()
+
+# Index the image files once per web process, so rendering never scans for them
+from apps.pages.image_index import build_image_index  # noqa: E402
+
+try:
+    build_image_index()
+except Exception as e:
+    print(f"Error building image index: {e}")
@@ -66,9 +66,12 @@
             }
 
             try {
-                // Dynamically determine the base path
+                // Fingerprinted bundle URLs come from the page ({% i18n_locale_urls %}),
+                // so the browser can cache them forever
                 const basePath = window.location.origin;
-                const response = await fetch(`${basePath}/static/locales/${lang}.json`);
+                const localeUrls = window.I18N_LOCALE_URLS || {};
+                const url = localeUrls[lang] || `/static/locales/${lang}.json`;
+                const response = await fetch(`${basePath}${url}`);
                 
                 if (!response.ok) {
                     throw new Error(`Failed to load translations for ${lang}`);